@@ -4,6 +4,7 @@ import pandas as pd
 import plotly.graph_objects as go
 from dotenv import load_dotenv
 import os
+import sys
 import subprocess
 from pathlib import Path
 import traceback
@@ -12,6 +13,8 @@ load_dotenv()
 
 # Ayarlar
 PROJECT_ROOT = Path(__file__).parent.resolve()
+sys.path.insert(0, str(PROJECT_ROOT / "src"))
+from player_index import PlayerIndex
 CSV_PATH = PROJECT_ROOT / "data" / "processed" / "player_ranked.csv"
 RUN_PIPELINE_PY = PROJECT_ROOT / "run_pipeline.py"
 
@@ -110,6 +113,11 @@ def load_ranked_players():
         st.exception(e)
         return None
 
+# Oyuncu indeksi: oturumlar arasında paylaşılır, CSV değişince (mtime) yeniden kurulur
+@st.cache_resource(show_spinner=False)
+def load_player_index(_df, csv_mtime):
+    return PlayerIndex.from_frame(_df)
+
 # Ana uygulama
 def main():
     debug_env()
@@ -138,7 +146,12 @@ def main():
             st.error("CSV preview alınamadı.")
         st.stop()
 
-    players = df["Player"].tolist()
+    index = load_player_index(df, CSV_PATH.stat().st_mtime)
+    query = st.sidebar.text_input("🔎 Oyuncu ara", "")
+    players = index.names
+    if query.strip():
+        # Tam ad → önek (ad/soyad) → bulanık eşleşme; tablo taranmaz
+        players = [index.names[i] for i in index.search(query, limit=50)] or players
     if len(players) < 2:
         st.warning("En az 2 oyuncu gereklidir (CSV'de yeterli oyuncu yok).")
     p1 = st.sidebar.selectbox("Oyuncu 1", players, index=0 if players else 0)
@@ -146,8 +159,8 @@ def main():
 
     if st.sidebar.button("Karşılaştır"):
         try:
-            p1_data = df[df["Player"] == p1].iloc[0]
-            p2_data = df[df["Player"] == p2].iloc[0]
+            p1_data = df.iloc[index.first(p1)]
+            p2_data = df.iloc[index.first(p2)]
         except Exception as e:
             st.error("Seçilen oyuncular CSV'de bulunamadı veya veri eksik.")
             st.exception(e)
@@ -174,7 +187,7 @@ def main():
         st.plotly_chart(fig, use_container_width=True)
 
         st.subheader("📋 Detaylı Karşılaştırma")
-        st.dataframe(df[df["Player"].isin([p1, p2])])
+        st.dataframe(df.iloc[sorted(set(index.lookup(p1) + index.lookup(p2)))])
 
 if __name__ == "__main__":
     main()
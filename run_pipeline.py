@@ -27,6 +27,12 @@ PIPELINE_STEPS: List[Dict[str, Any]] = [
      "description": "Oluşturulan sıralamayı ve metrikleri kullanarak Streamlit LLM raporu hazırla."}
 ]
 
+# Tüm sezonlar (2010–2025): veri adımlarından sonra sezonlar süreç havuzunda paralel sıralanır
+ALL_SEASONS_STEPS: List[Dict[str, Any]] = PIPELINE_STEPS[:2] + [
+    {"name": "All-Seasons Ranking (Aşama 3-5)", "script": "season_rankings.py",
+     "description": "Her sezon için filtre → PCA → LOF → sıralama adımlarını paralel çalıştır."}
+]
+
 # ------------------------------
 # Renk Kodları
 # ------------------------------
@@ -133,7 +139,8 @@ def run_step(step_name: str, script_name: str, description: str) -> bool:
         print(f"\n{Colors.FAIL}❌ {step_name} beklenmedik bir hatayla başarısız oldu: {str(e)}{Colors.ENDC}")
         return False
 
-def run_full_pipeline() -> int:
+def run_full_pipeline(steps: Optional[List[Dict[str, Any]]] = None) -> int:
+    steps = steps or PIPELINE_STEPS
     print_banner("🏀 NBA PLAYER RANKING PIPELINE", "=")
     print(f"Başlangıç: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"Python Sürümü: {sys.version.split()[0]}")
@@ -143,9 +150,9 @@ def run_full_pipeline() -> int:
     failed_steps = []
     completed_steps = []
 
-    for i, step in enumerate(PIPELINE_STEPS, 1):
+    for i, step in enumerate(steps, 1):
         print(f"\n{Colors.OKBLUE}{'='*70}{Colors.ENDC}")
-        print(f"{Colors.BOLD}STEP {i}/{len(PIPELINE_STEPS)}: {step['name']}{Colors.ENDC}")
+        print(f"{Colors.BOLD}STEP {i}/{len(steps)}: {step['name']}{Colors.ENDC}")
         print(f"{Colors.OKCYAN}{step['description']}{Colors.ENDC}")
         print(f"{Colors.OKBLUE}{'='*70}{Colors.ENDC}\n")
 
@@ -154,7 +161,7 @@ def run_full_pipeline() -> int:
             completed_steps.append(step["name"])
         else:
             failed_steps.append(step["name"])
-            if i < len(PIPELINE_STEPS):
+            if i < len(steps):
                 try:
                     response = input(f"{Colors.WARNING}Sonraki adıma devam etmek istiyor musunuz? (y/n): {Colors.ENDC}").strip().lower()
                     if response != 'y':
@@ -164,7 +171,7 @@ def run_full_pipeline() -> int:
 
     total_elapsed = time.time() - total_start
     print_banner("PIPELINE ÖZETİ", "=")
-    print(f"{Colors.BOLD}Tamamlandı: {len(completed_steps)}/{len(PIPELINE_STEPS)}{Colors.ENDC}")
+    print(f"{Colors.BOLD}Tamamlandı: {len(completed_steps)}/{len(steps)}{Colors.ENDC}")
     for step in completed_steps:
         print(f"  {Colors.OKGREEN}✓{Colors.ENDC} {step}")
 
@@ -187,6 +194,7 @@ def list_steps() -> None:
     print(f"{Colors.OKCYAN}Kullanım:{Colors.ENDC}")
     print(f"  python pipeline.py          # Tüm pipeline'ı çalıştır")
     print(f"  python pipeline.py --list   # Adımları listele")
+    print(f"  python pipeline.py --all-seasons  # 2010–2025 tüm sezonları sırala")
     print(f"  python pipeline.py --help   # Yardım göster")
 
 def main() -> int:
@@ -198,6 +206,8 @@ def main() -> int:
         elif arg in ["-l", "--list", "list"]:
             list_steps()
             return 0
+        elif arg == "--all-seasons":
+            return run_full_pipeline(ALL_SEASONS_STEPS)
         else:
             print(f"{Colors.FAIL}Bilinmeyen argüman: {arg}{Colors.ENDC}")
             list_steps()
@@ -5,25 +5,39 @@ Kaggle'dan CSV dosyalarını indirir ve data/raw/ klasörüne kaydeder
 
 import os
 import sys
+import json
+import shutil
+import hashlib
+import argparse
 import zipfile
 import subprocess
 import traceback
+from datetime import datetime
 from pathlib import Path
 import io
 
 # Windows terminali için UTF-8 çıktı zorlaması
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+# (akışı yeniden sarmak yerine reconfigure: import edildiğinde alttaki buffer kapanmaz)
+for _stream in (sys.stdout, sys.stderr):
+    if hasattr(_stream, "reconfigure"):
+        _stream.reconfigure(encoding='utf-8', errors='replace')
 
 # Proje kök dizinini Python path'ine ekle
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from columnar_cache import build_cache, is_cache_fresh
+
 # ------------------------------
 # AYARLAR
 # ------------------------------
 DATASET = "ratin21/nba-player-stats-and-salaries-2010-2025"
 RAW_DIR = os.path.join("data", "raw")
+MANIFEST_FILE = "manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024  # SHA-256 hesaplarken okunan blok boyutu (1 MB)
+
+# Manifest'e dahil edilmeyen dosyalar (geçici zip'ler ve türetilmiş önbellekler)
+UNTRACKED_SUFFIXES = (".zip", ".parquet")
 
 # ------------------------------
 # KAGGLE KİMLİK KONTROLÜ
@@ -200,6 +214,220 @@ def download_manual_zip():
         print(f"⚠️  Manuel ZIP hatası: {e}", flush=True)
         return False
 
+# ------------------------------
+# MANIFEST (boyut + SHA-256 + kaynak sürümü)
+# ------------------------------
+def file_sha256(filepath):
+    """Dosyanın SHA-256 özetini bloklar halinde okuyarak hesapla"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _tracked_files(raw_dir):
+    """Manifest'te izlenen ham veri dosyalarının adlarını döndür"""
+    if not os.path.isdir(raw_dir):
+        return []
+    names = []
+    for name in sorted(os.listdir(raw_dir)):
+        if name == MANIFEST_FILE or name.startswith("."):
+            continue
+        if name.endswith(UNTRACKED_SUFFIXES):
+            continue
+        if os.path.isfile(os.path.join(raw_dir, name)):
+            names.append(name)
+    return names
+
+
+def build_manifest(raw_dir=RAW_DIR, source_version=None):
+    """raw_dir altındaki dosyalar için manifest sözlüğü oluştur"""
+    files = {}
+    for name in _tracked_files(raw_dir):
+        filepath = os.path.join(raw_dir, name)
+        files[name] = {
+            "size": os.path.getsize(filepath),
+            "sha256": file_sha256(filepath),
+        }
+    return {
+        "dataset": DATASET,
+        "source_version": source_version,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "files": files,
+    }
+
+
+def load_manifest(raw_dir=RAW_DIR):
+    """Kayıtlı manifest'i oku; yoksa veya bozuksa None döndür"""
+    manifest_path = os.path.join(raw_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print("⚠️  Manifest okunamadı, yeniden oluşturulacak", flush=True)
+        return None
+
+
+def save_manifest(manifest, raw_dir=RAW_DIR):
+    """Manifest'i atomik olarak (geçici dosya + replace) kaydet"""
+    manifest_path = os.path.join(raw_dir, MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+    print(f"✅ Manifest kaydedildi: {manifest_path}", flush=True)
+
+
+def changed_files(manifest, raw_dir=RAW_DIR):
+    """Manifest'e göre eksik veya içeriği değişmiş dosyaları döndür.
+
+    Önce boyut karşılaştırılır; boyut aynıysa SHA-256 ile doğrulanır.
+    """
+    changed = []
+    for name, entry in manifest.get("files", {}).items():
+        filepath = os.path.join(raw_dir, name)
+        if not os.path.isfile(filepath):
+            changed.append(name)
+        elif os.path.getsize(filepath) != entry.get("size"):
+            changed.append(name)
+        elif file_sha256(filepath) != entry.get("sha256"):
+            changed.append(name)
+    return changed
+
+
+def is_up_to_date(manifest, remote_version, raw_dir=RAW_DIR):
+    """Yerel kopya manifest ve kaynak sürümüyle uyumlu mu?"""
+    if not manifest or not manifest.get("files"):
+        return False
+    if remote_version is not None and manifest.get("source_version") != remote_version:
+        print(f"🔄 Kaynak sürümü değişmiş: {manifest.get('source_version')} → {remote_version}", flush=True)
+        return False
+    changed = changed_files(manifest, raw_dir)
+    if changed:
+        print(f"🔄 Değişmiş/eksik dosyalar: {changed}", flush=True)
+        return False
+    if remote_version is None:
+        print("⚠️  Kaynak sürümü alınamadı, yerel hash doğrulamasına güveniliyor", flush=True)
+    return True
+
+
+# ------------------------------
+# VERİ KAYNAKLARI
+# ------------------------------
+class KaggleSource:
+    """Kaggle veri seti; indirme için mevcut 3 yöntemi sırayla dener"""
+
+    name = "kaggle"
+
+    def get_version(self):
+        """Kaggle dosya listesinden (ad, boyut, tarih) bir sürüm parmak izi üret"""
+        try:
+            import kaggle
+            result = kaggle.api.dataset_list_files(DATASET)
+            entries = []
+            for f in getattr(result, "files", None) or []:
+                size = getattr(f, "totalBytes", None) or getattr(f, "size", None)
+                created = getattr(f, "creationDate", None)
+                entries.append(f"{f.name}|{size}|{created}")
+            if not entries:
+                return None
+            return hashlib.sha256("\n".join(sorted(entries)).encode("utf-8")).hexdigest()
+        except Exception as e:
+            print(f"⚠️  Kaggle sürüm bilgisi alınamadı: {e}", flush=True)
+            return None
+
+    def download(self, raw_dir=RAW_DIR):
+        print("\n--- YÖNTEM 1: Kaggle Python API ---", flush=True)
+        if download_with_kaggle_api():
+            return True
+        print("\n--- YÖNTEM 2: Kaggle CLI ---", flush=True)
+        if download_with_cli():
+            return True
+        print("\n--- YÖNTEM 3: Manuel ZIP İndirme ---", flush=True)
+        return download_manual_zip()
+
+
+class LocalDirSource:
+    """Yerel klasör (ayna / test kaynağı); Kaggle'ın yerine geçer.
+
+    Klasördeki .zip dosyaları açılır, diğer dosyalar kopyalanır.
+    """
+
+    name = "local"
+
+    def __init__(self, source_dir):
+        self.source_dir = source_dir
+
+    def _files(self):
+        return sorted(
+            name for name in os.listdir(self.source_dir)
+            if os.path.isfile(os.path.join(self.source_dir, name))
+        )
+
+    def get_version(self):
+        """Kaynak dosyalarının içerik özetlerinden sürüm üret"""
+        if not os.path.isdir(self.source_dir):
+            return None
+        digest = hashlib.sha256()
+        for name in self._files():
+            digest.update(name.encode("utf-8"))
+            digest.update(file_sha256(os.path.join(self.source_dir, name)).encode("ascii"))
+        return digest.hexdigest()
+
+    def download(self, raw_dir=RAW_DIR):
+        if not os.path.isdir(self.source_dir):
+            print(f"❌ Kaynak klasör bulunamadı: {self.source_dir}", flush=True)
+            return False
+        print(f"📥 Yerel kaynaktan kopyalanıyor: {self.source_dir}", flush=True)
+        for name in self._files():
+            src = os.path.join(self.source_dir, name)
+            if name.endswith(".zip"):
+                with zipfile.ZipFile(src, 'r') as zip_ref:
+                    zip_ref.extractall(raw_dir)
+            else:
+                shutil.copy2(src, os.path.join(raw_dir, name))
+        return True
+
+
+def fetch_dataset(source, raw_dir=RAW_DIR, force=False):
+    """Manifest ile karşılaştırarak yalnızca gerektiğinde indir.
+
+    Dönüş: (başarılı_mı, indirildi_mi)
+    """
+    remote_version = source.get_version()
+    manifest = load_manifest(raw_dir)
+
+    if not force and is_up_to_date(manifest, remote_version, raw_dir):
+        print("⏭️  Veri güncel, indirme atlandı (manifest eşleşti)", flush=True)
+        return True, False
+
+    if not source.download(raw_dir):
+        return False, False
+
+    save_manifest(build_manifest(raw_dir, remote_version), raw_dir)
+    return True, True
+
+
+# ------------------------------
+# SÜTUNSAL ÖNBELLEK (Parquet)
+# ------------------------------
+def refresh_columnar_cache(raw_dir=RAW_DIR):
+    """Bayat veya eksik olan CSV önbelleklerini bir kez üret"""
+    for name in _tracked_files(raw_dir):
+        if not name.endswith(".csv"):
+            continue
+        csv_path = os.path.join(raw_dir, name)
+        if is_cache_fresh(csv_path):
+            continue
+        try:
+            build_cache(csv_path)
+        except Exception as e:
+            # Önbellek opsiyonel; okuyucular CSV'ye düşer
+            print(f"⚠️  Önbellek oluşturulamadı ({name}): {e}", flush=True)
+
 # ------------------------------
 # İNDİRİLEN DOSYALARI LİSTELE
 # ------------------------------
@@ -244,42 +472,46 @@ def print_traceback_utf8():
 # ------------------------------
 # ANA FONKSİYON
 # ------------------------------
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NBA veri setini indir (manifest kontrollü)")
+    parser.add_argument("--force", action="store_true",
+                        help="Manifest eşleşse bile yeniden indir")
+    parser.add_argument("--source-dir", default=os.environ.get("NBA_DATA_SOURCE_DIR"),
+                        help="Kaggle yerine yerel klasörden al (ayna/test için)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Ana çalıştırma fonksiyonu"""
+    args = parse_args(argv)
+
     print("\n" + "="*60, flush=True)
     print("🏀 NBA VERİ TOPLAMA - KAGGLE'DAN İNDİRME", flush=True)
     print("="*60 + "\n", flush=True)
     
     try:
-        # 1. Kaggle kimlik kontrolü
-        check_kaggle_api()
+        # 1. Kaynağı belirle (yerel klasörde Kaggle kimliği gerekmez)
+        if args.source_dir:
+            source = LocalDirSource(args.source_dir)
+        else:
+            check_kaggle_api()
+            source = KaggleSource()
         
         # 2. Klasörleri oluştur
         ensure_folders()
         
-        # 3. İndirme işlemini dene (3 yöntem)
-        success = False
-        
-        # Yöntem 1: Python API
-        if not success:
-            print("\n--- YÖNTEM 1: Kaggle Python API ---", flush=True)
-            success = download_with_kaggle_api()
-        
-        # Yöntem 2: CLI
-        if not success:
-            print("\n--- YÖNTEM 2: Kaggle CLI ---", flush=True)
-            success = download_with_cli()
-        
-        # Yöntem 3: Manuel ZIP
-        if not success:
-            print("\n--- YÖNTEM 3: Manuel ZIP İndirme ---", flush=True)
-            success = download_manual_zip()
+        # 3. Manifest kontrolü + gerekirse indirme (Kaggle için 3 yöntem)
+        success, downloaded = fetch_dataset(source, RAW_DIR, force=args.force)
         
         # 4. Başarı kontrolü
         if success:
+            refresh_columnar_cache(RAW_DIR)
             list_downloaded_files()
             print("\n" + "="*60, flush=True)
-            print("✅ VERİ TOPLAMA İŞLEMİ BAŞARIYLA TAMAMLANDI", flush=True)
+            if downloaded:
+                print("✅ VERİ TOPLAMA İŞLEMİ BAŞARIYLA TAMAMLANDI", flush=True)
+            else:
+                print("✅ VERİ ZATEN GÜNCEL - İNDİRME GEREKMEDİ", flush=True)
             print("="*60 + "\n", flush=True)
         else:
             print("\n" + "="*60, flush=True)
@@ -1,6 +1,12 @@
 import os
+import shutil
+import argparse
 import pandas as pd
 
+from columnar_cache import (
+    read_table, write_cache, write_partitioned, PartitionedWriter, pyarrow_available
+)
+
 # ------------------------------
 # AYARLAR
 # ------------------------------
@@ -8,6 +14,34 @@ RAW_DIR = os.path.join("data", "raw")
 PROCESSED_DIR = os.path.join("data", "processed")
 INPUT_CSV = os.path.join(RAW_DIR, "NBA Player Stats and Salaries_2010-2025.csv")  # kendi CSV adına göre değiştir
 OUTPUT_CSV = os.path.join(PROCESSED_DIR, "clean_data.csv")
+PARTITIONED_DIR = os.path.join(PROCESSED_DIR, "clean_data_by_year")  # Year=YYYY/part-*.parquet
+PARTITION_COL = "Year"
+MISSING_REPORT_CSV = os.path.join(PROCESSED_DIR, "missing_value_report.csv")
+COERCION_REPORT_CSV = os.path.join(PROCESSED_DIR, "coercion_report.csv")
+
+# ------------------------------
+# KOLON ŞEMASI
+# ------------------------------
+# dtype   : hedef tip (category / int16 / float32)
+# nullable: False ise eksik değer fill politikasıyla giderilir
+# fill    : eksik değere yazılacak değer; "drop" → satırı at, None → boş bırak
+_STAT = {"dtype": "float32", "nullable": False, "fill": 0}
+_COUNT = {"dtype": "int16", "nullable": False, "fill": 0}
+
+COLUMN_SCHEMA = {
+    'Player': {"dtype": "category", "nullable": False, "fill": "drop"},
+    'Pos':    {"dtype": "category", "nullable": False, "fill": "Unknown"},
+    'Team':   {"dtype": "category", "nullable": False, "fill": "Unknown"},
+    'Year': _COUNT, 'Age': _COUNT, 'G': _COUNT, 'GS': _COUNT,
+    'MP': _STAT, 'FG': _STAT, 'FGA': _STAT, 'FG%': _STAT,
+    '3P': _STAT, '3PA': _STAT, '3P%': _STAT, '2P': _STAT, '2PA': _STAT, '2P%': _STAT,
+    'eFG%': _STAT, 'FT': _STAT, 'FTA': _STAT, 'FT%': _STAT,
+    'ORB': _STAT, 'DRB': _STAT, 'TRB': _STAT, 'AST': _STAT, 'STL': _STAT,
+    'BLK': _STAT, 'TOV': _STAT, 'PF': _STAT, 'PTS': _STAT,
+}
+
+DESIRED_ORDER = list(COLUMN_SCHEMA)
+DEFAULT_CHUNKSIZE = 100_000  # Akış modunda bir seferde işlenen satır sayısı
 
 # ------------------------------
 # KLASÖR OLUŞTURMA
@@ -19,19 +53,24 @@ def ensure_folders():
 # ------------------------------
 # HAM VERİYİ OKU
 # ------------------------------
-def load_data():
-    if not os.path.exists(INPUT_CSV):
-        raise FileNotFoundError(f"Ham veri bulunamadı: {INPUT_CSV}")
-    df = pd.read_csv(INPUT_CSV)
-    print(f"✓ Ham veri yüklendi: {INPUT_CSV}")
+def load_data(columns=None, input_csv=INPUT_CSV):
+    # Taze Parquet önbelleği varsa oradan okunur; yoksa CSV ayrıştırılıp önbellek yazılır
+    try:
+        df = read_table(input_csv, columns=columns)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Ham veri bulunamadı: {input_csv}")
+    print(f"✓ Ham veri yüklendi: {input_csv}")
     return df
 
 # ------------------------------
 # EKSİK VERİ ANALİZİ (CSV KAYITLI)
 # ------------------------------
 def missing_value_report(df):
+    return write_missing_report(df.isna().sum())
+
 
-    missing_counts = df.isna().sum()
+def write_missing_report(missing_counts):
+    """Kolon bazlı eksik değer sayılarını (tek seferde veya parça parça toplanmış) kaydet"""
     missing_table = pd.DataFrame({
         'Column': missing_counts.index,
         'MissingValues': missing_counts.values
@@ -39,7 +78,7 @@ def missing_value_report(df):
     missing_table = missing_table[missing_table['MissingValues'] > 0]
 
     # CSV olarak kaydet
-    output_path = os.path.join(PROCESSED_DIR, "missing_value_report.csv")
+    output_path = MISSING_REPORT_CSV
     missing_table.to_csv(output_path, index=False)
 
     if missing_table.empty:
@@ -56,19 +95,77 @@ def missing_value_report(df):
 # VERİ TEMİZLEME
 # ------------------------------
 def clean_data(df):
-    # Tüm eksik değerleri 0 ile doldur
-    df_filled = df.fillna(0)
+    df_clean, bad_counts = apply_schema(df)
+    print("✓ Eksik değerler şemaya göre dolduruldu ve veri tipleri düzenlendi.")
+    write_coercion_report(bad_counts)
+    return df_clean
+
+
+def apply_schema(df, schema=COLUMN_SCHEMA):
+    """Şemadaki kolonları tek geçişte, vektörel olarak zorla ve doldur.
 
-    # Veri tiplerini düzelt (sayısal kolonlar float/int)
-    for col in df_filled.columns:
-        if df_filled[col].dtype == 'object':
-            try:
-                df_filled[col] = pd.to_numeric(df_filled[col])
-            except:
-                pass  # string kolonları bozma
+    Dönüş: (temiz DataFrame, kolon başına sayıya çevrilemeyen hücre sayısı)
+    Şemada olmayan kolonlara dokunulmaz (sadece eksikler 0 ile doldurulur).
+    """
+    df = df.copy()
+    bad_counts = {}
 
-    print("✓ Eksik değerler 0 ile dolduruldu ve veri tipleri düzenlendi.")
-    return df_filled
+    # 1) Sayısal kolonlar: hatalı hücreler NaN olur ve sayılır
+    numeric_cols = [c for c in df.columns if c in schema and schema[c]["dtype"] != "category"]
+    for col in numeric_cols:
+        original = df[col]
+        if pd.api.types.is_numeric_dtype(original):
+            bad_counts[col] = 0
+            continue
+        coerced = pd.to_numeric(original, errors="coerce")
+        bad_counts[col] = int((coerced.isna() & original.notna()).sum())
+        df[col] = coerced
+
+    # 2) "drop" politikası: zorunlu kolonu eksik satırları at
+    drop_cols = [c for c in df.columns if c in schema and schema[c]["fill"] == "drop"]
+    if drop_cols:
+        df = df.dropna(subset=drop_cols)
+
+    # 3) Doldur ve hedef tipe çevir
+    for col in df.columns:
+        spec = schema.get(col)
+        if spec is None:
+            if df[col].isna().any():
+                df[col] = df[col].fillna(0)
+            continue
+
+        series = df[col]
+        fill = spec["fill"]
+        if spec["dtype"] == "category":
+            series = series.astype("category")
+            if fill not in (None, "drop") and series.isna().any():
+                if fill not in series.cat.categories:
+                    series = series.cat.add_categories([fill])
+                series = series.fillna(fill)
+        else:
+            if fill not in (None, "drop"):
+                series = series.fillna(fill)
+            dtype = spec["dtype"]
+            if spec["nullable"] and series.isna().any() and dtype.startswith("int"):
+                dtype = dtype.capitalize()  # int16 → Int16 (pandas nullable)
+            series = series.astype(dtype)
+        df[col] = series
+
+    return df, pd.Series(bad_counts, dtype="int64")
+
+
+def write_coercion_report(bad_counts):
+    """Sayıya çevrilemeyen hücre sayılarını kaydet"""
+    report = pd.DataFrame({'Column': bad_counts.index, 'BadValues': bad_counts.values})
+    report = report[report['BadValues'] > 0]
+    report.to_csv(COERCION_REPORT_CSV, index=False)
+    if report.empty:
+        print("✓ Tüm sayısal hücreler geçerli.")
+    else:
+        print("\n--- Sayıya Çevrilemeyen Hücreler (NaN → fill) ---")
+        print(report)
+        print(f"\n✓ Tip dönüşüm raporu kaydedildi: {COERCION_REPORT_CSV}\n")
+    return report
 
 # ------------------------------
 # SÜTUN YERİ DEĞİŞTİRME (Örnek)
@@ -86,12 +183,7 @@ def swap_columns(df, col1, col2):
 # SÜTUN SIRALAMASI
 # ------------------------------
 def reorder_columns(df):
-    desired_order = [
-        'Player', 'Pos',  'Team','Year','Age', 'G', 'GS', 'MP', 'FG', 'FGA', 'FG%',
-        '3P', '3PA', '3P%', '2P', '2PA', '2P%', 'eFG%', 'FT', 'FTA', 'FT%',
-        'ORB', 'DRB', 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS'
-    ]
-    existing_cols = [col for col in desired_order if col in df.columns]
+    existing_cols = [col for col in DESIRED_ORDER if col in df.columns]
     df = df[existing_cols]
     print("✓ Sütunlar istenilen sıraya göre yeniden düzenlendi.")
     return df
@@ -99,18 +191,104 @@ def reorder_columns(df):
 # ------------------------------
 # TEMİZ VERİYİ KAYDET
 # ------------------------------
-def save_data(df):
-    df.to_csv(OUTPUT_CSV, index=False)
-    print(f"✓ Temiz veri kaydedildi: {OUTPUT_CSV}")
+def save_data(df, output_csv=OUTPUT_CSV):
+    df.to_csv(output_csv, index=False)
+    print(f"✓ Temiz veri kaydedildi: {output_csv}")
+    # Sonraki aşamalar CSV'yi yeniden ayrıştırmasın diye tipli kopya
+    write_cache(df, output_csv)
+    # Sezon bazlı okuma için Year partisyonlu kopya
+    if PARTITION_COL in df.columns:
+        write_partitioned(df, partitioned_dir_for(output_csv), PARTITION_COL, csv_path=output_csv)
+
+
+def partitioned_dir_for(output_csv):
+    """Varsayılan çıktı için PARTITIONED_DIR, diğerleri için yanına <ad>_by_year"""
+    if os.path.abspath(output_csv) == os.path.abspath(OUTPUT_CSV):
+        return PARTITIONED_DIR
+    return os.path.splitext(output_csv)[0] + "_by_year"
+
+# ------------------------------
+# AKIŞ MODU (sabit boyutlu parçalar, sınırlı bellek)
+# ------------------------------
+def clean_data_streaming(input_csv=INPUT_CSV, output_csv=OUTPUT_CSV, chunksize=DEFAULT_CHUNKSIZE,
+                         write_partitions=True):
+    """Okuma → doldurma → tip düzeltme → sıralama → yazma adımlarını parça parça yapar.
+
+    Eksik değer sayıları aynı geçişte toplanır; bellekte en fazla bir parça tutulur.
+    """
+    if not os.path.exists(input_csv):
+        raise FileNotFoundError(f"Ham veri bulunamadı: {input_csv}")
+
+    tmp_csv = output_csv + ".tmp"
+    partition_writer = None
+    missing_counts = None
+    bad_counts = None
+    total_rows = 0
+    chunk_count = 0
+
+    try:
+        for chunk in pd.read_csv(input_csv, chunksize=chunksize):
+            counts = chunk.isna().sum()
+            missing_counts = counts if missing_counts is None else missing_counts.add(counts, fill_value=0)
+
+            chunk, chunk_bad = apply_schema(chunk)
+            bad_counts = chunk_bad if bad_counts is None else bad_counts.add(chunk_bad, fill_value=0)
+            chunk = chunk[[col for col in DESIRED_ORDER if col in chunk.columns]]
+            chunk.to_csv(tmp_csv, mode="w" if chunk_count == 0 else "a",
+                         header=chunk_count == 0, index=False)
+            if write_partitions and PARTITION_COL in chunk.columns and pyarrow_available():
+                if partition_writer is None:
+                    partition_writer = PartitionedWriter(partitioned_dir_for(output_csv), PARTITION_COL)
+                partition_writer.write(chunk)
+
+            total_rows += len(chunk)
+            chunk_count += 1
+
+        if chunk_count == 0:
+            raise ValueError(f"Ham veri boş: {input_csv}")
+
+        os.replace(tmp_csv, output_csv)
+    except BaseException:
+        # Yarım kalan çıktı bırakılmaz; mevcut temiz veri olduğu gibi kalır
+        if os.path.exists(tmp_csv):
+            os.remove(tmp_csv)
+        if partition_writer is not None:
+            shutil.rmtree(partition_writer.tmp_root, ignore_errors=True)
+        raise
+
+    if partition_writer is not None:
+        partition_writer.close(output_csv)
+    print(f"✓ Akış modu: {total_rows} satır, {chunk_count} parça işlendi (parça boyutu: {chunksize}).")
+    print(f"✓ Temiz veri kaydedildi: {output_csv}")
+
+    write_missing_report(missing_counts.astype(int))
+    write_coercion_report(bad_counts.astype(int))
+    return total_rows
 
 # ------------------------------
 # ANA FONKSİYON
 # ------------------------------
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NBA ham verisini temizle")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Verilirse veri bu boyutta parçalar halinde akış modunda işlenir")
+    parser.add_argument("--input", default=INPUT_CSV, help="Ham CSV yolu")
+    parser.add_argument("--output", default=OUTPUT_CSV, help="Temiz CSV yolu")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     print("\n--- NBA Data Cleaning Started ---\n")
     
     ensure_folders()
-    df = load_data()
+
+    if args.chunksize:
+        clean_data_streaming(args.input, args.output, chunksize=args.chunksize)
+        print("\n--- İşlem tamamlandı. ---\n")
+        return
+
+    df = load_data(input_csv=args.input)
     missing_value_report(df)
     df_clean = clean_data(df)
     
@@ -121,7 +299,7 @@ def main():
     # İstenen sütun sıralamasını uygula
     df_clean = reorder_columns(df_clean)
     
-    save_data(df_clean)
+    save_data(df_clean, args.output)
     
     print("\n--- İşlem tamamlandı. ---\n")
 
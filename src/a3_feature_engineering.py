@@ -1,97 +1,397 @@
 import os
+import argparse
+import numpy as np
 import pandas as pd
+import joblib
 from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
+
+from columnar_cache import (
+    read_table, table_columns, is_partitioned_fresh, read_partitioned, partitioned_columns,
+    iter_partitioned
+)
 
 # ------------------------------
 # AYARLAR
 # ------------------------------
 INPUT_CSV = "data/processed/clean_data.csv"
+PARTITIONED_DIR = "data/processed/clean_data_by_year"  # a2'nin Year partisyonlu çıktısı
 FILTERED_CSV = "data/processed/clean_data_filtered.csv"
 PCA_OUTPUT_CSV = "data/processed/pca_features.csv"
 PCA_LOADINGS_CSV = "data/processed/pca_loadings_sorted.csv"
 EXPLAINED_VARIANCE_CSV = "data/processed/explained_variance_ratio.csv"
+MODEL_DIR = "models"
+FEATURE_TRANSFORM_PATH = os.path.join(MODEL_DIR, "feature_transform.joblib")  # scaler + PCA + kolonlar
 
 DROP_COLS = [
     "Team","Year","Age","GS",
     "FG%","3P%","2P%","eFG%","FT%","TRB"
 ]
+FILTER_COLS = ["Year", "G"]
+TARGET_YEAR = 2025
+MIN_GAMES = 15
+
+# PCA boyutu: None → tüm bileşenler, int → ilk k bileşen, 0<float<1 → kümülatif varyans hedefi
+PCA_N_COMPONENTS = None
+PCA_SVD_SOLVER = "auto"  # "randomized" → sadece öndeki bileşenler hesaplanır
+PCA_MIN_COMPONENTS = 7   # a4/a5'in kullandığı SELECTED_PCA_COUNT'tan az olmamalı
+PCA_RANDOM_STATE = 42
+
+# Akış (out-of-core) modu: tüm geçmiş / maç kayıtları belleğe sığmadığında
+STREAM_CHUNKSIZE = 100_000
+STREAM_INFO_COLS = ["Player", "Pos", "Year"]  # çok sezonlu çıktıda satırı tanımlayan kolonlar
 
 # ------------------------------
-# ANA FONKSİYON
+# VERİ OKUMA
 # ------------------------------
-def main():
-    os.makedirs("data/processed", exist_ok=True)
+def input_columns():
+    if is_partitioned_fresh(PARTITIONED_DIR, INPUT_CSV):
+        return partitioned_columns(PARTITIONED_DIR)
+    return table_columns(INPUT_CSV)
 
-    # 1️⃣ Ham veriyi yükle
-    df = pd.read_csv(INPUT_CSV)
-    print("✓ Ham veri yüklendi:", INPUT_CSV)
 
-    # 2️⃣ Filtreleme → Year=2025, G>=15
-    df_filtered = df[(df["Year"] == 2025) & (df["G"] >= 15)].copy()
-    print(f"✓ Filtre uygulandı → Satır sayısı: {len(df_filtered)}")
+def load_season(columns=None, year=TARGET_YEAR, min_games=MIN_GAMES):
+    """Sadece hedef sezonun partisyonunu oku (G filtresi satır gruplarına itilir).
 
-    # 3️⃣ Gereksiz kolonları sil
+    Partisyonlu depo yoksa veya bayatsa tüm tabloya düşülür.
+    """
+    if is_partitioned_fresh(PARTITIONED_DIR, INPUT_CSV):
+        df = read_partitioned(
+            PARTITIONED_DIR, "Year", values=[year], columns=columns,
+            filters=[("G", ">=", min_games)]
+        )
+        print(f"✓ Sezon partisyonu yüklendi: {PARTITIONED_DIR}/Year={year}")
+        return df
+    df = read_table(INPUT_CSV, columns=columns)
+    print("✓ Ham veri yüklendi:", INPUT_CSV)
+    return df
+
+# ------------------------------
+# FİLTRE + PCA (DataFrame seviyesinde, dosya yazmadan)
+# ------------------------------
+def filter_season(df, year=TARGET_YEAR, min_games=MIN_GAMES):
+    """Year=year, G>=min_games filtresi + gereksiz kolonların atılması"""
+    df_filtered = df[(df["Year"] == year) & (df["G"] >= min_games)].copy()
     df_filtered = df_filtered.drop(columns=[c for c in DROP_COLS if c in df_filtered.columns])
-    print("✓ Gereksiz kolonlar çıkarıldı:", DROP_COLS)
+    return df_filtered.reset_index(drop=True)
 
-    # 4️⃣ Filtrelenmiş veriyi kaydet
-    df_filtered.to_csv(FILTERED_CSV, index=False)
-    print("✓ clean_data_filtered.csv kaydedildi:", FILTERED_CSV)
 
-    # ------------------------------
-    # 5️⃣ PCA için clean_data_filtered.csv kullan
-    # ------------------------------
-    df_pca_source = pd.read_csv(FILTERED_CSV)
+def build_pca(X, n_components=PCA_N_COMPONENTS, svd_solver=PCA_SVD_SOLVER):
+    """PCA'yı istenen boyutta fit et.
+
+    Varyans hedefi randomized çözücüyle verilirse bileşen sayısı ikiye katlanarak
+    hedefe ulaşılana kadar artırılır, ardından hedefi karşılayan en küçük k ile yeniden fit edilir.
+    """
+    max_components = min(X.shape)
+    min_components = min(PCA_MIN_COMPONENTS, max_components)
+
+    if n_components is None:
+        if svd_solver == "randomized":
+            n_components = max_components
+        pca = PCA(n_components=n_components, svd_solver=svd_solver, random_state=PCA_RANDOM_STATE)
+        return pca, pca.fit_transform(X)
+
+    if isinstance(n_components, float) and 0 < n_components < 1:
+        if svd_solver != "randomized":
+            pca = PCA(n_components=n_components, svd_solver="full")
+            values = pca.fit_transform(X)
+            if pca.n_components_ >= min_components:
+                return pca, values
+            n_components = min_components
+        else:
+            k = min(2 * min_components, max_components)
+            while True:
+                pca = PCA(n_components=k, svd_solver="randomized", random_state=PCA_RANDOM_STATE)
+                pca.fit(X)
+                cumulative = np.cumsum(pca.explained_variance_ratio_)
+                if cumulative[-1] >= n_components or k == max_components:
+                    break
+                k = min(2 * k, max_components)
+            reached = np.flatnonzero(cumulative >= n_components)
+            n_components = int(reached[0]) + 1 if reached.size else k
+
+    n_components = int(min(max(n_components, min_components), max_components))
+    pca = PCA(n_components=n_components, svd_solver=svd_solver, random_state=PCA_RANDOM_STATE)
+    return pca, pca.fit_transform(X)
 
+
+def fit_pca(df_filtered, n_components=PCA_N_COMPONENTS, svd_solver=PCA_SVD_SOLVER):
+    """StandardScaler + PCA uygula.
+
+    Dönüş: (pca_features, loadings_sorted, explained_variance, scaler, pca)
+    """
     # Oyuncu bilgileri
-    player_info = df_pca_source[["Player", "Pos"]].copy()
+    player_info = df_filtered[["Player", "Pos"]].copy()
 
     # PCA için sayısal kolonlar
-    numeric_df = df_pca_source.drop(columns=["Player", "Pos"])
+    numeric_df = df_filtered.drop(columns=["Player", "Pos"])
 
     # Normalize et
     scaler = StandardScaler()
     numeric_scaled = scaler.fit_transform(numeric_df)
-    print("✓ Veriler normalize edildi.")
 
-    # PCA uygula
-    pca = PCA()
-    pca_values = pca.fit_transform(numeric_scaled)
-    print("✓ PCA uygulandı.")
+    # PCA uygula (tam, ilk k bileşen veya varyans hedefi)
+    pca, pca_values = build_pca(numeric_scaled, n_components, svd_solver)
+
+    # PCA features
+    pca_df = pd.DataFrame(pca_values, columns=[f"PCA{i+1}" for i in range(pca_values.shape[1])])
+    final_pca_df = pd.concat([player_info, pca_df], axis=1)
+
+    loadings_sorted_df, explained_variance_df = pca_tables(
+        pca.components_, pca.explained_variance_ratio_, numeric_df.columns
+    )
+    return final_pca_df, loadings_sorted_df, explained_variance_df, scaler, pca
+
+
+def pca_tables(components, explained_variance_ratio, feature_names):
+    """Loadings (varyansa göre sıralı) ve explained variance tablolarını üret"""
+    # PCA loadings – açıklanan varyans olmadan
+    sorted_idx = explained_variance_ratio.argsort()[::-1]
+    sorted_components = components[sorted_idx, :]
+    sorted_columns = [f"PCA{i+1}" for i in range(sorted_components.shape[0])]
+    loadings_sorted_df = pd.DataFrame(
+        sorted_components.T,
+        index=feature_names,
+        columns=sorted_columns
+    )
+
+    # Explained variance
+    explained_variance_df = pd.DataFrame(
+        explained_variance_ratio,
+        index=[f"PCA{i+1}" for i in range(len(explained_variance_ratio))],
+        columns=["explained_variance_ratio"]
+    )
+    return loadings_sorted_df, explained_variance_df
+
+# ------------------------------
+# DONDURULMUŞ DÖNÜŞÜM (scaler + PCA)
+# ------------------------------
+def save_feature_transform(scaler, pca, feature_columns, path=FEATURE_TRANSFORM_PATH, n_output=None):
+    """Fit edilmiş scaler + PCA'yı, yeni satırları yeniden fit etmeden projekte etmek için kaydet"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    joblib.dump({
+        "scaler": scaler,
+        "pca": pca,
+        "feature_columns": list(feature_columns),
+        "n_output": int(n_output or pca.n_components_),
+    }, path)
+    return path
+
+
+def load_feature_transform(path=FEATURE_TRANSFORM_PATH):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Özellik dönüşümü bulunamadı (önce a3'ü çalıştırın): {path}")
+    return joblib.load(path)
+
+
+def transform_features(df, transform):
+    """Yeni satırları dondurulmuş scaler + PCA ile PCA uzayına taşı (oyuncu kolonları korunur)"""
+    feature_columns = transform["feature_columns"]
+    missing = [c for c in feature_columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Yeni veride eksik kolonlar: {missing}")
+
+    scaler = transform["scaler"]
+    X = df[feature_columns].astype(np.float64)
+    if not hasattr(scaler, "feature_names_in_"):
+        X = X.to_numpy()  # akış modunda scaler numpy ile fit edildi
+    values = transform["pca"].transform(scaler.transform(X))[:, :transform["n_output"]]
+    pca_df = pd.DataFrame(values, columns=[f"PCA{i+1}" for i in range(values.shape[1])], index=df.index)
+    info_cols = [c for c in STREAM_INFO_COLS if c in df.columns]
+    return pd.concat([df[info_cols], pca_df], axis=1)
+
+# ------------------------------
+# AKIŞ MODU (IncrementalPCA, sınırlı bellek)
+# ------------------------------
+def iter_filtered_chunks(chunksize=STREAM_CHUNKSIZE, years=None, min_games=MIN_GAMES):
+    """Filtrelenmiş (G>=min_games, opsiyonel Year) parçaları sırayla üret"""
+    if is_partitioned_fresh(PARTITIONED_DIR, INPUT_CSV):
+        chunks = iter_partitioned(PARTITIONED_DIR, "Year", values=years, batch_size=chunksize)
+    else:
+        chunks = pd.read_csv(INPUT_CSV, chunksize=chunksize)
+
+    for chunk in chunks:
+        mask = chunk["G"] >= min_games
+        if years is not None:
+            mask &= chunk["Year"].isin(years)
+        chunk = chunk[mask]
+        if not chunk.empty:
+            yield chunk.reset_index(drop=True)
+
+
+def _split_chunk(chunk, feature_cols=None):
+    """Parçayı (bilgi kolonları, sayısal kolonlar) olarak ayır"""
+    info_cols = [c for c in STREAM_INFO_COLS if c in chunk.columns]
+    if feature_cols is None:
+        feature_cols = [c for c in chunk.columns if c not in DROP_COLS and c not in info_cols]
+    return chunk[info_cols], chunk[feature_cols].to_numpy(dtype=np.float64), feature_cols
+
+
+def fit_pca_streaming(chunksize=STREAM_CHUNKSIZE, years=None, min_games=MIN_GAMES,
+                      n_components=PCA_N_COMPONENTS, filtered_csv=FILTERED_CSV,
+                      pca_output_csv=PCA_OUTPUT_CSV):
+    """StandardScaler + IncrementalPCA'yı parça parça fit et, özellikleri parça parça yaz.
+
+    1. geçiş: StandardScaler.partial_fit
+    2. geçiş: IncrementalPCA.partial_fit (kesinleşmiş ölçekle normalize parçalar üzerinde)
+    3. geçiş: transform + clean_data_filtered / pca_features CSV'lerine ekleme
+    Ölçek istatistikleri kesinleşmeden IPCA'ya veri verilemediği için fit iki ayrı geçiştir.
+    Dönüş: (loadings_sorted, explained_variance, scaler, ipca, satır sayısı)
+    """
+    # 1️⃣ Scaler
+    scaler = StandardScaler()
+    feature_cols = None
+    for chunk in iter_filtered_chunks(chunksize, years, min_games):
+        _, X, feature_cols = _split_chunk(chunk, feature_cols)
+        scaler.partial_fit(X)
+    if feature_cols is None:
+        raise ValueError("Filtre sonrası satır kalmadı.")
+
+    n_features = len(feature_cols)
+    ipca_components = n_features
+    if isinstance(n_components, int):
+        ipca_components = min(max(n_components, PCA_MIN_COMPONENTS), n_features)
+
+    # 2️⃣ IncrementalPCA (her partial_fit en az ipca_components satır ister: küçük parçalar
+    # biriktirilir, son parça bir öncekiyle birleştirilir)
+    ipca = IncrementalPCA(n_components=ipca_components)
+    held = None
+    pending, pending_rows = [], 0
+    for chunk in iter_filtered_chunks(chunksize, years, min_games):
+        _, X, _ = _split_chunk(chunk, feature_cols)
+        pending.append(scaler.transform(X))
+        pending_rows += len(X)
+        if pending_rows >= ipca_components:
+            if held is not None:
+                ipca.partial_fit(held)
+            held = np.vstack(pending)
+            pending, pending_rows = [], 0
+    if pending:
+        held = np.vstack(([held] if held is not None else []) + pending)
+    ipca.partial_fit(held)
+
+    # Çıktı boyutu: varyans hedefi verildiyse hedefi karşılayan en küçük k
+    output_components = ipca.n_components_
+    if isinstance(n_components, float) and 0 < n_components < 1:
+        cumulative = np.cumsum(ipca.explained_variance_ratio_)
+        reached = np.flatnonzero(cumulative >= n_components)
+        k = int(reached[0]) + 1 if reached.size else output_components
+        output_components = min(max(k, PCA_MIN_COMPONENTS), output_components)
+
+    # 3️⃣ Transform + yaz
+    pca_columns = [f"PCA{i+1}" for i in range(output_components)]
+    total_rows = 0
+    for i, chunk in enumerate(iter_filtered_chunks(chunksize, years, min_games)):
+        info, X, _ = _split_chunk(chunk, feature_cols)
+        values = ipca.transform(scaler.transform(X))[:, :output_components]
+        features = pd.concat([info, pd.DataFrame(values, columns=pca_columns)], axis=1)
+        filtered = pd.concat([info, chunk[feature_cols]], axis=1)
+
+        mode, header = ("w", True) if i == 0 else ("a", False)
+        filtered.to_csv(filtered_csv + ".tmp", mode=mode, header=header, index=False)
+        features.to_csv(pca_output_csv + ".tmp", mode=mode, header=header, index=False)
+        total_rows += len(chunk)
+    os.replace(filtered_csv + ".tmp", filtered_csv)
+    os.replace(pca_output_csv + ".tmp", pca_output_csv)
+
+    loadings_sorted_df, explained_variance_df = pca_tables(
+        ipca.components_[:output_components],
+        ipca.explained_variance_ratio_[:output_components],
+        feature_cols,
+    )
+    return loadings_sorted_df, explained_variance_df, scaler, ipca, total_rows
+
+# ------------------------------
+# ANA FONKSİYON
+# ------------------------------
+def _parse_n_components(value):
+    """"0.95" → varyans hedefi (float), "10" → bileşen sayısı (int)"""
+    number = float(value)
+    return number if 0 < number < 1 else int(number)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Filtreleme + StandardScaler + PCA")
+    parser.add_argument("--n-components", type=_parse_n_components, default=PCA_N_COMPONENTS,
+                        help="Bileşen sayısı (ör. 10) veya kümülatif varyans hedefi (ör. 0.95)")
+    parser.add_argument("--svd-solver", default=PCA_SVD_SOLVER,
+                        choices=["auto", "full", "randomized", "arpack", "covariance_eigh"],
+                        help="PCA çözücüsü; 'randomized' yalnızca öndeki bileşenleri hesaplar")
+    parser.add_argument("--streaming", action="store_true",
+                        help="IncrementalPCA ile parça parça (out-of-core) çalış")
+    parser.add_argument("--chunksize", type=int, default=STREAM_CHUNKSIZE,
+                        help="Akış modunda parça boyutu")
+    parser.add_argument("--years", type=int, nargs="*", default=None,
+                        help="Akış modunda dahil edilecek sezonlar (varsayılan: tüm geçmiş)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs("data/processed", exist_ok=True)
+
+    if args.streaming:
+        main_streaming(args)
+        return
+
+    # 1️⃣ Ham veriyi yükle (yalnızca filtre + PCA için gereken kolonlar)
+    needed_cols = [
+        c for c in input_columns()
+        if c not in DROP_COLS or c in FILTER_COLS
+    ]
+    df = load_season(needed_cols)
+
+    # 2️⃣ Filtreleme → Year=2025, G>=15 ve 3️⃣ gereksiz kolonları sil
+    df_filtered = filter_season(df)
+    print(f"✓ Filtre uygulandı → Satır sayısı: {len(df_filtered)}")
+    print("✓ Gereksiz kolonlar çıkarıldı:", DROP_COLS)
+
+    # 4️⃣ Filtrelenmiş veriyi kaydet
+    df_filtered.to_csv(FILTERED_CSV, index=False)
+    print("✓ clean_data_filtered.csv kaydedildi:", FILTERED_CSV)
+
+    # ------------------------------
+    # 5️⃣ Normalize + PCA (filtrelenmiş veri bellekte, CSV yeniden ayrıştırılmadan)
+    # ------------------------------
+    final_pca_df, loadings_sorted_df, explained_variance_df, scaler, pca = fit_pca(
+        df_filtered, args.n_components, args.svd_solver
+    )
+    print("✓ Veriler normalize edildi.")
+    print(f"✓ PCA uygulandı ({pca.n_components_} bileşen, çözücü: {args.svd_solver}).")
     print("Açıklanan varyans oranları:", pca.explained_variance_ratio_)
+    save_feature_transform(scaler, pca, loadings_sorted_df.index)
+    print("✓ Scaler + PCA dönüşümü kaydedildi:", FEATURE_TRANSFORM_PATH)
 
     # ------------------------------
     # 6️⃣ PCA features CSV
     # ------------------------------
-    pca_df = pd.DataFrame(pca_values, columns=[f"PCA{i+1}" for i in range(pca_values.shape[1])])
-    final_pca_df = pd.concat([player_info, pca_df], axis=1)
     final_pca_df.to_csv(PCA_OUTPUT_CSV, index=False)
     print("✓ pca_features.csv kaydedildi:", PCA_OUTPUT_CSV)
 
     # ------------------------------
     # 7️⃣ PCA loadings CSV – açıklanan varyans olmadan
     # ------------------------------
-    sorted_idx = pca.explained_variance_ratio_.argsort()[::-1]
-    sorted_components = pca.components_[sorted_idx, :]
-    sorted_columns = [f"PCA{i+1}" for i in range(sorted_components.shape[0])]
-
-    loadings_sorted_df = pd.DataFrame(
-        sorted_components.T,
-        index=numeric_df.columns,
-        columns=sorted_columns
-    )
     loadings_sorted_df.to_csv(PCA_LOADINGS_CSV)
     print("✓ pca_loadings_sorted.csv kaydedildi (sadece loadings):", PCA_LOADINGS_CSV)
 
     # ------------------------------
     # 8️⃣ Explained variance CSV
     # ------------------------------
-    explained_variance_df = pd.DataFrame(
-        pca.explained_variance_ratio_,
-        index=[f"PCA{i+1}" for i in range(len(pca.explained_variance_ratio_))],
-        columns=["explained_variance_ratio"]
+    explained_variance_df.to_csv(EXPLAINED_VARIANCE_CSV)
+    print("✓ explained_variance_ratio.csv kaydedildi:", EXPLAINED_VARIANCE_CSV)
+
+def main_streaming(args):
+    loadings_sorted_df, explained_variance_df, scaler, ipca, total_rows = fit_pca_streaming(
+        args.chunksize, args.years, MIN_GAMES, args.n_components
     )
+    print(f"✓ Akış modu: {total_rows} satır, IncrementalPCA ({len(explained_variance_df)} bileşen).")
+    save_feature_transform(scaler, ipca, loadings_sorted_df.index, n_output=len(explained_variance_df))
+    print("✓ Scaler + IncrementalPCA dönüşümü kaydedildi:", FEATURE_TRANSFORM_PATH)
+    print("✓ clean_data_filtered.csv kaydedildi:", FILTERED_CSV)
+    print("✓ pca_features.csv kaydedildi:", PCA_OUTPUT_CSV)
+
+    loadings_sorted_df.to_csv(PCA_LOADINGS_CSV)
+    print("✓ pca_loadings_sorted.csv kaydedildi (sadece loadings):", PCA_LOADINGS_CSV)
     explained_variance_df.to_csv(EXPLAINED_VARIANCE_CSV)
     print("✓ explained_variance_ratio.csv kaydedildi:", EXPLAINED_VARIANCE_CSV)
 
@@ -1,9 +1,19 @@
 import os
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import LocalOutlierFactor
-import joblib
-import mlflow
+from sklearn.neighbors import NearestNeighbors
+
+import run_tracker
+from a3_feature_engineering import load_feature_transform, FEATURE_TRANSFORM_PATH
+from compact_model import CompactLOFModel
+from lof_incremental import IncrementalLOF
+from neighbors import BACKENDS, APPROX_BACKEND, kneighbors_graph, timed_kneighbors, recall_at_k
 
 # ------------------------------
 # AYARLAR
@@ -12,89 +22,636 @@ PCA_INPUT_CSV = "data/processed/pca_features.csv"
 EXPLAINED_VARIANCE_CSV = "data/processed/explained_variance_ratio.csv"
 SCORED_OUTPUT_CSV = "data/processed/scored_data.csv"
 MODEL_DIR = "models"
+COMPACT_MODEL_DIR = os.path.join(MODEL_DIR, "lof_compact")  # mmap ile açılan .npy + header.json
+SCORED_NEW_CSV = "data/processed/scored_new.csv"
+LOF_STATE_PATH = os.path.join(MODEL_DIR, "lof_state.npz")  # artımlı güncelleme için k-NN grafiği
+PLAYER_KEY_COLS = ["Player", "Year"]  # mevcut olanlar satır eşleştirmede kullanılır
 
 N_NEIGHBORS = 20
 METRIC = "minkowski"
 CONTAMINATION = "auto"
 SELECTED_PCA_COUNT = 7  # En yüksek varyanslı PCA sayısı
+NEIGHBOR_BACKEND = "auto"  # kesin: auto/kd_tree/ball_tree/brute, yaklaşık: approx
+NEIGHBOR_BENCHMARK_CSV = "data/processed/neighbor_benchmark.csv"
+
+# Parametre taraması: her PCA alt kümesi için k-NN bir kez (en büyük k ile) hesaplanır
+SWEEP_N_NEIGHBORS = [5, 10, 15, 20, 30, 40]
+SWEEP_PCA_COUNTS = [3, 5, 7, 9]
+SWEEP_OUTPUT_CSV = "data/processed/lof_sweep.csv"
+LOF_AUTO_THRESHOLD = 1.5  # contamination="auto" → offset_ = -1.5
+
+# Pozisyon bazlı (stratified) mod: her grup için ayrı scaler + LOF
+STRATIFIED_MODEL_DIR = os.path.join(MODEL_DIR, "stratified")
+POSITION_FAMILIES = {"PG": "Guard", "SG": "Guard", "G": "Guard",
+                     "SF": "Forward", "PF": "Forward", "F": "Forward",
+                     "C": "Center"}
+OTHER_GROUP = "Other"
+MIN_GROUP_SIZE = N_NEIGHBORS + 1  # daha küçük gruplar "Other" grubunda birleştirilir
 
 # ------------------------------
-# ANA FONKSİYON
+# LOF (DataFrame seviyesinde, dosya yazmadan)
 # ------------------------------
-def main():
-    os.makedirs(MODEL_DIR, exist_ok=True)
+def select_top_pca_columns(explained_df, count=SELECTED_PCA_COUNT):
+    """Açıklanan varyansı en yüksek `count` PCA kolonunun adları"""
+    return explained_df.sort_values(
+        by="explained_variance_ratio", ascending=False
+    ).head(count).index.tolist()
 
-    # 1️⃣ PCA verilerini yükle
-    df_pca = pd.read_csv(PCA_INPUT_CSV)
-    print("✓ PCA verileri yüklendi:", PCA_INPUT_CSV)
 
-    # 2️⃣ Explained variance ratio'yu yükle ve en yüksek 7 PCA seç
-    explained_df = pd.read_csv(EXPLAINED_VARIANCE_CSV, index_col=0)
-    top_pca_columns = explained_df.sort_values(
-        by="explained_variance_ratio", ascending=False
-    ).head(SELECTED_PCA_COUNT).index.tolist()
-    print(f"✓ En yüksek {SELECTED_PCA_COUNT} varyanslı PCA seçildi:", top_pca_columns)
+def fit_lof(df_pca, explained_df, backend=NEIGHBOR_BACKEND, return_state=False):
+    """Seçilen PCA'lar üzerinde scaler + LOF uygula.
+
+    k-NN grafiği seçilen arka uçla (kesin veya yaklaşık) bir kez bulunur; LOF skorları ve
+    istenirse artımlı LOF durumu aynı grafikten türetilir, komşu araması tekrarlanmaz.
+    Kesin arka uçta skorlar sklearn LocalOutlierFactor ile aynıdır. lof None döner
+    (yeni satır skorlama kompakt modelle yapıldığından sklearn nesnesi gerekmez).
+    Dönüş: (scored DataFrame, lof, scaler, seçilen PCA kolonları)
+    return_state=True: sona artımlı LOF durumu eklenir (durum / kompakt model lof_score ile tutarlıdır).
+    """
+    top_pca_columns = select_top_pca_columns(explained_df)
 
-    # 3️⃣ Sadece seçilen PCA sütunlarını kullan
+    # Sadece seçilen PCA sütunlarını kullan
     for col in top_pca_columns:
         if col not in df_pca.columns:
             raise ValueError(f"PCA column missing in features file: {col}")
     df_features = df_pca[top_pca_columns]
 
-    # 4️⃣ Verileri normalize et
+    # Verileri normalize et
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(df_features)
-    print("✓ PCA verileri normalize edildi.")
 
-    # 5️⃣ LOF modeli oluştur ve fit_predict
-    lof = LocalOutlierFactor(
-        n_neighbors=N_NEIGHBORS,
-        metric=METRIC,
-        contamination=CONTAMINATION,
-        novelty=False
-    )
-    lof_labels = lof.fit_predict(X_scaled)  # -1: anomali, 1: normal
-    lof_scores = -lof.negative_outlier_factor_  # ters çevrilmiş skor → düşük = iyi
+    # Tek k-NN araması → LOF (contamination="auto": lof > 1.5 anomali) + artımlı durum
+    k = min(N_NEIGHBORS, len(X_scaled) - 1)
+    distances, indices = kneighbors_graph(X_scaled, k, backend, metric=METRIC)
+    lof = None
+    lof_scores = lof_from_neighbors(distances, indices, k)  # ters çevrilmiş skor → düşük = iyi
+    lof_labels = np.where(lof_scores > LOF_AUTO_THRESHOLD, -1, 1)  # -1: anomali, 1: normal
+    state = IncrementalLOF.from_neighbors(X_scaled, distances, indices, N_NEIGHBORS, METRIC) \
+        if return_state else None
 
-    # 6️⃣ Oyuncu bilgileri + seçilen PCA + LOF sütunları
+    # Oyuncu bilgileri + seçilen PCA + LOF sütunları
     player_cols = [col for col in df_pca.columns if not col.startswith("PCA")]
-    df_to_save = pd.concat([df_pca[player_cols], df_features], axis=1)
-    df_to_save['lof_score'] = lof_scores
-    df_to_save['is_anomaly'] = (lof_labels == -1).astype(int)  # 1: anomali, 0: normal
+    df_scored = pd.concat([df_pca[player_cols], df_features], axis=1)
+    df_scored['lof_score'] = lof_scores
+    df_scored['is_anomaly'] = (lof_labels == -1).astype(int)  # 1: anomali, 0: normal
+    if return_state:
+        return df_scored, lof, scaler, top_pca_columns, state
+    return df_scored, lof, scaler, top_pca_columns
+
+# ------------------------------
+# PARAMETRE TARAMASI (n_neighbors × PCA sayısı)
+# ------------------------------
+def lof_from_neighbors(distances, indices, k):
+    """En büyük k ile bulunmuş k-NN grafiğinden, daha küçük k için LOF skorunu türet.
+
+    distances/indices: kneighbors() çıktısı (kendisi hariç, artan uzaklık sırasıyla).
+    sklearn LocalOutlierFactor ile aynı formül: reach-dist → lrd → lof.
+    """
+    dist_k = distances[:, :k]
+    ind_k = indices[:, :k]
+    k_distance = dist_k[:, k - 1]
+    reach_dist = np.maximum(dist_k, k_distance[ind_k])
+    lrd = 1.0 / (np.mean(reach_dist, axis=1) + 1e-10)
+    return np.mean(lrd[ind_k] / lrd[:, np.newaxis], axis=1)
+
+
+_SWEEP_SHM = {}
+
+
+def _attach_sweep_matrix(shm_name, shape, dtype):
+    """İşçi süreç: ana süreçteki PCA matrisine kopyalamadan bağlan"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _SWEEP_SHM["shm"] = shm  # referans tut, aksi halde bellek serbest kalır
+    _SWEEP_SHM["matrix"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _sweep_subset(pca_count, neighbors_grid):
+    """Tek PCA alt kümesi: ölçekle, k-NN'i bir kez hesapla, her k için LOF türet"""
+    X = _SWEEP_SHM["matrix"][:, :pca_count]  # görünüm, kopya değil
+    X_scaled = StandardScaler().fit_transform(X)
+
+    start = time.perf_counter()
+    k_max = min(max(neighbors_grid), len(X_scaled) - 1)
+    nn = NearestNeighbors(n_neighbors=k_max, metric=METRIC).fit(X_scaled)
+    distances, indices = nn.kneighbors()
+    knn_seconds = time.perf_counter() - start
+
+    rows = []
+    for k in sorted(neighbors_grid):
+        k_eff = min(k, k_max)
+        lof_scores = lof_from_neighbors(distances, indices, k_eff)
+        rows.append({
+            "n_neighbors": k,
+            "selected_pca_count": pca_count,
+            "anomaly_count": int((lof_scores > LOF_AUTO_THRESHOLD).sum()),
+            "avg_lof_score": float(lof_scores.mean()),
+            "max_lof_score": float(lof_scores.max()),
+            "knn_seconds": knn_seconds,
+        })
+    return rows
+
+
+def run_sweep(df_pca, explained_df, neighbors_grid=SWEEP_N_NEIGHBORS,
+              pca_counts=SWEEP_PCA_COUNTS, workers=None):
+    """Tüm (n_neighbors, PCA sayısı) kombinasyonları için LOF özetlerini hesapla.
+
+    PCA alt kümeleri süreç havuzuna dağıtılır; özellik matrisi paylaşımlı bellekte tek kopyadır.
+    """
+    ordered_columns = select_top_pca_columns(explained_df, count=len(explained_df))
+    pca_counts = [c for c in pca_counts if c <= len(ordered_columns)]
+    if not pca_counts or not neighbors_grid:
+        raise ValueError(f"❌ Taranacak geçerli PCA sayısı / n_neighbors yok "
+                         f"(en fazla {len(ordered_columns)} PCA bileşeni mevcut).")
+    matrix = np.ascontiguousarray(df_pca[ordered_columns[:max(pca_counts)]].to_numpy(dtype=np.float64))
+
+    shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    try:
+        shared = np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)
+        shared[:] = matrix
+        init_args = (shm.name, matrix.shape, matrix.dtype)
+        workers = workers or min(len(pca_counts), os.cpu_count() or 1)
+
+        if workers == 1:
+            _attach_sweep_matrix(*init_args)
+            results = [_sweep_subset(count, neighbors_grid) for count in pca_counts]
+            _SWEEP_SHM.pop("shm").close()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_sweep_matrix,
+                                     initargs=init_args) as pool:
+                results = list(pool.map(_sweep_subset, pca_counts, [neighbors_grid] * len(pca_counts)))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return pd.DataFrame([row for subset in results for row in subset])
+
+
+def log_sweep_to_mlflow(df_sweep, output_csv=SWEEP_OUTPUT_CSV):
+    """Tarama sonuçlarını tek bir MLflow run'ına toplu (log_batch) kaydet"""
+    with run_tracker.start_run("Player_Similarity_LOF_Sweep") as run:
+        run.log_params({
+            "sweep_n_neighbors": ",".join(str(k) for k in sorted(df_sweep["n_neighbors"].unique())),
+            "sweep_pca_counts": ",".join(str(c) for c in sorted(df_sweep["selected_pca_count"].unique())),
+            "metric": METRIC,
+            "contamination": CONTAMINATION,
+        })
+        for row in df_sweep.itertuples(index=False):
+            suffix = f"k{row.n_neighbors}_pca{row.selected_pca_count}"
+            run.log_metric(f"anomaly_count_{suffix}", row.anomaly_count)
+            run.log_metric(f"avg_lof_score_{suffix}", row.avg_lof_score)
+        run.log_artifact(output_csv)
+
+
+def main_sweep(neighbors_grid, pca_counts, workers=None):
+    df_pca = pd.read_csv(PCA_INPUT_CSV)
+    explained_df = pd.read_csv(EXPLAINED_VARIANCE_CSV, index_col=0)
+    print(f"✓ Tarama: n_neighbors={neighbors_grid}, PCA sayısı={pca_counts}")
+
+    try:
+        df_sweep = run_sweep(df_pca, explained_df, neighbors_grid, pca_counts, workers)
+    except ValueError as e:
+        print(e)
+        return None
+    df_sweep.to_csv(SWEEP_OUTPUT_CSV, index=False)
+    print(df_sweep.to_string(index=False))
+    print("✓ Tarama sonuçları kaydedildi:", SWEEP_OUTPUT_CSV)
+
+    log_sweep_to_mlflow(df_sweep)
+    print("✓ Tarama MLflow'a tek seferde kaydedildi.")
+    return df_sweep
+
+# ------------------------------
+# KOMŞU ARKA UCU KARŞILAŞTIRMASI (hız + recall, kesin sonuca göre)
+# ------------------------------
+def benchmark_neighbor_backends(X, k=N_NEIGHBORS, backends=BACKENDS, reference="brute"):
+    """Her arka ucun k-NN süresini, recall@k'sını ve LOF sonucuna etkisini ölç"""
+    k = min(k, len(X) - 1)
+    exact_dist, exact_ind, exact_seconds = timed_kneighbors(X, k, reference, metric=METRIC)
+    exact_lof = lof_from_neighbors(exact_dist, exact_ind, k)
+    exact_anomaly = exact_lof > LOF_AUTO_THRESHOLD
+
+    rows = []
+    for backend in backends:
+        if backend == reference:
+            distances, indices, seconds = exact_dist, exact_ind, exact_seconds
+        else:
+            distances, indices, seconds = timed_kneighbors(X, k, backend, metric=METRIC)
+        lof_scores = lof_from_neighbors(distances, indices, k)
+        rows.append({
+            "backend": backend,
+            "rows": len(X),
+            "n_neighbors": k,
+            "seconds": seconds,
+            "speedup_vs_exact": exact_seconds / seconds if seconds > 0 else np.inf,
+            "recall_at_k": recall_at_k(indices, exact_ind),
+            "max_abs_lof_error": float(np.abs(lof_scores - exact_lof).max()),
+            "anomaly_agreement": float(((lof_scores > LOF_AUTO_THRESHOLD) == exact_anomaly).mean()),
+        })
+    return pd.DataFrame(rows)
+
+
+def main_benchmark(backends, replicate=1):
+    """scored verisinin özellik uzayında arka uçları karşılaştır.
+
+    replicate > 1 ise satırlar küçük gürültüyle çoğaltılarak büyük veri taklit edilir.
+    """
+    df_pca = pd.read_csv(PCA_INPUT_CSV)
+    explained_df = pd.read_csv(EXPLAINED_VARIANCE_CSV, index_col=0)
+    X = StandardScaler().fit_transform(df_pca[select_top_pca_columns(explained_df)])
+    if replicate > 1:
+        rng = np.random.default_rng(0)
+        X = np.vstack([X + rng.normal(scale=0.05, size=X.shape) for _ in range(replicate)])
+    print(f"✓ Komşu arka uçları karşılaştırılıyor: {len(X)} satır, {X.shape[1]} boyut")
+
+    df_bench = benchmark_neighbor_backends(X, backends=backends)
+    df_bench.to_csv(NEIGHBOR_BENCHMARK_CSV, index=False)
+    print(df_bench.to_string(index=False))
+    print("✓ Karşılaştırma kaydedildi:", NEIGHBOR_BENCHMARK_CSV)
+    return df_bench
+
+# ------------------------------
+# POZİSYON BAZLI LOF (her grup ayrı model, süreç havuzunda)
+# ------------------------------
+def _limit_worker_threads():
+    """Her süreç tek BLAS/OpenMP iş parçacığı kullansın (aşırı abonelik olmasın)"""
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+
+
+def position_groups(positions, by="pos"):
+    """Her satırın LOF grubu: ham pozisyon ("pos") veya pozisyon ailesi ("family").
+
+    "PG-SG" gibi çoklu pozisyonlarda ilk pozisyon kullanılır; küçük gruplar OTHER_GROUP olur.
+    """
+    primary = positions.astype(str).str.split("-").str[0].str.strip()
+    groups = primary.map(POSITION_FAMILIES).fillna(OTHER_GROUP) if by == "family" else primary
+    sizes = groups.value_counts()
+    groups = groups.where(groups.map(sizes) >= MIN_GROUP_SIZE, OTHER_GROUP)
+    other_size = int((groups == OTHER_GROUP).sum())
+    if 0 < other_size < MIN_GROUP_SIZE:
+        # "Other" da küçükse en kalabalık gruba katılır
+        largest = groups[groups != OTHER_GROUP].value_counts()
+        if len(largest):
+            groups = groups.replace(OTHER_GROUP, largest.index[0])
+    return groups
+
+
+def _fit_group(group, df_group, explained_df):
+    df_scored, lof, scaler, _, state = fit_lof(df_group, explained_df, return_state=True)
+    return group, df_scored, lof, scaler, state
+
+
+def fit_lof_stratified(df_pca, explained_df, by="pos", workers=None):
+    """Her pozisyon grubu için fit_lof'u paralel çalıştır, skorları orijinal sırayla birleştir.
+
+    Dönüş: (scored DataFrame + lof_group kolonu, {grup: (lof, scaler, LOF durumu)}, seçilen PCA kolonları)
+    """
+    groups = position_groups(df_pca["Pos"], by=by)
+    tasks = [(group, df_pca[groups == group]) for group in sorted(groups.unique())]
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+
+    if workers == 1:
+        results = [_fit_group(group, df_group, explained_df) for group, df_group in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_limit_worker_threads) as pool:
+            results = list(pool.map(_fit_group, [g for g, _ in tasks], [d for _, d in tasks],
+                                    [explained_df] * len(tasks)))
+
+    df_scored = pd.concat([result[1] for result in results]).sort_index()
+    df_scored['lof_group'] = groups
+    models = {group: (lof, scaler, state) for group, _, lof, scaler, state in results}
+    return df_scored, models, select_top_pca_columns(explained_df)
+
+
+def _group_file(group):
+    return "".join(c if c.isalnum() else "_" for c in str(group))
+
+
+def save_stratified_models(models, top_pca_columns, model_dir=STRATIFIED_MODEL_DIR,
+                           transform_path=FEATURE_TRANSFORM_PATH):
+    """Her grubun scaler + LOF'unu ayrı kompakt model klasörü olarak kaydet.
+
+    Gruplar geçici klasöre yazılır ve model_dir onunla değiştirilir: önceki (farklı gruplu)
+    çalıştırmanın grup klasörleri diskte kalmaz.
+    """
+    tmp_dir = model_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        for group, (_, scaler, state) in models.items():
+            build_compact_model(state, scaler, top_pca_columns, transform_path).save(
+                os.path.join(tmp_dir, _group_file(group)))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    remove_stratified_models(model_dir)
+    os.replace(tmp_dir, model_dir)
+    return [os.path.join(model_dir, _group_file(group)) for group in models]
+
+
+def remove_stratified_models(model_dir=STRATIFIED_MODEL_DIR):
+    """Grup modellerini sil ve süreç içi önbellekten çıkar. Dönüş: silindi mi"""
+    if not os.path.isdir(model_dir):
+        return False
+    root = os.path.abspath(model_dir)
+    for key in [key for key in _SCORING_MODELS if os.path.dirname(key) == root]:
+        del _SCORING_MODELS[key]
+    shutil.rmtree(model_dir)
+    return True
+
+
+def invalidate_global_models(state_path=LOF_STATE_PATH, compact_dir=COMPACT_MODEL_DIR):
+    """Global k-NN durumu ve kompakt model artık scored_data.csv ile tutarlı değil: sil.
+
+    --score / --update bayat modelle sessizce çalışmak yerine "önce a4'ü çalıştırın" hatası verir.
+    """
+    removed = []
+    if os.path.exists(state_path):
+        os.remove(state_path)
+        removed.append(state_path)
+    if os.path.isdir(compact_dir):
+        shutil.rmtree(compact_dir)
+        removed.append(compact_dir)
+    _SCORING_MODELS.pop(os.path.abspath(compact_dir), None)
+    return removed
+
+
+def main_stratified(by="pos", workers=None):
+    df_pca = pd.read_csv(PCA_INPUT_CSV)
+    explained_df = pd.read_csv(EXPLAINED_VARIANCE_CSV, index_col=0)
+    print("✓ PCA verileri yüklendi:", PCA_INPUT_CSV)
+
+    start = time.perf_counter()
+    df_scored, models, top_pca_columns = fit_lof_stratified(df_pca, explained_df, by, workers)
+    fit_seconds = time.perf_counter() - start
+    counts = df_scored.groupby('lof_group')['is_anomaly'].agg(['size', 'sum'])
+    for group, row in counts.iterrows():
+        print(f"✓ {group}: {int(row['size'])} oyuncu, {int(row['sum'])} anomali")
+
+    df_scored.to_csv(SCORED_OUTPUT_CSV, index=False)
+    print("✓ Pozisyon bazlı LOF skorları kaydedildi:", SCORED_OUTPUT_CSV)
+    for path in invalidate_global_models():
+        print(f"⚠️  Global model silindi (pozisyon bazlı modda --score / --update desteklenmez): {path}")
+
+    paths = []
+    if os.path.exists(FEATURE_TRANSFORM_PATH):
+        paths = save_stratified_models(models, top_pca_columns)
+        print(f"✓ {len(models)} grup modeli kaydedildi:", STRATIFIED_MODEL_DIR)
+    else:
+        # Eski grup modelleri yeni scored_data.csv ile tutarlı değil
+        if remove_stratified_models():
+            print("⚠️  Önceki grup modelleri silindi:", STRATIFIED_MODEL_DIR)
+        print(f"⚠️  {FEATURE_TRANSFORM_PATH} yok, grup modelleri yazılmadı (önce a3'ü çalıştırın).")
+
+    with run_tracker.start_run("Player_Similarity_LOF") as run:
+        run.log_params({
+            "stratify": by,
+            "n_neighbors": N_NEIGHBORS,
+            "metric": METRIC,
+            "contamination": CONTAMINATION,
+            "selected_pca_columns": ",".join(top_pca_columns),
+            "groups": ",".join(str(g) for g in models),
+        })
+        run.log_metrics({
+            "total_players": len(df_scored),
+            "anomaly_count": int(df_scored['is_anomaly'].sum()),
+            "fit_seconds": fit_seconds,
+        })
+        for path in paths:
+            run.log_artifacts(path, artifact_path=f"models/stratified/{os.path.basename(path)}")
+    return df_scored
+
+# ------------------------------
+# YENİ SATIRLARI SKORLA (yeniden fit etmeden)
+# ------------------------------
+_SCORING_MODELS = {}
+
+
+def load_scoring_models(model_dir=COMPACT_MODEL_DIR):
+    """Kompakt modeli mmap ile bir kez aç, süreç içinde önbellekte tut"""
+    key = os.path.abspath(model_dir)
+    if key not in _SCORING_MODELS:
+        _SCORING_MODELS[key] = CompactLOFModel.load(model_dir, mmap_mode="r")
+    return _SCORING_MODELS[key]
+
+
+def build_compact_model(state, scaler, top_pca_columns, transform_path=FEATURE_TRANSFORM_PATH):
+    """a3 dönüşümü + a4 scaler + LOF durumundan kompakt skorlama modeli"""
+    return CompactLOFModel.from_fitted(
+        load_feature_transform(transform_path), scaler, state, top_pca_columns, LOF_AUTO_THRESHOLD
+    )
+
+
+def score_new_rows(df_new, model=None):
+    """Yeni oyuncu satırlarını dondurulmuş scaler + PCA + LOF (novelty) ile skorla.
+
+    Mevcut oyuncuların skorları ve sıralamaları değişmez.
+    """
+    model = model or load_scoring_models()
+    return model.score_frame(df_new)
+
+
+def main_score(input_csv, output_csv=SCORED_NEW_CSV):
+    df_new = pd.read_csv(input_csv)
+    print(f"✓ Yeni satırlar yüklendi: {input_csv} ({len(df_new)} satır)")
+    df_scored = score_new_rows(df_new)
+    df_scored.to_csv(output_csv, index=False)
+    print(f"✓ Yeni satırlar skorlandı ({int(df_scored['is_anomaly'].sum())} anomali):", output_csv)
+    return df_scored
+
+# ------------------------------
+# ARTIMLI GÜNCELLEME (değişen / eklenen oyuncular)
+# ------------------------------
+def build_lof_state(df_scored, scaler, top_pca_columns):
+    """Skorlanmış tablonun sırasıyla hizalı artımlı LOF durumunu oluştur"""
+    X_scaled = scaler.transform(df_scored[top_pca_columns])
+    return IncrementalLOF(n_neighbors=N_NEIGHBORS, metric=METRIC).fit(X_scaled)
+
+
+def _row_keys(df):
+    key_cols = [c for c in PLAYER_KEY_COLS if c in df.columns]
+    return list(df[key_cols].astype(str).itertuples(index=False, name=None))
+
+
+def _unique_keys(keys, source):
+    """Anahtarlar tekil olmalı; aksi halde aynı oyuncunun önceki satırları güncellenemez"""
+    seen, duplicates = set(), []
+    for key in keys:
+        if key in seen:
+            duplicates.append(key)
+        seen.add(key)
+    if duplicates:
+        raise ValueError(f"❌ {source} içinde tekrar eden oyuncu anahtarı ({', '.join(PLAYER_KEY_COLS)}): "
+                         f"{duplicates[:5]}; artımlı güncelleme için satırlar tekil olmalı.")
+    return keys
+
+
+def update_scored_rows(df_scored, df_changed, state, model=None):
+    """Değişen oyuncuları yerinde güncelle, yenileri ekle; sadece etkilenen LOF skorlarını yenile.
+
+    df_scored ve state aynı satır sırasını paylaşır. Dönüş: (güncel df_scored, etkilenen satırlar)
+    """
+    model = model or load_scoring_models()
+    df_pca, X_changed = model.project(df_changed)
+    top_pca_columns = model.header["pca_columns"]
+
+    positions = {key: i for i, key in enumerate(_unique_keys(_row_keys(df_scored), "scored_data"))}
+    matched = np.array([positions.get(key, -1) for key in _unique_keys(_row_keys(df_pca), "değişen satırlar")])
+    is_update = matched >= 0
+
+    affected = state.update(matched[is_update], X_changed[is_update], X_changed[~is_update])
+
+    df_scored = df_scored.copy()
+    player_cols = [col for col in df_scored.columns if col in df_pca.columns and not col.startswith("PCA")]
+    df_scored.loc[matched[is_update], top_pca_columns] = df_pca.loc[is_update, top_pca_columns].to_numpy()
+    df_new = df_pca.loc[~is_update, player_cols + top_pca_columns]
+    df_scored = pd.concat([df_scored, df_new], ignore_index=True)
+
+    df_scored.loc[affected, 'lof_score'] = state.lof_[affected]
+    df_scored.loc[affected, 'is_anomaly'] = (state.lof_[affected] > LOF_AUTO_THRESHOLD).astype(int)
+    df_scored['is_anomaly'] = df_scored['is_anomaly'].astype(int)
+    return df_scored, affected
+
+
+def main_update(changed_csv, scored_csv=SCORED_OUTPUT_CSV, state_path=LOF_STATE_PATH):
+    """Değişen satırları kayıtlı scaler/PCA ile dönüştür ve scored_data.csv'yi yamala.
+
+    Not: kompakt skorlama modeli güncellenmez; tam yeniden eğitimde yenilenir.
+    """
+    if not os.path.exists(state_path):
+        raise FileNotFoundError(f"Artımlı LOF durumu bulunamadı: {state_path} (önce a4'ü çalıştırın)")
+    state = IncrementalLOF.load(state_path)
+    df_scored = pd.read_csv(scored_csv)
+    if len(df_scored) != len(state.X_):
+        raise ValueError(f"{scored_csv} ile {state_path} hizalı değil; a4'ü yeniden çalıştırın.")
+
+    df_changed = pd.read_csv(changed_csv)
+    print(f"✓ Değişen satırlar yüklendi: {changed_csv} ({len(df_changed)} satır)")
+    df_scored, affected = update_scored_rows(df_scored, df_changed, state)
+
+    tmp_path = scored_csv + ".tmp"
+    df_scored.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, scored_csv)
+    state.save(state_path)
+    print(f"✓ {len(affected)}/{len(df_scored)} oyuncunun LOF skoru yeniden hesaplandı:", scored_csv)
+    return df_scored
+
+# ------------------------------
+# ANA FONKSİYON
+# ------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="LOF modeli eğit veya yeni satırları skorla")
+    parser.add_argument("--score", metavar="INPUT_CSV", default=None,
+                        help="Eğitmek yerine bu CSV'deki yeni satırları kayıtlı modellerle skorla")
+    parser.add_argument("--output", default=SCORED_NEW_CSV, help="Skorlama çıktısı")
+    parser.add_argument("--update", metavar="CHANGED_CSV", default=None,
+                        help="Değişen/yeni oyuncu satırlarıyla scored_data.csv'yi artımlı güncelle")
+    parser.add_argument("--sweep", action="store_true",
+                        help="n_neighbors × PCA sayısı taraması yap (k-NN her alt küme için bir kez)")
+    parser.add_argument("--neighbors", type=int, nargs="*", default=SWEEP_N_NEIGHBORS,
+                        help="Taranacak n_neighbors değerleri")
+    parser.add_argument("--pca-counts", type=int, nargs="*", default=SWEEP_PCA_COUNTS,
+                        help="Taranacak PCA sayıları")
+    parser.add_argument("--neighbor-backend", choices=BACKENDS, default=NEIGHBOR_BACKEND,
+                        help="LOF komşu araması: kesin ağaç/brute veya yaklaşık indeks (approx)")
+    parser.add_argument("--benchmark-neighbors", action="store_true",
+                        help="Arka uçların hızını ve recall'ını kesin sonuca göre raporla")
+    parser.add_argument("--replicate", type=int, default=1,
+                        help="Karşılaştırmada veriyi gürültüyle kaç kat çoğalt")
+    parser.add_argument("--stratify", choices=["pos", "family"], default=None,
+                        help="Her pozisyon (pos) veya pozisyon ailesi (family) için ayrı LOF eğit")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Tarama / pozisyon bazlı eğitim süreç sayısı")
+    parser.add_argument("--no-tracking", action="store_true",
+                        help="MLflow kaydını kapat (benchmark / hızlı deneme)")
+    args = parser.parse_args(argv)
+    if args.sweep:
+        if not args.neighbors or min(args.neighbors) < 1:
+            parser.error("--neighbors en az bir pozitif değer içermeli")
+        if not args.pca_counts or min(args.pca_counts) < 1:
+            parser.error("--pca-counts en az bir pozitif değer içermeli")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.no_tracking:
+        run_tracker.set_enabled(False)
+    if args.score:
+        main_score(args.score, args.output)
+        return
+    if args.update:
+        main_update(args.update)
+        return
+    if args.sweep:
+        main_sweep(args.neighbors, args.pca_counts, args.workers)
+        return
+    if args.benchmark_neighbors:
+        main_benchmark(BACKENDS, args.replicate)
+        return
+    if args.stratify:
+        main_stratified(args.stratify, args.workers)
+        return
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+
+    # 1️⃣ PCA verilerini yükle
+    df_pca = pd.read_csv(PCA_INPUT_CSV)
+    print("✓ PCA verileri yüklendi:", PCA_INPUT_CSV)
+
+    # 2️⃣ Explained variance ratio'yu yükle, 3️⃣-5️⃣ en yüksek 7 PCA ile scaler + LOF
+    explained_df = pd.read_csv(EXPLAINED_VARIANCE_CSV, index_col=0)
+    df_to_save, lof, scaler, top_pca_columns, state = fit_lof(
+        df_pca, explained_df, args.neighbor_backend, return_state=True
+    )
+    print(f"✓ En yüksek {SELECTED_PCA_COUNT} varyanslı PCA seçildi:", top_pca_columns)
+    print("✓ PCA verileri normalize edildi.")
 
     # 7️⃣ CSV olarak kaydet
     df_to_save.to_csv(SCORED_OUTPUT_CSV, index=False)
     print("✓ LOF skorları ve anomali sütunları kaydedildi:", SCORED_OUTPUT_CSV)
+    state.save(LOF_STATE_PATH)
+    print("✓ Artımlı LOF durumu kaydedildi:", LOF_STATE_PATH)
+
+    compact = None
+    if os.path.exists(FEATURE_TRANSFORM_PATH):
+        compact = build_compact_model(state, scaler, top_pca_columns)
+        compact.save(COMPACT_MODEL_DIR)
+        _SCORING_MODELS.pop(os.path.abspath(COMPACT_MODEL_DIR), None)
+        print("✓ Kompakt LOF modeli kaydedildi:", COMPACT_MODEL_DIR)
+    else:
+        print(f"⚠️  {FEATURE_TRANSFORM_PATH} yok, kompakt model yazılmadı (önce a3'ü çalıştırın).")
 
     # ------------------------------
     # 8️⃣ MLflow kaydı
     # ------------------------------
-    mlflow.set_experiment("Player_Similarity_LOF")
-    with mlflow.start_run():
+    # Parametre/metrikler tek log_batch ile, artifact'lar arka planda gönderilir
+    with run_tracker.start_run("Player_Similarity_LOF") as run:
         # Parametreleri kaydet
-        mlflow.log_param("n_neighbors", N_NEIGHBORS)
-        mlflow.log_param("metric", METRIC)
-        mlflow.log_param("contamination", CONTAMINATION)
-        mlflow.log_param("selected_pca_count", SELECTED_PCA_COUNT)
-        mlflow.log_param("selected_pca_columns", ",".join(top_pca_columns))
+        run.log_params({
+            "n_neighbors": N_NEIGHBORS,
+            "metric": METRIC,
+            "contamination": CONTAMINATION,
+            "neighbor_backend": args.neighbor_backend,
+            "selected_pca_count": SELECTED_PCA_COUNT,
+            "selected_pca_columns": ",".join(top_pca_columns),
+        })
         
         # Metrikler
-        mlflow.log_metric("total_players", len(df_to_save))
-        mlflow.log_metric("anomaly_count", int(df_to_save['is_anomaly'].sum()))
-        mlflow.log_metric("normal_count", int((df_to_save['is_anomaly']==0).sum()))
-        mlflow.log_metric("avg_lof_score", float(df_to_save['lof_score'].mean()))
-
-        # Model artifact olarak kaydet
-        model_path = os.path.join(MODEL_DIR, "lof_model.joblib")
-        joblib.dump(lof, model_path)
-        mlflow.log_artifact(model_path, artifact_path="models")
-        print("✓ LOF modeli MLflow artifact olarak kaydedildi:", model_path)
-
-        # Scaler artifact olarak kaydet
-        scaler_path = os.path.join(MODEL_DIR, "scaler.joblib")
-        joblib.dump(scaler, scaler_path)
-        mlflow.log_artifact(scaler_path, artifact_path="models")
-        print("✓ Scaler MLflow artifact olarak kaydedildi:", scaler_path)
+        run.log_metrics({
+            "total_players": len(df_to_save),
+            "anomaly_count": int(df_to_save['is_anomaly'].sum()),
+            "normal_count": int((df_to_save['is_anomaly']==0).sum()),
+            "avg_lof_score": float(df_to_save['lof_score'].mean()),
+        })
+
+        # Model artifact olarak kaydet (pickle yerine .npy dizileri + JSON başlık)
+        if compact is not None:
+            run.log_artifacts(COMPACT_MODEL_DIR, artifact_path="models/lof_compact")
+            print("✓ Kompakt LOF modeli MLflow artifact olarak kaydedildi:", COMPACT_MODEL_DIR)
 
     print("✓ İşlem tamamlandı.")
 
@@ -1,9 +1,14 @@
 import pandas as pd
 import numpy as np
-import mlflow
 import os
+import json
+import time
+import argparse
 from datetime import datetime
 
+import run_tracker
+from player_index import PlayerIndex
+
 # ------------------------------
 # AYARLAR
 # ------------------------------
@@ -16,70 +21,172 @@ TOP_10_CSV = 'data/processed/top_10_players.csv'
 MIDDLE_10_CSV = 'data/processed/middle_10_players.csv'
 BOTTOM_10_CSV = 'data/processed/bottom_10_players.csv'
 ELITE_CSV = 'data/processed/elite_anomalies.csv'
+RANKING_CONFIG_JSON = 'data/processed/ranking_config.json'  # son sıralamada kullanılan kurallar (a6 / llm_reports okur)
 
 SELECTED_PCA_COUNT = 7  # En yüksek varyanslı PCA sayısı
 
+# Sıralama kuralları; --config ile verilen JSON dosyası bu değerlerin üzerine yazar
+RANKING_CONFIG = {
+    "selected_pca_count": SELECTED_PCA_COUNT,
+    "weights": "variance",      # "variance" (açıklanan varyans oranı) veya {"PCA1": 0.4, ...}
+    "elite_bonus": 1.08,        # anomali + split_column eşiğin üstünde
+    "weak_penalty": 0.92,       # anomali + split_column eşiğin altında/eşit
+    "split_column": "PCA1",
+    "split_quantile": 0.5,      # eşik = split_column'un bu yüzdeliği (0.5 → medyan)
+}
+CATEGORY_LABELS = ["normal", "elite", "weak"]  # kategori kodları 0/1/2
+COLUMNS_TO_SAVE = ['rank', 'Player', 'Pos', 'final_score', 'base_score', 'lof_score', 'is_anomaly']
+BENCHMARK_ROWS = 1_000_000
+
+# ------------------------------
+# SIRALAMA KURALLARI
+# ------------------------------
+def load_ranking_config(path=None):
+    """Varsayılan kuralları JSON dosyasındaki değerlerle birleştir"""
+    config = dict(RANKING_CONFIG)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(RANKING_CONFIG)
+        if unknown:
+            raise ValueError(f"❌ Bilinmeyen sıralama ayarları: {sorted(unknown)}")
+        config.update(overrides)
+    return config
+
+
+def save_ranking_config(config, path=RANKING_CONFIG_JSON):
+    """Sıralamada kullanılan kuralları yaz; load_ranking_config(path) aynı kuralları geri verir"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def ranking_weights(df_variance, config):
+    """Kullanılacak PCA kolonları ve normalize ağırlıkları"""
+    if config["weights"] == "variance":
+        top_pca = df_variance.nlargest(config["selected_pca_count"], 'explained_variance_ratio')
+        pca_columns = top_pca.index.tolist()
+        raw_weights = top_pca['explained_variance_ratio'].to_numpy(dtype=np.float64)
+    else:
+        pca_columns = list(config["weights"])
+        raw_weights = np.array([config["weights"][c] for c in pca_columns], dtype=np.float64)
+    return pca_columns, raw_weights / raw_weights.sum()
+
+# ------------------------------
+# SIRALAMA (DataFrame seviyesinde, dosya yazmadan)
+# ------------------------------
+def score_players(df_scored, pca_columns, weights, split_threshold, config=RANKING_CONFIG):
+    """Sabit eşik ile base_score, lof_adjustment, final_score ve kategoriyi ekle (sıralamadan).
+
+    Parça parça (akış modunda) da çağrılabilir. Dönüş: (DataFrame, kategori kodları)
+    """
+    missing = [c for c in pca_columns + [config["split_column"]] if c not in df_scored.columns]
+    if missing:
+        raise ValueError(f"❌ {missing[0]} sütunu scored_data.csv'de bulunamadı!")
+
+    # Base score: seçilen PCA'ların ağırlıklı toplamı (tek matris-vektör çarpımı)
+    base_score = df_scored[pca_columns].to_numpy(dtype=np.float64) @ weights
+
+    # Kategori kodu: 0 normal, 1 elite anomali, 2 zayıf anomali
+    split_values = df_scored[config["split_column"]].to_numpy(dtype=np.float64)
+    is_anomaly = df_scored['is_anomaly'].to_numpy() == 1
+    category = np.where(is_anomaly, np.where(split_values > split_threshold, 1, 2), 0).astype(np.int8)
+
+    # LOF ayarlaması: kategori koduna göre çarpan tablosundan oku
+    multipliers = np.array([1.0, config["elite_bonus"], config["weak_penalty"]])
+    lof_adjustment = multipliers[category]
+
+    df_scored = df_scored.assign(
+        base_score=base_score,
+        lof_adjustment=lof_adjustment,
+        final_score=base_score * lof_adjustment,
+        category=pd.Categorical.from_codes(category, CATEGORY_LABELS),
+    )
+    return df_scored, category
+
+
+def rank_players(df_scored, df_variance, config=None):
+    """Base score + LOF ayarlaması ile final_score ve rank hesapla.
+
+    Tüm kurallar tek geçişte dizi işlemleriyle uygulanır (satır bazlı apply yok).
+    Dönüş: (df_ranked, özet sözlüğü)
+    """
+    config = config or RANKING_CONFIG
+    pca_columns, weights = ranking_weights(df_variance, config)
+    if config["split_column"] not in df_scored.columns:
+        raise ValueError(f"❌ {config['split_column']} sütunu scored_data.csv'de bulunamadı!")
+    split_values = df_scored[config["split_column"]].to_numpy(dtype=np.float64)
+    split_threshold = float(np.nanquantile(split_values, config["split_quantile"]))
+    df_scored, category = score_players(df_scored, pca_columns, weights, split_threshold, config)
+
+    # Sıralama
+    df_ranked = df_scored.sort_values('final_score', ascending=False).reset_index(drop=True)
+    df_ranked['rank'] = df_ranked.index + 1
+
+    summary = {
+        "pca_columns": pca_columns,
+        "weights": weights,
+        "total_variance_used": float(df_variance['explained_variance_ratio'].reindex(pca_columns).sum()),
+        "pca1_median": split_threshold,
+        "elite_anomalies": df_scored[category == 1],
+        "weak_anomalies": df_scored[category == 2],
+        "normal_players": df_scored[category == 0],
+        "config": config,
+    }
+    return df_ranked, summary
+
+
+def benchmark_ranking(n_rows=BENCHMARK_ROWS, n_components=10, seed=0, config=None):
+    """Sentetik n_rows satırda rank_players süresini ölç (saniye, satır/saniye)"""
+    rng = np.random.default_rng(seed)
+    columns = [f"PCA{i+1}" for i in range(n_components)]
+    df_scored = pd.DataFrame(rng.normal(size=(n_rows, n_components)), columns=columns)
+    df_scored['is_anomaly'] = (rng.random(n_rows) < 0.05).astype(int)
+    variance = np.sort(rng.random(n_components))[::-1]
+    df_variance = pd.DataFrame({'explained_variance_ratio': variance / variance.sum()}, index=columns)
+
+    start = time.perf_counter()
+    rank_players(df_scored, df_variance, config)
+    seconds = time.perf_counter() - start
+    return {"rows": n_rows, "seconds": seconds, "rows_per_second": n_rows / seconds}
+
 # ------------------------------
 # ANA FONKSİYON
 # ------------------------------
-def calculate_player_rankings():
+def calculate_player_rankings(config=None):
     # 1️⃣ Verileri yükle
     df_scored = pd.read_csv(SCORED_INPUT_CSV)
     df_variance = pd.read_csv(EXPLAINED_VARIANCE_CSV, index_col=0)
+    config = config or RANKING_CONFIG
     
-    # 2️⃣ En yüksek 7 PCA'yı seç
-    top_pca = df_variance.nlargest(SELECTED_PCA_COUNT, 'explained_variance_ratio')
-    pca_columns = top_pca.index.tolist()
-    variance_values = top_pca['explained_variance_ratio'].values
-    weights = variance_values / variance_values.sum()
-    total_variance_used = variance_values.sum()
+    # 2️⃣-7️⃣ PCA seçimi, base score, LOF ayarlaması, final score, kategoriler, sıralama
+    df_ranked, summary = rank_players(df_scored, df_variance, config)
+    pca_columns = summary["pca_columns"]
+    weights = summary["weights"]
+    total_variance_used = summary["total_variance_used"]
+    pca1_median = summary["pca1_median"]
+    elite_anomalies = summary["elite_anomalies"]
+    weak_anomalies = summary["weak_anomalies"]
+    normal_players = summary["normal_players"]
 
     print(f"✓ Seçilen PCA komponenti: {pca_columns}")
     print(f"✓ Ağırlıklar: {weights}")
     print(f"✓ Toplam açıklanan varyans: {total_variance_used:.4f}")
 
-    # 3️⃣ Base score hesapla
-    df_scored['base_score'] = 0.0
-    for pca, w in zip(pca_columns, weights):
-        if pca not in df_scored.columns:
-            raise ValueError(f"❌ {pca} sütunu scored_data.csv'de bulunamadı!")
-        df_scored['base_score'] += df_scored[pca] * w
-
-    # 4️⃣ LOF ayarlaması
-    pca1_median = df_scored['PCA1'].median()
-    df_scored['lof_adjustment'] = df_scored.apply(
-        lambda row: 1.08 if (row['is_anomaly']==1 and row['PCA1']>pca1_median) 
-                    else 0.92 if (row['is_anomaly']==1 and row['PCA1']<=pca1_median)
-                    else 1.0,
-        axis=1
-    )
-
-    # 5️⃣ Final score
-    df_scored['final_score'] = df_scored['base_score'] * df_scored['lof_adjustment']
-
-    # 6️⃣ Kategoriler
-    elite_anomalies = df_scored[(df_scored['is_anomaly']==1) & (df_scored['PCA1']>pca1_median)]
-    weak_anomalies = df_scored[(df_scored['is_anomaly']==1) & (df_scored['PCA1']<=pca1_median)]
-    normal_players = df_scored[df_scored['is_anomaly']==0]
-
     print(f"\n✓ Elite anomaliler: {len(elite_anomalies)}")
     print(f"✓ Zayıf anomaliler: {len(weak_anomalies)}")
     print(f"✓ Normal oyuncular: {len(normal_players)}")
 
-    # 7️⃣ Sıralama
-    df_ranked = df_scored.sort_values('final_score', ascending=False).reset_index(drop=True)
-    df_ranked['rank'] = df_ranked.index + 1
-
     # ------------------------------
     # 8️⃣ DOSYALARA KAYIT
     # ------------------------------
     os.makedirs(os.path.dirname(OUTPUT_RANKINGS_CSV), exist_ok=True)
-    columns_to_save = [
-        'rank', 'Player', 'Pos', 'final_score', 'base_score', 'lof_score', 'is_anomaly'
-    ]
+    columns_to_save = COLUMNS_TO_SAVE
 
-    # 8a️⃣ Tüm sıralama
+    # 8a️⃣ Tüm sıralama (+ kullanılan kurallar)
     df_ranked[columns_to_save].to_csv(OUTPUT_RANKINGS_CSV, index=False)
+    save_ranking_config(config)
 
     # 8b️⃣ İlk 10
     df_ranked.head(10)[columns_to_save].to_csv(TOP_10_CSV, index=False)
@@ -93,7 +200,7 @@ def calculate_player_rankings():
     df_ranked.tail(10)[columns_to_save].to_csv(BOTTOM_10_CSV, index=False)
 
     # Elite anomaliler
-    elite_anomalies_sorted = elite_anomalies.sort_values('final_score', ascending=False)
+    elite_anomalies_sorted = elite_anomalies.drop(columns="category").sort_values('final_score', ascending=False)
     elite_anomalies_sorted.to_csv(ELITE_CSV, index=False)
 
     print(f"\n✓ Tüm sıralama kaydedildi: {OUTPUT_RANKINGS_CSV}")
@@ -105,40 +212,56 @@ def calculate_player_rankings():
     # ------------------------------
     # 9️⃣ MLflow kaydı
     # ------------------------------
-    mlflow.set_experiment("Player_Ranking_Evaluation")
-    with mlflow.start_run(run_name=f"player_ranking_{datetime.now().strftime('%Y%m%d_%H%M%S')}"):
-        mlflow.log_param("n_components_used", len(pca_columns))
-        mlflow.log_param("pca_components", ",".join(pca_columns))
-        mlflow.log_param("total_variance_used", float(total_variance_used))
-        mlflow.log_param("elite_bonus", 1.08)
-        mlflow.log_param("weak_penalty", 0.92)
-        mlflow.log_param("pca1_median_threshold", float(pca1_median))
-        mlflow.log_param("elite_count", len(elite_anomalies))
-        mlflow.log_param("weak_count", len(weak_anomalies))
-        mlflow.log_param("normal_count", len(normal_players))
-        
-        for pca, w in zip(pca_columns, weights):
-            mlflow.log_param(f"weight_{pca}", float(w))
+    counts = {"elite": len(elite_anomalies), "weak": len(weak_anomalies), "normal": len(normal_players)}
+    log_rankings_to_mlflow(pca_columns, weights, total_variance_used, pca1_median, counts, config)
+
+    return df_ranked
+
+def log_rankings_to_mlflow(pca_columns, weights, total_variance_used, split_threshold, counts, config,
+                           artifacts=None):
+    artifacts = artifacts or [OUTPUT_RANKINGS_CSV, TOP_10_CSV, MIDDLE_10_CSV, BOTTOM_10_CSV, ELITE_CSV]
+    run_name = f"player_ranking_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    # Parametreler tek log_batch ile, artifact'lar arka planda gönderilir
+    with run_tracker.start_run("Player_Ranking_Evaluation", run_name=run_name) as run:
+        run.log_params({
+            "n_components_used": len(pca_columns),
+            "pca_components": ",".join(pca_columns),
+            "total_variance_used": float(total_variance_used),
+            "elite_bonus": config["elite_bonus"],
+            "weak_penalty": config["weak_penalty"],
+            "split_column": config["split_column"],
+            "split_quantile": config["split_quantile"],
+            "pca1_median_threshold": float(split_threshold),
+            "elite_count": counts["elite"],
+            "weak_count": counts["weak"],
+            "normal_count": counts["normal"],
+        })
+        run.log_params({f"weight_{pca}": float(w) for pca, w in zip(pca_columns, weights)})
         
-        mlflow.log_artifact(OUTPUT_RANKINGS_CSV)
-        mlflow.log_artifact(TOP_10_CSV)
-        mlflow.log_artifact(MIDDLE_10_CSV)
-        mlflow.log_artifact(BOTTOM_10_CSV)
-        mlflow.log_artifact(ELITE_CSV)
+        for path in artifacts:
+            run.log_artifact(path)
         
-        print("✓ MLflow'a kaydedildi.")
+        if run.enabled:
+            print("✓ MLflow kaydı arka planda gönderiliyor.")
 
-    return df_ranked
+# ------------------------------
+# Oyuncu arama (tam ad → önek → bulanık; tablo taranmaz)
+# ------------------------------
+def find_player(df_ranked, player_name, index=None):
+    """İndeksle oyuncunun satırını bul; index verilmezse bir kez kurulur. Bulunamazsa None"""
+    if index is None:
+        index = PlayerIndex.from_frame(df_ranked)
+    offsets = index.search(player_name, limit=1)
+    return df_ranked.iloc[offsets[0]] if offsets else None
 
 # ------------------------------
 # Oyuncu detayları
 # ------------------------------
-def display_player_details(df_ranked, player_name):
-    player = df_ranked[df_ranked['Player'].str.contains(player_name, case=False, na=False)]
-    if player.empty:
+def display_player_details(df_ranked, player_name, index=None):
+    player = find_player(df_ranked, player_name, index)
+    if player is None:
         print(f"❌ '{player_name}' bulunamadı!")
         return
-    player = player.iloc[0]
     print(f"\n{'='*60}")
     print(f"🏀 {player['Player']} - {player['Pos']}")
     print(f"{'='*60}")
@@ -152,17 +275,16 @@ def display_player_details(df_ranked, player_name):
 # ------------------------------
 # Oyuncu karşılaştırma
 # ------------------------------
-def compare_players(df_ranked, player1, player2):
-    p1_data = df_ranked[df_ranked['Player'].str.contains(player1, case=False, na=False)]
-    p2_data = df_ranked[df_ranked['Player'].str.contains(player2, case=False, na=False)]
+def compare_players(df_ranked, player1, player2, index=None):
+    if index is None:
+        index = PlayerIndex.from_frame(df_ranked)
+    p1 = find_player(df_ranked, player1, index)
+    p2 = find_player(df_ranked, player2, index)
     
-    if p1_data.empty or p2_data.empty:
+    if p1 is None or p2 is None:
         print(f"❌ Oyuncu bulunamadı!")
         return
     
-    p1 = p1_data.iloc[0]
-    p2 = p2_data.iloc[0]
-    
     print(f"\n{'='*60}")
     print(f"⚔️  {p1['Player']} VS {p2['Player']}")
     print(f"{'='*60}")
@@ -172,9 +294,47 @@ def compare_players(df_ranked, player1, player2):
 # ------------------------------
 # MAIN FONKSİYON
 # ------------------------------
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Oyuncu sıralaması")
+    parser.add_argument("--config", default=None,
+                        help="Sıralama kurallarını (ağırlıklar, çarpanlar, eşik) geçersiz kılan JSON dosyası")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Belleğe sığmayan tablolar için parça parça (external sort) sıralama")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Akış modunda parça boyu")
+    parser.add_argument("--benchmark", type=int, nargs="?", const=BENCHMARK_ROWS, default=None,
+                        metavar="ROWS", help="Sentetik veride sıralama motorunun hızını ölç")
+    parser.add_argument("--bootstrap", type=int, nargs="?", const=500, default=None, metavar="B",
+                        help="Filtrelenmiş sezonu B kez yeniden örnekleyip sıralama aralıklarını hesapla")
+    parser.add_argument("--workers", type=int, default=None, help="Bootstrap modunda süreç sayısı")
+    parser.add_argument("--no-tracking", action="store_true",
+                        help="MLflow kaydını kapat (benchmark / hızlı deneme)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = load_ranking_config(args.config)
+    if args.no_tracking:
+        run_tracker.set_enabled(False)
+    if args.benchmark:
+        result = benchmark_ranking(args.benchmark, config=config)
+        print(f"✓ {result['rows']:,} satır {result['seconds']:.2f} sn'de sıralandı "
+              f"({result['rows_per_second']:,.0f} satır/sn)")
+        return result
+
+    if args.streaming:
+        import streaming_rankings  # a5'i import ettiği için burada yüklenir
+        argv = ["--chunksize", str(args.chunksize)] + (["--config", args.config] if args.config else [])
+        return streaming_rankings.main(argv)
+
+    if args.bootstrap:
+        import rank_stability  # a5'i import ettiği için burada yüklenir
+        argv = ["--bootstrap", str(args.bootstrap)] + (["--config", args.config] if args.config else [])
+        argv += ["--workers", str(args.workers)] if args.workers else []
+        return rank_stability.main(argv)
+
     print("🏀 NBA Oyuncu Sıralaması Başlıyor...\n")
-    df_ranked = calculate_player_rankings()
+    df_ranked = calculate_player_rankings(config)
     
     print("\n✅ Tüm işlemler tamamlandı!\n")
     
@@ -5,6 +5,11 @@ import plotly.graph_objects as go
 import os
 from dotenv import load_dotenv  # <<< YENİ İTHALAT
 
+from player_index import PlayerIndex
+from llm_cache import LLMResponseCache, LLM_CACHE_PATH, GenerationStats, RateLimitTimeout, stream_generate, data_version
+from llm_reports import (GEMINI_MODEL, GENERATION_CONFIG, PlayerContext, build_comparison_prompt,
+                         comparison_order, positional_medians)
+
 def main():
     # ------------------------------
     # Sayfa Yapılandırması
@@ -19,7 +24,6 @@ def main():
     # ------------------------------
     # Gemini API Key ve İstemci (Ortam değişkeninden okunur)
     # ------------------------------
-    GEMINI_MODEL = "gemini-2.5-flash" 
     gemini_client = None
 
     api_key_from_env = os.environ.get("GEMINI_API_KEY") 
@@ -43,8 +47,12 @@ def main():
     PCA_LOADINGS_CSV = "data/processed/pca_loadings_sorted.csv"
     EXPLAINED_VAR_CSV = "data/processed/explained_variance_ratio.csv"
     PCA_FEATURES_CSV = "data/processed/pca_features.csv"
+    FEATURE_TRANSFORM_PATH = "models/feature_transform.joblib"   # a3: scaler + PCA
+    RANKING_CONFIG_JSON = "data/processed/ranking_config.json"   # a5: kullanılan sıralama kuralları
     LOF_TXT_FILE = r"C:\Users\seren\OneDrive\Masaüstü\VisualStudio\Yeni klasör (4)\proje23\lof.txt"
 
+    LLM_CACHE_FILE = LLM_CACHE_PATH  # Gemini yanıt önbelleği (SQLite)
+
     TOP_10_CSV = "data/processed/top_10_players.csv"
     MIDDLE_10_CSV = "data/processed/middle_10_players.csv"
     BOTTOM_10_CSV = "data/processed/bottom_10_players.csv"
@@ -65,6 +73,31 @@ def main():
 
     df_ranked, df_clean, df_clean_filtered, df_missing = load_data()
 
+    # Oyuncu indeksi: CSV değişince (mtime) yeniden kurulur, oturumlar arasında paylaşılır
+    @st.cache_resource
+    def load_player_index(_df_ranked, csv_mtime):
+        return PlayerIndex.from_frame(_df_ranked)
+
+    player_index = load_player_index(df_ranked, os.path.getmtime(PLAYER_RANKED_CSV))
+
+    # Yanıt önbelleği tüm oturumlarda tek bağlantı; anahtar sıralama verisinin sürümünü içerir
+    @st.cache_resource
+    def load_llm_cache():
+        return LLMResponseCache(LLM_CACHE_FILE)
+
+    llm_cache = load_llm_cache()
+
+    # Prompt bağlamı (PCA katkıları): a3 dönüşümü veya a5 kuralları değişince yeniden hesaplanır
+    @st.cache_resource
+    def load_player_context(mtimes):
+        return PlayerContext.from_files(CLEAN_DATA_FILTERED_CSV, PCA_LOADINGS_CSV, EXPLAINED_VAR_CSV,
+                                        transform_path=FEATURE_TRANSFORM_PATH)
+
+    context_files = (CLEAN_DATA_FILTERED_CSV, PCA_LOADINGS_CSV, EXPLAINED_VAR_CSV,
+                     FEATURE_TRANSFORM_PATH, RANKING_CONFIG_JSON)
+    player_context = load_player_context(tuple(
+        os.path.getmtime(path) if os.path.exists(path) else None for path in context_files))
+
     # ============================================================
     # ORİJİNAL OYUNCU KARŞILAŞTIRMA KODU
     # ============================================================
@@ -75,15 +108,30 @@ def main():
     """)
 
     st.sidebar.header("🎯 Oyuncu Seçimi")
-    players = df_ranked['Player'].tolist()
+    search_query = st.sidebar.text_input("🔎 Oyuncu ara", "")
+    players = player_index.names
+    if search_query.strip():
+        # Tam ad → önek (ad/soyad) → bulanık eşleşme; tablo taranmaz
+        players = [player_index.names[i] for i in player_index.search(search_query, limit=50)] or players
     default_p1 = 0
     default_p2 = min(1, len(players)-1)
     player1_name = st.sidebar.selectbox("Oyuncu 1", players, index=default_p1, key="p1")
     player2_name = st.sidebar.selectbox("Oyuncu 2", players, index=default_p2, key="p2")
+    # Pozisyon medyanıyla karşılaştırma raporları llm_reports ile önceden üretilebilir
+    versus_median = st.sidebar.checkbox("📊 Oyuncu 2 yerine pozisyon medyanı", key="vs_median")
 
     if st.sidebar.button("⚔️ Karşılaştır", type="primary", use_container_width=True):
-        p1_data = df_ranked[df_ranked['Player'] == player1_name].iloc[0]
-        p2_data = df_ranked[df_ranked['Player'] == player2_name].iloc[0]
+        p1_data = df_ranked.iloc[player_index.first(player1_name)]
+        medians = positional_medians(df_ranked) if versus_median else {}
+        if versus_median and p1_data['Pos'] not in medians:
+            # Pozisyonu boş (NaN) oyuncunun medyanı yok; seçili Oyuncu 2 ile devam et
+            st.warning(f"⚠️ {player1_name} için pozisyon bilgisi yok; Oyuncu 2 ile karşılaştırılıyor.")
+            versus_median = False
+        if versus_median:
+            p2_data = medians[p1_data['Pos']]
+            player2_name = p2_data['Player']
+        else:
+            p2_data = df_ranked.iloc[player_index.first(player2_name)]
 
         # Skor Karşılaştırması
         scores = ['final_score', 'base_score', 'lof_score']
@@ -156,35 +204,25 @@ def main():
         # GEMINI Analizi
         if gemini_client:
             st.subheader(f"🤖 {GEMINI_MODEL} Analizi")
-            prompt = f"""
-Uzman bir NBA veri analisti ve spor yorumcusu olarak, iki NBA oyuncusunu karşılaştır ve detaylı analiz yap.
-Analizini şu başlıklarla yapılandır: 1. Genel Değerlendirme, 2. Güçlü Yönler, 3. Zayıf Yönler, 4. Sonuç.
-
-Oyuncu 1: {player1_name}
-Rank: {p1_data['rank']}
-Final Score: {p1_data['final_score']}
-Base Score: {p1_data['base_score']}
-LOF Score: {p1_data['lof_score']}
-Anomali: {'Evet' if p1_data['is_anomaly']==1 else 'Hayır'}
-Pozisyon: {p1_data.get('Pos', 'N/A')}
-
-Oyuncu 2: {player2_name}
-Rank: {p2_data['rank']}
-Final Score: {p2_data['final_score']}
-Base Score: {p2_data['base_score']}
-LOF Score: {p2_data['lof_score']}
-Anomali: {'Evet' if p2_data['is_anomaly']==1 else 'Hayır'}
-Pozisyon: {p2_data.get('Pos', 'N/A')}
-
-Yanıt Türkçe olsun ve metriklerin oyuncunun sıralamadaki yerini nasıl etkilediğini açıkla.
-"""
+            # Medyan her zaman Oyuncu 2; iki oyuncuda sıralamada önde olan Oyuncu 1 (toplu işle aynı prompt)
+            pair = (player1_name, p1_data, player2_name, p2_data)
+            prompt = build_comparison_prompt(*(pair if versus_median else comparison_order(*pair)), player_context)
             try:
-                with st.spinner(f"{GEMINI_MODEL} analiz yapıyor..."):
-                    response = gemini_client.models.generate_content(
-                        model=GEMINI_MODEL,
-                        contents=prompt,
-                    )
-                    st.write(response.text)
+                # Metin parça parça geldikçe yazılır; akış desteklenmezse tek parça gelir
+                generation = GenerationStats()
+                st.write_stream(stream_generate(
+                    gemini_client, GEMINI_MODEL, prompt, llm_cache,
+                    data_version(PLAYER_RANKED_CSV), generation, config=GENERATION_CONFIG,
+                ))
+                if generation.from_cache:
+                    st.caption("⚡ Önbellekten (aynı oyuncular ve aynı sıralama verisi)")
+                elif generation.ttft_seconds is not None:
+                    shared = " · aynı anda açılan istekle paylaşıldı" if generation.coalesced else ""
+                    queued = f" · sırada {generation.queue_seconds:.1f} sn" if generation.queue_seconds >= 0.1 else ""
+                    st.caption(f"İlk token: {generation.ttft_seconds:.2f} sn · "
+                               f"Toplam: {generation.total_seconds:.1f} sn{queued}{shared}")
+            except RateLimitTimeout as e:
+                st.warning(f"⚠️ {e}")
             except Exception as e:
                 st.error(f"❌ Gemini hatası: {str(e)}")
 
@@ -193,6 +231,12 @@ Yanıt Türkçe olsun ve metriklerin oyuncunun sıralamadaki yerini nasıl etkil
     st.sidebar.markdown(f"**Toplam Oyuncu**: {len(df_ranked)}")
     st.sidebar.markdown(f"**Anomali**: {df_ranked['is_anomaly'].sum()}")
     st.sidebar.markdown(f"**Normal**: {(df_ranked['is_anomaly']==0).sum()}")
+    ttft_summary = llm_cache.generation_summary()
+    if ttft_summary["count"]:
+        st.sidebar.markdown(f"**İlk token (p50/p95)**: {ttft_summary['ttft_p50']:.2f} / "
+                            f"{ttft_summary['ttft_p95']:.2f} sn")
+        st.sidebar.markdown(f"**Sıra bekleme (p50/p95)**: {ttft_summary['queue_p50']:.2f} / "
+                            f"{ttft_summary['queue_p95']:.2f} sn · paylaşılan: {ttft_summary['coalesced']}")
 
 
 
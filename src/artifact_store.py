@@ -0,0 +1,305 @@
+"""
+İçerik Adresli Artifact Deposu
+MLflow her run'da artifact'ları yeni bir klasöre kopyalar; aynı model / CSV'ler tekrar tekrar yazılır.
+Burada her dosya SHA-256 özetiyle bir kez saklanır:
+    artifact_store/objects/ab/abcdef...      → ham içerik
+    artifact_store/objects/ab/abcdef....gz   → sıkıştırılmış içerik (CSV çıktıları)
+Run'lar sadece bir manifest'e (mantıksal yol → özet) işaret eder; manifest de depoda saklanır ve
+özeti run'a `artifact_manifest` etiketi olarak yazılır.
+
+Komutlar:
+    python src/artifact_store.py stats
+    python src/artifact_store.py restore RUN_ID HEDEF_KLASÖR
+    python src/artifact_store.py gc [--grace-seconds N] [--dry-run]
+    python src/artifact_store.py migrate [--delete-originals]
+        → eski run'ların artifacts/ klasörlerini depoya kopyala (silme isteğe bağlı)
+"""
+
+import os
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+ARTIFACT_STORE_DIR = os.environ.get("ARTIFACT_STORE_DIR", "artifact_store")
+COMPRESS_SUFFIXES = (".csv",)     # bu uzantılar gzip ile saklanır
+COMPRESS_LEVEL = 6
+MANIFEST_TAG = "artifact_manifest"
+MANIFEST_VERSION = 1
+GC_GRACE_SECONDS = 3600           # henüz manifest'i yazılmamış (süren) run'ların nesneleri korunur
+HASH_CHUNK = 1 << 20
+
+# ------------------------------
+# DEPO
+# ------------------------------
+def file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ArtifactStore:
+    """Özet → nesne dosyası; aynı içerik ikinci kez yazılmaz"""
+
+    def __init__(self, root=ARTIFACT_STORE_DIR, compress=True):
+        self.root = root
+        self.compress = compress
+        self.objects_dir = os.path.join(root, "objects")
+
+    def _object_path(self, digest, compressed):
+        return os.path.join(self.objects_dir, digest[:2], digest + (".gz" if compressed else ""))
+
+    def find(self, digest):
+        """Var olan nesnenin (yol, sıkıştırılmış mı) bilgisi veya None"""
+        for compressed in (False, True):
+            path = self._object_path(digest, compressed)
+            if os.path.exists(path):
+                return path, compressed
+        return None
+
+    def _write_object(self, digest, compressed, write):
+        """Geçici dosyaya yaz, sonra atomik olarak yerine taşı (yarım nesne kalmaz)"""
+        path = self._object_path(digest, compressed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if compressed:
+                    # mtime=0 → aynı içerik her zaman aynı .gz baytları
+                    with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=COMPRESS_LEVEL, mtime=0) as gz:
+                        write(gz)
+                else:
+                    write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def put(self, path):
+        """Dosyayı depola. Dönüş: manifest girdisi {sha256, size, compression}"""
+        digest = file_digest(path)
+        existing = self.find(digest)
+        if existing is None:
+            compressed = self.compress and path.lower().endswith(COMPRESS_SUFFIXES)
+
+            def copy(f):
+                with open(path, "rb") as src:
+                    shutil.copyfileobj(src, f, HASH_CHUNK)
+
+            self._write_object(digest, compressed, copy)
+        else:
+            os.utime(existing[0])  # çöp toplamanın bekleme süresi yeniden başlar
+            compressed = existing[1]
+        return {"sha256": digest, "size": os.path.getsize(path), "compression": "gzip" if compressed else None}
+
+    def put_bytes(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if self.find(digest) is None:
+            self._write_object(digest, False, lambda f: f.write(data))
+        return digest
+
+    def read_bytes(self, digest):
+        found = self.find(digest)
+        if found is None:
+            raise FileNotFoundError(f"Depoda nesne yok: {digest}")
+        path, compressed = found
+        with (gzip.open(path, "rb") if compressed else open(path, "rb")) as f:
+            return f.read()
+
+    def restore(self, digest, dest_path):
+        """Nesneyi orijinal (sıkıştırılmamış) haliyle dest_path'e yaz"""
+        found = self.find(digest)
+        if found is None:
+            raise FileNotFoundError(f"Depoda nesne yok: {digest}")
+        path, compressed = found
+        os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+        with (gzip.open(path, "rb") if compressed else open(path, "rb")) as src, open(dest_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, HASH_CHUNK)
+        return dest_path
+
+    def objects(self):
+        """(özet, yol) çiftleri"""
+        if not os.path.isdir(self.objects_dir):
+            return
+        for prefix in sorted(os.listdir(self.objects_dir)):
+            folder = os.path.join(self.objects_dir, prefix)
+            for name in sorted(os.listdir(folder)):
+                if not name.endswith(".tmp"):
+                    yield name.split(".")[0], os.path.join(folder, name)
+
+    # ---- manifest ----
+    def add_path(self, manifest, path, artifact_path=None):
+        """Dosyayı veya klasörü (mlflow log_artifact(s) ile aynı yol kuralıyla) manifest'e ekle"""
+        if os.path.isdir(path):
+            for folder, _, files in os.walk(path):
+                for name in sorted(files):
+                    full = os.path.join(folder, name)
+                    rel = os.path.relpath(full, path).replace(os.sep, "/")
+                    manifest[f"{artifact_path}/{rel}" if artifact_path else rel] = self.put(full)
+        else:
+            name = os.path.basename(path)
+            manifest[f"{artifact_path}/{name}" if artifact_path else name] = self.put(path)
+        return manifest
+
+    def save_manifest(self, manifest):
+        data = json.dumps({"format_version": MANIFEST_VERSION, "files": manifest},
+                          sort_keys=True, indent=1).encode("utf-8")
+        return self.put_bytes(data)
+
+    def load_manifest(self, digest):
+        return json.loads(self.read_bytes(digest))["files"]
+
+    # ---- çöp toplama ----
+    def gc(self, reachable, grace_seconds=GC_GRACE_SECONDS, dry_run=False):
+        """`reachable` dışındaki, grace_seconds'tan eski nesneleri sil. Dönüş: (silinen sayı, bayt)"""
+        now = time.time()
+        removed, freed = 0, 0
+        for digest, path in list(self.objects()):
+            if digest in reachable or now - os.path.getmtime(path) < grace_seconds:
+                continue
+            removed += 1
+            freed += os.path.getsize(path)
+            if not dry_run:
+                os.remove(path)
+        return removed, freed
+
+# ------------------------------
+# MLFLOW ENTEGRASYONU
+# ------------------------------
+def _all_runs(client):
+    """Silinmiş (geri alınabilir) run'lar dahil tüm run'lar; sayfalı arama"""
+    from mlflow.entities import ViewType
+
+    for experiment in client.search_experiments(view_type=ViewType.ALL):
+        token = None
+        while True:
+            page = client.search_runs([experiment.experiment_id], run_view_type=ViewType.ALL,
+                                      max_results=1000, page_token=token)
+            yield from page
+            token = page.token
+            if not token:
+                break
+
+
+def run_manifest(client, run_id, store):
+    digest = client.get_run(run_id).data.tags.get(MANIFEST_TAG)
+    return store.load_manifest(digest) if digest else None
+
+
+def restore_run(client, run_id, dest_dir, store):
+    """Run'ın artifact'larını depodan dest_dir altına orijinal yollarıyla çıkar"""
+    manifest = run_manifest(client, run_id, store)
+    if manifest is None:
+        raise ValueError(f"Run'da {MANIFEST_TAG} etiketi yok: {run_id}")
+    for rel_path, entry in manifest.items():
+        store.restore(entry["sha256"], os.path.join(dest_dir, *rel_path.split("/")))
+    return sorted(manifest)
+
+
+def reachable_digests(client, store):
+    """Tüm run manifest'lerinin ve içerdikleri nesnelerin özetleri"""
+    reachable = set()
+    for run in _all_runs(client):
+        digest = run.data.tags.get(MANIFEST_TAG)
+        if digest and store.find(digest):
+            reachable.add(digest)
+            reachable.update(entry["sha256"] for entry in store.load_manifest(digest).values())
+    return reachable
+
+
+def collect_garbage(client, store, grace_seconds=GC_GRACE_SECONDS, dry_run=False):
+    return store.gc(reachable_digests(client, store), grace_seconds, dry_run)
+
+
+def migrate_runs(client, store, tracking_root, delete_originals=False):
+    """Dosya tabanlı depodaki eski run'ların artifacts/ klasörlerini depoya taşı.
+
+    Her run için manifest yazılır ve etiket eklenir. Orijinal kopyalar sadece
+    delete_originals=True ile silinir. Dönüş: taşınan run sayısı
+    """
+    migrated = 0
+    for run in _all_runs(client):
+        if MANIFEST_TAG in run.data.tags:
+            continue
+        artifacts_dir = os.path.join(tracking_root, run.info.experiment_id, run.info.run_id, "artifacts")
+        if not os.path.isdir(artifacts_dir) or not os.listdir(artifacts_dir):
+            continue
+        manifest = store.add_path({}, artifacts_dir)
+        client.set_tag(run.info.run_id, MANIFEST_TAG, store.save_manifest(manifest))
+        if delete_originals:
+            shutil.rmtree(artifacts_dir)
+            os.makedirs(artifacts_dir)
+        migrated += 1
+    return migrated
+
+
+def _tracking_root():
+    from mlflow.tracking import get_tracking_uri
+    from urllib.parse import urlparse, unquote
+
+    uri = get_tracking_uri()
+    parsed = urlparse(uri)
+    if parsed.scheme not in ("", "file"):
+        raise ValueError(f"migrate sadece dosya tabanlı MLflow deposunda çalışır: {uri}")
+    return unquote(parsed.path) if parsed.scheme == "file" else uri
+
+# ------------------------------
+# ANA FONKSİYON
+# ------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="İçerik adresli artifact deposu")
+    parser.add_argument("--root", default=ARTIFACT_STORE_DIR, help="Depo klasörü")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Nesne sayısı ve disk kullanımı")
+    restore = sub.add_parser("restore", help="Bir run'ın artifact'larını klasöre çıkar")
+    restore.add_argument("run_id")
+    restore.add_argument("dest")
+    gc = sub.add_parser("gc", help="Hiçbir run'ın kullanmadığı nesneleri sil")
+    gc.add_argument("--grace-seconds", type=int, default=GC_GRACE_SECONDS,
+                    help="Bu süreden yeni nesnelere dokunma (süren run'lar için)")
+    gc.add_argument("--dry-run", action="store_true", help="Silmeden sadece raporla")
+    migrate = sub.add_parser("migrate", help="Eski run'ların artifacts/ kopyalarını depoya taşı")
+    migrate.add_argument("--delete-originals", action="store_true",
+                         help="Depoya yazılan run'ların artifacts/ kopyalarını sil (varsayılan: koru)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    store = ArtifactStore(args.root)
+    if args.command == "stats":
+        sizes = [os.path.getsize(path) for _, path in store.objects()]
+        print(f"✓ {len(sizes)} nesne, {sum(sizes) / 1e6:.2f} MB: {store.objects_dir}")
+        return len(sizes)
+
+    from mlflow.tracking import MlflowClient
+    client = MlflowClient()
+    if args.command == "restore":
+        paths = restore_run(client, args.run_id, args.dest, store)
+        print(f"✓ {len(paths)} dosya çıkarıldı: {args.dest}")
+        return paths
+    if args.command == "gc":
+        removed, freed = collect_garbage(client, store, args.grace_seconds, args.dry_run)
+        action = "silinecek" if args.dry_run else "silindi"
+        print(f"✓ {removed} kullanılmayan nesne {action} ({freed / 1e6:.2f} MB)")
+        return removed
+    if args.command == "migrate":
+        migrated = migrate_runs(client, store, _tracking_root(), args.delete_originals)
+        print(f"✓ {migrated} run'ın artifact'ları depoya taşındı")
+        if migrated and not args.delete_originals:
+            print("⚠️  Orijinal artifacts/ kopyaları korundu (silmek için --delete-originals)")
+        return migrated
+
+# ------------------------------
+# ÇALIŞTIR
+# ------------------------------
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+CSV dosyalarının tipli, sütunsal (Parquet) kopyası
+İlk okumada CSV'den üretilir; sonraki okumalar sütun projeksiyonuyla Parquet'ten yapılır.
+Kaynak CSV değiştiğinde (boyut / değiştirilme zamanı) önbellek bayat sayılır.
+"""
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+CATEGORICAL_COLS = ["Player", "Pos", "Team"]
+PARTITION_DICT_INDEX = "int32"   # part dosyalarında sabit sözlük indeks genişliği (parça boyundan bağımsız)
+FINGERPRINT_KEY = b"source_fingerprint"
+
+INT16_MIN, INT16_MAX = np.iinfo(np.int16).min, np.iinfo(np.int16).max
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+# ------------------------------
+# YARDIMCI FONKSİYONLAR
+# ------------------------------
+def pyarrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def cache_path_for(csv_path):
+    """CSV ile aynı klasörde .parquet uzantılı önbellek yolu"""
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def source_fingerprint(csv_path):
+    """Kaynak CSV için ucuz parmak izi (boyut + mtime)"""
+    stat = os.stat(csv_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def compact_dtypes(df):
+    """Sayısal kolonları küçült (int16/int32/float32), metin kolonlarını kategoriye çevir"""
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORICAL_COLS:
+            df[col] = series.astype("category")
+        elif pd.api.types.is_bool_dtype(series):
+            continue
+        elif pd.api.types.is_integer_dtype(series) or (
+            pd.api.types.is_float_dtype(series)
+            and series.notna().all()
+            and np.array_equal(series.to_numpy(), np.round(series.to_numpy()))
+        ):
+            if series.empty:
+                continue
+            lo, hi = series.min(), series.max()
+            if INT16_MIN <= lo and hi <= INT16_MAX:
+                df[col] = series.astype(np.int16)
+            elif INT32_MIN <= lo and hi <= INT32_MAX:
+                df[col] = series.astype(np.int32)
+        elif pd.api.types.is_float_dtype(series):
+            df[col] = series.astype(np.float32)
+    return df
+
+# ------------------------------
+# ÖNBELLEK YAZ / KONTROL ET
+# ------------------------------
+def write_cache(df, csv_path, cache_path=None):
+    """DataFrame'in tipli kopyasını kaynak CSV'nin parmak iziyle birlikte kaydet"""
+    if not pyarrow_available():
+        print("⚠️  pyarrow bulunamadı, Parquet önbelleği yazılmadı.")
+        return None
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    cache_path = cache_path or cache_path_for(csv_path)
+    table = pa.Table.from_pandas(compact_dtypes(df), preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[FINGERPRINT_KEY] = source_fingerprint(csv_path).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+
+    # Benzersiz geçici ad: aynı önbelleği yazan eşzamanlı süreçler birbirinin dosyasını bozmaz
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)), suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    print(f"✓ Sütunsal önbellek yazıldı: {cache_path}")
+    return cache_path
+
+
+def build_cache(csv_path, cache_path=None):
+    """CSV'yi bir kez ayrıştırıp önbelleği oluştur"""
+    df = pd.read_csv(csv_path)
+    write_cache(df, csv_path, cache_path)
+    return df
+
+
+def is_cache_fresh(csv_path, cache_path=None):
+    """Önbellek var ve kaynak CSV ile aynı parmak izini taşıyor mu?"""
+    cache_path = cache_path or cache_path_for(csv_path)
+    if not os.path.exists(cache_path) or not pyarrow_available():
+        return False
+    if not os.path.exists(csv_path):
+        # Kaynak yoksa elimizdeki tek kopya önbellektir
+        return True
+    import pyarrow.parquet as pq
+    try:
+        metadata = pq.read_schema(cache_path).metadata or {}
+    except Exception:
+        return False
+    stored = metadata.get(FINGERPRINT_KEY, b"").decode("utf-8")
+    return stored == source_fingerprint(csv_path)
+
+# ------------------------------
+# OKUMA
+# ------------------------------
+def read_table(csv_path, columns=None, cache_path=None, refresh=True):
+    """Tabloyu önbellekten (sütun projeksiyonuyla) oku; bayatsa CSV'ye düş.
+
+    refresh=True ise CSV'den okunduktan sonra önbellek yeniden yazılır.
+    """
+    cache_path = cache_path or cache_path_for(csv_path)
+    if is_cache_fresh(csv_path, cache_path):
+        return pd.read_parquet(cache_path, columns=columns)
+
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Veri bulunamadı: {csv_path}")
+
+    if refresh and pyarrow_available():
+        df = build_cache(csv_path, cache_path)
+        return compact_dtypes(df[columns] if columns is not None else df)
+    return pd.read_csv(csv_path, usecols=columns)
+
+
+def table_columns(csv_path, cache_path=None):
+    """Tabloyu okumadan kolon adlarını döndür (önbellek şeması veya CSV başlığı)"""
+    cache_path = cache_path or cache_path_for(csv_path)
+    if is_cache_fresh(csv_path, cache_path):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(cache_path).names)
+    return list(pd.read_csv(csv_path, nrows=0).columns)
+
+# ------------------------------
+# PARTİSYONLU DEPO (ör. Year=2025/part-00000.parquet)
+# ------------------------------
+PARTITION_FINGERPRINT_FILE = "_source_fingerprint"
+
+
+class PartitionedWriter:
+    """DataFrame parçalarını bir kolonun değerine göre klasörlere yazar.
+
+    Yazım geçici klasöre yapılır; close() çağrılınca eski depo atomik olarak değiştirilir.
+    Her write() çağrısı her partisyon için ayrı bir part dosyası üretir (akış modu için).
+    """
+
+    def __init__(self, root, partition_col):
+        import shutil
+        self.root = root
+        self.partition_col = partition_col
+        self.tmp_root = root + ".tmp"
+        shutil.rmtree(self.tmp_root, ignore_errors=True)
+        os.makedirs(self.tmp_root)
+        self.part_index = 0
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = compact_dtypes(df)
+        for value, group in df.groupby(self.partition_col, observed=True, sort=False):
+            part_dir = os.path.join(self.tmp_root, f"{self.partition_col}={value}")
+            os.makedirs(part_dir, exist_ok=True)
+            table = _fixed_dictionary_index(pa.Table.from_pandas(group, preserve_index=False))
+            pq.write_table(table, os.path.join(part_dir, f"part-{self.part_index:05d}.parquet"))
+        self.part_index += 1
+
+    def close(self, csv_path=None):
+        import shutil
+        if csv_path is not None and os.path.exists(csv_path):
+            with open(os.path.join(self.tmp_root, PARTITION_FINGERPRINT_FILE), "w", encoding="utf-8") as f:
+                f.write(source_fingerprint(csv_path))
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.replace(self.tmp_root, self.root)
+        print(f"✓ Partisyonlu depo yazıldı: {self.root} ({len(partition_values(self.root, self.partition_col))} partisyon)")
+        return self.root
+
+
+def _fixed_dictionary_index(table):
+    """Kategori kolonlarının indeks tipini PARTITION_DICT_INDEX'e sabitle.
+
+    compact_dtypes her parçada ayrı çalıştığı için pandas kategorileri parçadaki farklı değer
+    sayısına göre int8 / int16 indeksle yazılır; aynı sezonun part dosyaları birleştirilemez.
+    """
+    import pyarrow as pa
+
+    index_type = pa.type_for_alias(PARTITION_DICT_INDEX)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type) and field.type.index_type != index_type:
+            target = pa.dictionary(index_type, field.type.value_type, field.type.ordered)
+            table = table.set_column(i, field.name, table.column(i).cast(target))
+    return table
+
+
+def write_partitioned(df, root, partition_col, csv_path=None):
+    """Tüm DataFrame'i tek seferde partisyonlu depoya yaz"""
+    if not pyarrow_available():
+        print("⚠️  pyarrow bulunamadı, partisyonlu depo yazılmadı.")
+        return None
+    writer = PartitionedWriter(root, partition_col)
+    writer.write(df)
+    return writer.close(csv_path)
+
+
+def partition_values(root, partition_col):
+    """Depodaki partisyon değerlerini (klasör adlarından) döndür"""
+    if not os.path.isdir(root):
+        return []
+    prefix = f"{partition_col}="
+    return sorted(
+        name[len(prefix):] for name in os.listdir(root)
+        if name.startswith(prefix) and os.path.isdir(os.path.join(root, name))
+    )
+
+
+def is_partitioned_fresh(root, csv_path):
+    """Depo, kaynak CSV'nin aynı sürümünden mi üretilmiş?"""
+    fingerprint_path = os.path.join(root, PARTITION_FINGERPRINT_FILE)
+    if not os.path.exists(fingerprint_path) or not pyarrow_available():
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    with open(fingerprint_path, "r", encoding="utf-8") as f:
+        return f.read().strip() == source_fingerprint(csv_path)
+
+
+def read_partitioned(root, partition_col, values=None, columns=None, filters=None):
+    """Yalnızca istenen partisyonların dosyalarını oku (partisyon budama).
+
+    filters: pyarrow satır-grubu filtreleri, ör. [("G", ">=", 15)]
+    Parçalar arasında sayısal tipler farklı olabilir (bir parçada int16, diğerinde float32);
+    birleştirmede geniş tipe yükseltilir.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    wanted = partition_values(root, partition_col)
+    if values is not None:
+        requested = {str(v) for v in values}
+        wanted = [v for v in wanted if v in requested]
+
+    tables = []
+    for value in wanted:
+        part_dir = os.path.join(root, f"{partition_col}={value}")
+        for name in sorted(os.listdir(part_dir)):
+            if name.endswith(".parquet"):
+                tables.append(pq.read_table(os.path.join(part_dir, name), columns=columns, filters=filters))
+
+    if not tables:
+        return pd.DataFrame(columns=columns or [])
+    return pa.concat_tables(tables, promote_options="permissive").to_pandas()
+
+
+def partitioned_columns(root):
+    """Depodaki ilk part dosyasının şemasından kolon adlarını döndür"""
+    import pyarrow.parquet as pq
+    for dirpath, _, files in sorted(os.walk(root)):
+        parquet_files = sorted(f for f in files if f.endswith(".parquet"))
+        if parquet_files:
+            return list(pq.read_schema(os.path.join(dirpath, parquet_files[0])).names)
+    return []
+
+
+def iter_partitioned(root, partition_col, values=None, columns=None, batch_size=100_000):
+    """Partisyonları en fazla batch_size satırlık DataFrame parçaları olarak sırayla oku"""
+    import pyarrow.parquet as pq
+
+    wanted = partition_values(root, partition_col)
+    if values is not None:
+        requested = {str(v) for v in values}
+        wanted = [v for v in wanted if v in requested]
+
+    for value in wanted:
+        part_dir = os.path.join(root, f"{partition_col}={value}")
+        for name in sorted(os.listdir(part_dir)):
+            if not name.endswith(".parquet"):
+                continue
+            parquet_file = pq.ParquetFile(os.path.join(part_dir, name))
+            for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+                yield batch.to_pandas()
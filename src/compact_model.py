@@ -0,0 +1,142 @@
+"""
+Kompakt, Bellek Eşlenebilir (mmap) LOF Model Artifact'ı
+Pickle edilmiş LocalOutlierFactor yerine düz numpy dizileri + küçük bir JSON başlık:
+    header.json            → format sürümü, kolonlar, k, eşik, dizi şekilleri
+    feature_mean.npy / feature_scale.npy   → a3 StandardScaler
+    pca_mean.npy / pca_components.npy      → a3 PCA (sadece LOF'ta kullanılan bileşenler)
+    lof_mean.npy / lof_scale.npy           → a4 StandardScaler
+    reference.npy / k_distance.npy / lrd.npy → LOF referans noktaları ve komşuluk özetleri
+Diziler np.load(mmap_mode="r") ile açılır; süreçler aynı sayfaları paylaşır, kopya oluşmaz.
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from sklearn.metrics import pairwise_distances
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+ARRAY_NAMES = [
+    "feature_mean", "feature_scale", "pca_mean", "pca_components",
+    "lof_mean", "lof_scale", "reference", "k_distance", "lrd",
+]
+INFO_COLUMNS = ["Player", "Pos", "Year"]
+SCORE_BATCH_ROWS = 4096  # skorlamada uzaklık matrisi parça boyu
+
+# ------------------------------
+# MODEL
+# ------------------------------
+class CompactLOFModel:
+    """a3 dönüşümü + a4 scaler + LOF referans kümesi; yeni satırları novelty LOF ile skorlar"""
+
+    def __init__(self, header, arrays):
+        self.header = header
+        self.arrays = arrays
+
+    @classmethod
+    def from_fitted(cls, transform, lof_scaler, state, pca_columns, lof_threshold):
+        """Fit edilmiş a3 dönüşümü, a4 scaler'ı ve IncrementalLOF durumundan model kur"""
+        pca = transform["pca"]
+        if getattr(pca, "whiten", False):
+            raise ValueError("whiten=True PCA kompakt formatta desteklenmiyor")
+        component_rows = [int(col[len("PCA"):]) - 1 for col in pca_columns]
+        arrays = {
+            "feature_mean": transform["scaler"].mean_,
+            "feature_scale": transform["scaler"].scale_,
+            "pca_mean": pca.mean_,
+            "pca_components": pca.components_[component_rows],
+            "lof_mean": lof_scaler.mean_,
+            "lof_scale": lof_scaler.scale_,
+            "reference": state.X_,
+            "k_distance": state.k_distance_,
+            "lrd": state.lrd_,
+        }
+        arrays = {name: np.ascontiguousarray(value, dtype=np.float64) for name, value in arrays.items()}
+        header = {
+            "format_version": FORMAT_VERSION,
+            "feature_columns": list(transform["feature_columns"]),
+            "pca_columns": list(pca_columns),
+            "n_neighbors": int(state.k_),
+            "metric": state.metric,
+            "lof_threshold": float(lof_threshold),
+        }
+        return cls(header, arrays)
+
+    # ---- kalıcılık ----
+    def save(self, path):
+        """Dizileri .npy, başlığı JSON olarak geçici klasöre yaz, sonra atomik olarak değiştir"""
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        header = dict(self.header)
+        header["arrays"] = {}
+        for name in ARRAY_NAMES:
+            array = self.arrays[name]
+            np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+            header["arrays"][name] = {"shape": list(array.shape), "dtype": str(array.dtype)}
+        with open(os.path.join(tmp_path, HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=2, ensure_ascii=False)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        header_path = os.path.join(path, HEADER_FILE)
+        if not os.path.exists(header_path):
+            raise FileNotFoundError(f"Kompakt model bulunamadı (önce a4'ü çalıştırın): {path}")
+        with open(header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Desteklenmeyen model formatı: {header.get('format_version')}")
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ARRAY_NAMES
+        }
+        for name, meta in header["arrays"].items():
+            if list(arrays[name].shape) != meta["shape"]:
+                raise ValueError(f"{name}.npy şekli başlıkla uyuşmuyor: {arrays[name].shape}")
+        return cls(header, arrays)
+
+    # ---- skorlama ----
+    def project(self, df):
+        """Ham satırları LOF uzayına taşı. Dönüş: (oyuncu kolonları + PCA kolonları, X_scaled)"""
+        a = self.arrays
+        feature_columns = self.header["feature_columns"]
+        missing = [c for c in feature_columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"Yeni veride eksik kolonlar: {missing}")
+
+        X = df[feature_columns].to_numpy(dtype=np.float64)
+        pca_values = ((X - a["feature_mean"]) / a["feature_scale"] - a["pca_mean"]) @ a["pca_components"].T
+        pca_df = pd.DataFrame(pca_values, columns=self.header["pca_columns"], index=df.index)
+        info_cols = [c for c in INFO_COLUMNS if c in df.columns]
+        X_scaled = (pca_values - a["lof_mean"]) / a["lof_scale"]
+        return pd.concat([df[info_cols], pca_df], axis=1), X_scaled
+
+    def score_samples(self, X_scaled):
+        """Novelty LOF skoru (yüksek = daha aykırı); sklearn -score_samples ile aynı"""
+        a = self.arrays
+        k = self.header["n_neighbors"]
+        scores = np.empty(len(X_scaled))
+        for start in range(0, len(X_scaled), SCORE_BATCH_ROWS):
+            batch = X_scaled[start:start + SCORE_BATCH_ROWS]
+            dist = pairwise_distances(batch, a["reference"], metric=self.header["metric"])
+            nearest = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            nearest_dist = np.take_along_axis(dist, nearest, axis=1)
+            reach_dist = np.maximum(nearest_dist, a["k_distance"][nearest])
+            lrd = 1.0 / (np.mean(reach_dist, axis=1) + 1e-10)
+            scores[start:start + len(batch)] = np.mean(a["lrd"][nearest], axis=1) / lrd
+        return scores
+
+    def score_frame(self, df):
+        """Oyuncu kolonları + PCA kolonları + lof_score + is_anomaly"""
+        df_scored, X_scaled = self.project(df)
+        df_scored['lof_score'] = self.score_samples(X_scaled)
+        df_scored['is_anomaly'] = (df_scored['lof_score'] > self.header["lof_threshold"]).astype(int)
+        return df_scored
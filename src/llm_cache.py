@@ -0,0 +1,486 @@
+"""
+Diskte Kalıcı LLM Yanıt Önbelleği (a6 Gemini karşılaştırmaları)
+Anahtar = SHA-256(model adı + normalize prompt + sıralama verisi sürümü); aynı oyuncu çifti
+aynı verilerle tekrar sorulduğunda API'ye gidilmez.
+- SQLite (tek dosya): süreçler / Streamlit oturumları arasında paylaşılır
+- TTL: süresi geçen yanıt kullanılmaz ve silinir
+- LRU + boyut sınırı: toplam yanıt boyutu veya kayıt sayısı aşılınca en uzun süredir okunmayanlar silinir
+- Akış (stream) yolu: parçalar geldikçe döner, ilk token süresi (TTFT) `generations` tablosuna yazılır;
+  istemci akışı desteklemiyorsa tek parça generate_content'e düşülür. Her iki yol aynı önbelleği kullanır.
+- Tek uçuş (single-flight): aynı anahtar için süren bir istek varsa yeni çağrı API'ye gitmez,
+  liderin parçalarını paylaşır (aynı ikiliyi aynı anda açan kullanıcılar tek istek harcar)
+- Token kovası: süreç genelinde dakikada LLM_RATE_PER_MINUTE istek; fazlası hata yerine sırada bekler,
+  kotaya (429) takılan istek geri çekilerek tekrar denenir. Sıra bekleme süresi de ölçülür.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+
+from artifact_store import file_digest
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+LLM_CACHE_PATH = "data/cache/llm_responses.sqlite"
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+CACHE_MAX_ENTRIES = 10_000
+METRICS_MAX_ROWS = 100_000   # generations tablosunda tutulan en fazla ölçüm
+METRICS_SUMMARY_WINDOW = 1000   # özet sadece en son bu kadar üretimden hesaplanır
+STREAM_UNSUPPORTED = (AttributeError, NotImplementedError, TypeError)
+
+LLM_RATE_PER_MINUTE = float(os.environ.get("LLM_RATE_PER_MINUTE", "60"))  # 0 → sınırsız
+LLM_BURST = 5                        # beklemeden art arda gönderilebilecek istek
+RATE_LIMIT_MAX_WAIT_SECONDS = 120    # sıra bundan uzunsa istek hemen reddedilir
+QUOTA_RETRIES = 3                    # 429 / RESOURCE_EXHAUSTED sonrası tekrar deneme
+QUOTA_BACKOFF_MAX_SECONDS = 30
+FLIGHT_WAIT_TIMEOUT_SECONDS = 120    # takipçi liderden bundan uzun parça alamazsa vazgeçer
+
+# ------------------------------
+# ANAHTAR
+# ------------------------------
+def normalize_prompt(prompt):
+    """Satır sonu / girinti / fazla boşluk farkları aynı anahtarı versin"""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def cache_key(model, prompt, data_version, config=None):
+    """config (üretim ayarı, ör. max_output_tokens) yanıtı değiştirdiği için anahtara dahildir"""
+    parts = [model, normalize_prompt(prompt), data_version or ""]
+    if config:
+        parts.append(json.dumps(config, sort_keys=True))
+    payload = "\0".join(parts)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+_DATA_VERSIONS = {}
+
+
+def data_version(path):
+    """Sıralama dosyasının içerik özeti (mtime/boyut değişmedikçe yeniden hesaplanmaz)"""
+    if not os.path.exists(path):
+        return ""
+    stat = os.stat(path)
+    signature = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if signature not in _DATA_VERSIONS:
+        _DATA_VERSIONS[signature] = file_digest(path)
+    return _DATA_VERSIONS[signature]
+
+# ------------------------------
+# ÖNBELLEK
+# ------------------------------
+class LLMResponseCache:
+    """SQLite tabanlı, TTL + LRU + boyut sınırlı yanıt önbelleği (thread-safe)"""
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS,
+                 max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, model TEXT,"
+                " ttft_seconds REAL, total_seconds REAL, chars INTEGER, cached INTEGER, streamed INTEGER,"
+                " queue_seconds REAL, coalesced INTEGER)"
+            )
+            # Önceki sürümün tablosuna yeni kolonları ekle
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(generations)")}
+            for column, kind in (("queue_seconds", "REAL"), ("coalesced", "INTEGER")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE generations ADD COLUMN {column} {kind}")
+
+    def get(self, key):
+        """Yanıt veya None; isabet LRU sırasını günceller"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def contains(self, key):
+        """Süresi geçmemiş kayıt var mı (LRU sırası değişmez)"""
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl_seconds
+
+    def put(self, key, response, model=None):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)", (key, model, response, size, now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        """Süresi geçenleri, sonra sınırlar sağlanana kadar en eski okunanları sil"""
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def record_generation(self, stats, model=None):
+        """Bir üretimin süre ölçümlerini sakla (en yeni METRICS_MAX_ROWS kayıt tutulur)"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO generations (ts, model, ttft_seconds, total_seconds, chars, cached, streamed,"
+                " queue_seconds, coalesced) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), model, stats.ttft_seconds, stats.total_seconds, stats.chars,
+                 int(stats.from_cache), int(stats.streamed), stats.queue_seconds, int(stats.coalesced)),
+            )
+            if cursor.lastrowid % 1000 == 0:
+                self._conn.execute("DELETE FROM generations WHERE id <= ?", (cursor.lastrowid - METRICS_MAX_ROWS,))
+
+    def generation_summary(self, cached=False, window=METRICS_SUMMARY_WINDOW):
+        """Son `window` önbellek dışı (veya isabet) üretimde TTFT / sıra bekleme / toplam süre özeti.
+
+        Her Streamlit yeniden çiziminde çağrılır; tüm tabloyu taramamak için id üzerinden son satırlar okunur.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ttft_seconds, total_seconds, COALESCE(queue_seconds, 0), COALESCE(coalesced, 0)"
+                " FROM generations WHERE cached = ? AND ttft_seconds IS NOT NULL"
+                " ORDER BY id DESC LIMIT ?", (int(cached), int(window))).fetchall()
+        if not rows:
+            return {"count": 0}
+        ttft = sorted(row[0] for row in rows)
+        queue = sorted(row[2] for row in rows)
+        return {
+            "count": len(rows),
+            "ttft_p50": _percentile(ttft, 0.5),
+            "ttft_p95": _percentile(ttft, 0.95),
+            "queue_p50": _percentile(queue, 0.5),
+            "queue_p95": _percentile(queue, 0.95),
+            "coalesced": sum(row[3] for row in rows),
+            "total_mean": sum(row[1] for row in rows) / len(rows),
+        }
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": total}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+# ------------------------------
+# HIZ SINIRI VE TEK UÇUŞ
+# ------------------------------
+class RateLimitTimeout(TimeoutError):
+    """Sıra RATE_LIMIT_MAX_WAIT_SECONDS'tan uzun; istek gönderilmedi"""
+
+    def __init__(self, wait_seconds):
+        super().__init__(f"Gemini istek sırası dolu (~{wait_seconds:.0f} sn bekleme gerekirdi), "
+                         "biraz sonra tekrar deneyin")
+        self.wait_seconds = wait_seconds
+
+
+class TokenBucket:
+    """Dakikada `rate_per_minute` istek, en fazla `burst` art arda (thread-safe).
+
+    reserve() jetonu hemen ayırır ve beklenecek süreyi döndürür: jeton sayısı eksiye düşer,
+    sıradakiler geliş sırasıyla beklenir. Aynı kova thread'lerden ve asyncio'dan kullanılabilir.
+    """
+
+    def __init__(self, rate_per_minute=LLM_RATE_PER_MINUTE, burst=LLM_BURST, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def reserve(self, max_wait=RATE_LIMIT_MAX_WAIT_SECONDS):
+        """Bir jeton ayır; dönüş: beklenmesi gereken saniye (sınırsız kovada 0)"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                raise RateLimitTimeout(wait)
+            self._tokens -= 1
+            return wait
+
+    def acquire(self, max_wait=RATE_LIMIT_MAX_WAIT_SECONDS):
+        """Sıra gelene kadar bekle; dönüş: beklenen saniye"""
+        wait = self.reserve(max_wait)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class FlightAbandoned(RuntimeError):
+    """Lider akışı (ör. sayfadan çıkıldığı için) tamamlamadan bıraktı"""
+
+
+class FlightTimeout(TimeoutError):
+    """Takipçi liderden FLIGHT_WAIT_TIMEOUT_SECONDS içinde yeni parça alamadı"""
+
+
+class _Flight:
+    """Süren tek istek: lider parçaları yayınlar, takipçiler aynı parçaları sırayla alır"""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def publish(self, piece):
+        with self._cond:
+            self.chunks.append(piece)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.finished = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self, timeout=FLIGHT_WAIT_TIMEOUT_SECONDS):
+        """Lider ürettikçe parçaları ver; lider hata ile biterse aynı hata yükselir.
+
+        Lider `timeout` saniye boyunca ne parça ne de bitiş yayınlarsa FlightTimeout yükselir.
+        """
+        index = 0
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: len(self.chunks) > index or self.finished, timeout):
+                    raise FlightTimeout(f"Aynı istek {timeout:.0f} sn içinde yanıt vermedi")
+                new, finished, error = self.chunks[index:], self.finished, self.error
+            index += len(new)
+            yield from new
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Anahtar → süren istek; aynı anahtara gelen eşzamanlı çağrılar tek isteği paylaşır"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def join(self, key):
+        """Dönüş: (uçuş, lider mi). Lider isteği yapar ve sonunda release() çağırır"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def release(self, key, flight, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+RATE_LIMITER = TokenBucket()
+SINGLE_FLIGHT = SingleFlight()
+
+
+def is_rate_limited(error):
+    """google-genai APIError (code 429 / RESOURCE_EXHAUSTED) veya HTTP 429"""
+    return getattr(error, "code", None) == 429 or getattr(error, "status", None) in (429, "RESOURCE_EXHAUSTED")
+
+# ------------------------------
+# GEMINI ÇAĞRISI
+# ------------------------------
+class GenerationStats:
+    """Tek üretimin ölçümleri; stream_generate ilerledikçe doldurulur"""
+
+    def __init__(self):
+        self.from_cache = False
+        self.streamed = False
+        self.ttft_seconds = None
+        self.total_seconds = None
+        self.chars = 0
+        self.queue_seconds = 0.0   # hız sınırı sırasında + kota geri çekilmesinde geçen süre
+        self.coalesced = False     # süren aynı isteğe bağlanıldı (API çağrısı yapılmadı)
+
+
+def _request_kwargs(model, prompt, config):
+    kwargs = {"model": model, "contents": prompt}
+    if config:
+        kwargs["config"] = config
+    return kwargs
+
+
+def _open_stream(client, model, prompt, config=None):
+    """Akış yineleyicisi + ilk parça; istemci akışı desteklemiyorsa None"""
+    stream_fn = getattr(client.models, "generate_content_stream", None)
+    if not callable(stream_fn):
+        return None
+    try:
+        stream = iter(stream_fn(**_request_kwargs(model, prompt, config)))
+        first = next(stream, None)
+    except STREAM_UNSUPPORTED:
+        return None
+    return first, stream
+
+
+def _open_chunks(client, model, prompt, stats, limiter, config=None):
+    """Hız sınırına uyarak isteği başlat; kota hatasında geri çekilip tekrar dene.
+
+    Dönüş: parça yineleyicisi (akışta ilk parça gelmiş durumda)
+    """
+    for attempt in range(QUOTA_RETRIES + 1):
+        stats.queue_seconds += limiter.acquire()
+        try:
+            opened = _open_stream(client, model, prompt, config)
+            if opened is None:
+                return iter([client.models.generate_content(**_request_kwargs(model, prompt, config)).text])
+            stats.streamed = True
+            return _chain(*opened)
+        except Exception as e:
+            if attempt == QUOTA_RETRIES or not is_rate_limited(e):
+                raise
+            delay = random.uniform(0, min(QUOTA_BACKOFF_MAX_SECONDS, 2 ** attempt))
+            time.sleep(delay)
+            stats.queue_seconds += delay
+
+
+def stream_generate(client, model, prompt, cache, version="", stats=None, limiter=None, flights=None,
+                    config=None):
+    """Yanıtı parça parça üret (st.write_stream ile kullanılır).
+
+    Önbellek isabetinde tüm metin tek parça olarak hemen döner. Aynı anahtar için süren bir istek
+    varsa ona bağlanılır (API çağrısı yok); yoksa bu çağrı lider olur ve istek hız sınırından geçer.
+    Yanıt tamamlanınca önbelleğe yazılır; yarıda kesilen akış önbelleğe girmez.
+    config (ör. {"max_output_tokens": 800}) istemciye aynen iletilir. Ölçümler `stats` (GenerationStats) içine ve önbelleğe yazılır.
+    """
+    stats = stats if stats is not None else GenerationStats()
+    limiter = RATE_LIMITER if limiter is None else limiter
+    flights = SINGLE_FLIGHT if flights is None else flights
+    start = time.perf_counter()
+    key = cache_key(model, prompt, version, config)
+    parts = []
+
+    while True:
+        text = cache.get(key)
+        flight, leader = (None, False) if text is not None else flights.join(key)
+        if leader:
+            # Biz sıraya girerken önceki lider bitirmiş olabilir
+            text = cache.get(key)
+            if text is not None:
+                flights.release(key, flight)
+        if text is not None:
+            stats.from_cache = True
+            stats.ttft_seconds = stats.total_seconds = time.perf_counter() - start
+            stats.chars = len(text)
+            cache.record_generation(stats, model)
+            yield text
+            return
+        if leader:
+            break
+
+        stats.coalesced = True
+        try:
+            for piece in flight.follow():
+                if stats.ttft_seconds is None:
+                    stats.ttft_seconds = time.perf_counter() - start
+                parts.append(piece)
+                yield piece
+        except FlightAbandoned:
+            if parts:
+                raise
+            stats.coalesced = False   # lider hiçbir şey üretmeden bıraktı: baştan dene
+            continue
+        if not parts:
+            stats.coalesced = False   # lider hatasız ama boş bitirdi (önbelleğe yazılmadı): baştan dene
+            continue
+        _finish_generation(stats, start, parts, cache, model)
+        return
+
+    error = FlightAbandoned("Aynı istek yarıda bırakıldı")   # GeneratorExit (kapatma) durumunda kalır
+    try:
+        for chunk in _open_chunks(client, model, prompt, stats, limiter, config):
+            piece = chunk if isinstance(chunk, str) or chunk is None else chunk.text
+            if not piece:
+                continue
+            if stats.ttft_seconds is None:
+                stats.ttft_seconds = time.perf_counter() - start
+            parts.append(piece)
+            flight.publish(piece)
+            yield piece
+        error = None
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if error is None and parts:
+            cache.put(key, "".join(parts), model=model)   # takipçiler bırakılmadan önce önbellekte
+        flights.release(key, flight, error)
+    _finish_generation(stats, start, parts, cache, model)
+
+
+def _finish_generation(stats, start, parts, cache, model):
+    stats.total_seconds = time.perf_counter() - start
+    stats.chars = len("".join(parts))
+    cache.record_generation(stats, model)
+
+
+def _chain(first, rest):
+    if first is not None:
+        yield first
+    yield from rest
+
+
+def cached_generate(client, model, prompt, cache, version="", config=None):
+    """Tüm yanıtı tek seferde döndür (stream_generate ile aynı önbellek ve ölçümler).
+
+    Dönüş: (yanıt metni, önbellekten mi)
+    """
+    stats = GenerationStats()
+    text = "".join(stream_generate(client, model, prompt, cache, version, stats, config=config))
+    return text, stats.from_cache
@@ -0,0 +1,452 @@
+"""
+LLM Karşılaştırma Raporları: Ortak Prompt Şablonu + Çevrimdışı Toplu Üretim
+a6 arayüzü ve toplu üretim aynı prompt'u kurar → aynı önbellek anahtarı, tıklamada anında yanıt.
+
+Toplu komut en çok istenen karşılaştırmaları önceden üretir:
+- sıralamadaki ilk N oyuncunun tüm ikilileri (iyi sıradaki oyuncu "Oyuncu 1")
+- her oyuncu ↔ kendi pozisyonunun medyanı
+İstekler asyncio ile eşzamanlı (üst sınırlı) gönderilir; 429/503 yanıtlarında üstel geri çekilme
+yapılır (Retry-After başlığına uyulur); istekler a6 ile aynı token kovası mantığıyla (--rate)
+dakika başına sınırlanır. Önbellekte zaten olan raporlar atlanır → yarıda kalan iş
+aynı komutla kaldığı yerden devam eder.
+
+Prompt'a oyuncuların base_score'a en çok katkı yapan PCA bileşenleri ve bu bileşenleri süren orijinal
+istatistikleri eklenir (PlayerContext). Bağlam PROMPT_TOKEN_BUDGET'a sığacak kadar kısaltılır, yanıt
+uzunluğu hem prompt'ta (kelime sınırı) hem üretim ayarında (max_output_tokens) sınırlanır.
+
+    python src/llm_reports.py --top 50 --concurrency 4
+    python src/llm_reports.py --base-url http://127.0.0.1:8080/v1beta   (yerel sahte sunucu)
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+import urllib.error
+import urllib.request
+from email.utils import parsedate_to_datetime
+from itertools import combinations
+import numpy as np
+import pandas as pd
+
+import a3_feature_engineering as a3
+import a5_model_evaluation as a5
+from player_index import PlayerIndex
+from llm_cache import LLMResponseCache, LLM_CACHE_PATH, LLM_RATE_PER_MINUTE, TokenBucket, cache_key, data_version
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+GEMINI_MODEL = "gemini-2.5-flash"
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta"
+PLAYER_RANKED_CSV = "data/processed/player_ranked.csv"
+PROGRESS_JSON = "data/cache/llm_batch_progress.json"
+FILTERED_CSV = "data/processed/clean_data_filtered.csv"      # a3 çıktıları (orijinal istatistikler)
+PCA_LOADINGS_CSV = "data/processed/pca_loadings_sorted.csv"
+EXPLAINED_VARIANCE_CSV = "data/processed/explained_variance_ratio.csv"
+
+PROMPT_TOKEN_BUDGET = 700        # prompt'un tamamı için üst sınır (tahmini token)
+CHARS_PER_TOKEN = 3              # Türkçe metinde temkinli tahmin; gerçek sayım API çağrısı ister
+TOP_COMPONENTS = 3               # oyuncu başına en fazla bileşen
+TOP_STATS = 3                    # bileşen başına en fazla istatistik
+MAX_RESPONSE_WORDS = 250
+MAX_OUTPUT_TOKENS = 800
+# Düşünme (thinking) kapalı: kısa, yapılandırılmış yanıtta ilk token gecikmesini düşürür
+GENERATION_CONFIG = {"max_output_tokens": MAX_OUTPUT_TOKENS, "thinking_config": {"thinking_budget": 0}}
+
+BATCH_TOP_N = 50
+BATCH_CONCURRENCY = 4
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+REQUEST_TIMEOUT_SECONDS = 120
+PROGRESS_EVERY = 25              # kaç tamamlanan istekte bir ilerleme dosyası yazılır
+
+MEDIAN_COLUMNS = ['rank', 'final_score', 'base_score', 'lof_score', 'is_anomaly']
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# ------------------------------
+# OYUNCU BAĞLAMI (PCA katkıları)
+# ------------------------------
+class PlayerContext:
+    """Oyuncu başına base_score'a en çok katkı yapan PCA bileşenleri ve onları süren istatistikler.
+
+    Tüm oyuncuların (ve pozisyon medyanlarının) bileşen skorları tek matris çarpımıyla
+    (standartlaştırılmış istatistikler @ loadings) bir kez hesaplanır; prompt başına sadece satır okunur.
+    transform (a3'ün kaydettiği scaler + PCA) verilirse skorlar a4/a5'in kullandığı dönüşümle aynıdır;
+    verilmezse sezon istatistikleriyle standartlaştırılır. season: çok sezonlu (akış modu) tabloda
+    sadece sıralanan sezonun satırları kullanılır.
+    """
+
+    def __init__(self, df_filtered, loadings, df_variance, config=None, transform=None, season=None):
+        config = config or a5.RANKING_CONFIG
+        if season is not None and 'Year' in df_filtered.columns:
+            df_filtered = df_filtered[df_filtered['Year'] == season].reset_index(drop=True)
+        if transform is not None:
+            loadings = pd.DataFrame(transform["pca"].components_[:transform["n_output"]].T,
+                                    index=transform["feature_columns"],
+                                    columns=[f"PCA{i+1}" for i in range(transform["n_output"])])
+        self.features = list(loadings.index)
+        self.components, self.weights = a5.ranking_weights(df_variance, config)
+        self.loadings = loadings[self.components].to_numpy(dtype=np.float64)   # özellik × bileşen
+
+        medians = df_filtered.groupby('Pos')[self.features].median()
+        raw = np.vstack([df_filtered[self.features].to_numpy(dtype=np.float64),
+                         medians.to_numpy(dtype=np.float64)])
+        season_raw = raw[:len(df_filtered)]
+        if transform is not None:
+            scaler = transform["scaler"]
+            X = pd.DataFrame(raw, columns=self.features) if hasattr(scaler, "feature_names_in_") else raw
+            self.z = scaler.transform(X)
+            centered = self.z - transform["pca"].mean_   # PCA.transform ile aynı merkezleme
+        else:
+            std = season_raw.std(axis=0)              # StandardScaler ile aynı (ddof=0)
+            std[std == 0] = 1.0
+            self.z = centered = (raw - season_raw.mean(axis=0)) / std
+        self.raw = raw
+        self.scores = centered @ self.loadings    # tek çarpım: satır × bileşen
+        self.contributions = self.scores * self.weights
+        sorted_season = np.sort(season_raw, axis=0)
+        self.percentiles = np.column_stack([
+            np.searchsorted(sorted_season[:, j], raw[:, j], side="right") / len(season_raw)
+            for j in range(len(self.features))
+        ])
+        self.index = PlayerIndex(df_filtered['Player'].tolist() + [median_label(pos) for pos in medians.index])
+
+    @classmethod
+    def from_files(cls, filtered_csv=FILTERED_CSV, loadings_csv=PCA_LOADINGS_CSV,
+                   variance_csv=EXPLAINED_VARIANCE_CSV, config=None,
+                   transform_path=a3.FEATURE_TRANSFORM_PATH, season=a3.TARGET_YEAR):
+        """a3 çıktılarından; dosyalardan biri yoksa None.
+
+        config verilmezse a5'in son sıralamada kaydettiği kurallar (RANKING_CONFIG_JSON) kullanılır.
+        """
+        if not all(os.path.exists(path) for path in (filtered_csv, loadings_csv, variance_csv, transform_path)):
+            return None
+        if config is None:
+            config = a5.load_ranking_config(
+                a5.RANKING_CONFIG_JSON if os.path.exists(a5.RANKING_CONFIG_JSON) else None)
+        return cls(pd.read_csv(filtered_csv), pd.read_csv(loadings_csv, index_col=0),
+                   pd.read_csv(variance_csv, index_col=0), config,
+                   a3.load_feature_transform(transform_path), season)
+
+    def describe(self, name, n_components=TOP_COMPONENTS, n_stats=TOP_STATS):
+        """Prompt satırları: katkıya göre ilk n_components bileşen, her birinde skoru en çok
+        kendi yönüne iten n_stats istatistik (sezon değeri ve yüzdeliği)"""
+        row = self.index.first(name)
+        if row is None or n_components <= 0:
+            return []
+        lines = []
+        for c in np.argsort(-np.abs(self.contributions[row]), kind="stable")[:n_components]:
+            push = self.z[row] * self.loadings[:, c] * np.sign(self.scores[row, c])
+            stats = ", ".join(
+                f"{self.features[f]} {self.raw[row, f]:.1f} (%{self.percentiles[row, f] * 100:.0f})"
+                for f in np.argsort(-push, kind="stable")[:n_stats]
+            )
+            lines.append(f"- {self.components[c]} (katkı {self.contributions[row, c]:+.2f}, "
+                         f"skor {self.scores[row, c]:+.2f}): {stats}")
+        return lines
+
+# ------------------------------
+# PROMPT
+# ------------------------------
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _context_levels(context):
+    """Bütçe aşılırsa önce istatistik, sonra bileşen sayısı azaltılır; en son bağlam çıkarılır"""
+    levels = []
+    if context is not None:
+        n_components, n_stats = TOP_COMPONENTS, TOP_STATS
+        while n_components > 0:
+            levels.append((n_components, n_stats))
+            if n_stats > 1:
+                n_stats -= 1
+            else:
+                n_components -= 1
+    return levels + [(0, 0)]
+
+
+def _player_block(label, name, data, context, n_components, n_stats):
+    lines = [
+        f"{label}: {name}",
+        f"Rank: {data['rank']}",
+        f"Final Score: {data['final_score']:.3f}",
+        f"Base Score: {data['base_score']:.3f}",
+        f"LOF Score: {data['lof_score']:.3f}",
+        f"Anomali: {'Evet' if data['is_anomaly']==1 else 'Hayır'}",
+        f"Pozisyon: {data.get('Pos', 'N/A')}",
+    ]
+    details = context.describe(name, n_components, n_stats) if context is not None else []
+    if details:
+        lines += ["Base score'a en çok katkı yapan bileşenler (istatistik, sezon yüzdeliği):"] + details
+    return "\n".join(lines)
+
+
+def build_comparison_prompt(player1_name, p1_data, player2_name, p2_data, context=None,
+                            token_budget=PROMPT_TOKEN_BUDGET, max_words=MAX_RESPONSE_WORDS):
+    """a6 karşılaştırma prompt'u (p1_data / p2_data: sıralama satırı veya pozisyon medyanı).
+
+    context (PlayerContext) verilirse oyuncu bağlamı token_budget'a sığacak kadar eklenir.
+    Skorlar her zaman prompt'ta kalır; bütçe sadece bağlamı kısaltır.
+    """
+    for n_components, n_stats in _context_levels(context):
+        prompt = f"""
+Uzman bir NBA veri analisti ve spor yorumcusu olarak, iki NBA oyuncusunu karşılaştır ve detaylı analiz yap.
+Analizini şu başlıklarla yapılandır: 1. Genel Değerlendirme, 2. Güçlü Yönler, 3. Zayıf Yönler, 4. Sonuç.
+
+{_player_block("Oyuncu 1", player1_name, p1_data, context, n_components, n_stats)}
+
+{_player_block("Oyuncu 2", player2_name, p2_data, context, n_components, n_stats)}
+
+Yanıt Türkçe olsun ve metriklerin oyuncunun sıralamadaki yerini nasıl etkilediğini açıkla.
+Genel bilgi yerine yukarıdaki sayılara dayan; her başlıkta en fazla 3 kısa madde, toplam {max_words} kelimeyi geçme.
+"""
+        if estimate_tokens(prompt) <= token_budget:
+            break
+    return prompt
+
+
+def comparison_order(player1_name, p1_data, player2_name, p2_data):
+    """Prompt sırası: sıralamada önde olan oyuncu "Oyuncu 1".
+
+    a6'daki seçim sırası ne olursa olsun toplu işin ürettiği prompt (ve önbellek anahtarı) ile aynı olur.
+    """
+    if p2_data['rank'] < p1_data['rank']:
+        return player2_name, p2_data, player1_name, p1_data
+    return player1_name, p1_data, player2_name, p2_data
+
+
+def median_label(pos):
+    return f"{pos} pozisyon medyanı"
+
+
+def positional_medians(df_ranked):
+    """Pozisyon → medyan satırı (Player = "<Pos> pozisyon medyanı")"""
+    medians = df_ranked.groupby('Pos')[MEDIAN_COLUMNS].median()
+    rows = {}
+    for pos, values in medians.iterrows():
+        row = values.copy()
+        row['Player'] = median_label(pos)
+        row['Pos'] = pos
+        rows[pos] = row
+    return rows
+
+
+def batch_prompts(df_ranked, top_n=BATCH_TOP_N, context=None):
+    """Önceden üretilecek (etiket, prompt) listesi: ilk N'in ikilileri + oyuncu ↔ pozisyon medyanı"""
+    df_ranked = df_ranked.sort_values('rank')
+    top = [row for _, row in df_ranked.head(top_n).iterrows()]
+    jobs = [
+        (f"{p1['Player']} vs {p2['Player']}",
+         build_comparison_prompt(*comparison_order(p1['Player'], p1, p2['Player'], p2), context))
+        for p1, p2 in combinations(top, 2)
+    ]
+    medians = positional_medians(df_ranked)
+    for _, row in df_ranked.iterrows():
+        if row['Pos'] not in medians:
+            continue
+        median = medians[row['Pos']]
+        jobs.append((f"{row['Player']} vs {median['Player']}",
+                     build_comparison_prompt(row['Player'], row, median['Player'], median, context)))
+    return jobs
+
+# ------------------------------
+# GEMINI REST İSTEMCİSİ (asyncio)
+# ------------------------------
+class RetryableError(Exception):
+    """Hız sınırı / geçici sunucu hatası; retry_after saniye sonra tekrar denenebilir"""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class GeminiRestClient:
+    """models/{model}:generateContent uç noktası; istekler iş parçacığında, beklemeler event loop'ta"""
+
+    def __init__(self, api_key=None, base_url=GEMINI_API_URL, timeout=REQUEST_TIMEOUT_SECONDS):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, model, prompt, config=None):
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if config:
+            payload["generationConfig"] = _rest_config(config)
+        body = json.dumps(payload).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.base_url}/models/{model}:generateContent", data=body, method="POST",
+            headers={"Content-Type": "application/json", **({"x-goog-api-key": self.api_key} if self.api_key else {})},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code in RETRY_STATUS:
+                raise RetryableError(e.code, parse_retry_after(e.headers.get("Retry-After"))) from e
+            raise
+        parts = payload["candidates"][0]["content"]["parts"]
+        return "".join(part.get("text", "") for part in parts)
+
+    async def generate(self, model, prompt, config=None):
+        return await asyncio.to_thread(self._post, model, prompt, config)
+
+
+def _rest_config(config):
+    """SDK ayar anahtarları (max_output_tokens) → REST adları (maxOutputTokens)"""
+    if not isinstance(config, dict):
+        return config
+    return {re.sub(r"_([a-z])", lambda m: m.group(1).upper(), key): _rest_config(value)
+            for key, value in config.items()}
+
+
+def parse_retry_after(value, now=None):
+    """Retry-After başlığı → bekleme saniyesi (saniye veya HTTP tarihi); okunamazsa None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, retry_at.timestamp() - now)
+
+
+def backoff_delay(attempt, retry_after=None, rng=random):
+    """Retry-After varsa ona uy, yoksa üstel + rastgele (full jitter) bekleme"""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX_SECONDS)
+    return rng.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+async def generate_with_backoff(client, model, prompt, max_retries=MAX_RETRIES, limiter=None, config=None):
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            await asyncio.sleep(limiter.reserve(max_wait=None))   # toplu işte sıra sınırsız
+        try:
+            return await client.generate(model, prompt, config)
+        except urllib.error.HTTPError:
+            raise   # 400/401/403: _post tekrar denenemez saydı (HTTPError bir URLError alt sınıfı)
+        except (RetryableError, urllib.error.URLError, TimeoutError) as e:
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(backoff_delay(attempt, getattr(e, "retry_after", None)))
+
+# ------------------------------
+# TOPLU ÜRETİM
+# ------------------------------
+def _write_progress(path, progress):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(progress, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+async def run_batch(jobs, client, cache, model=GEMINI_MODEL, version="",
+                    concurrency=BATCH_CONCURRENCY, progress_path=PROGRESS_JSON, limiter=None, config=None):
+    """Önbellekte olmayan prompt'ları en fazla `concurrency` eşzamanlı istekle üret ve önbelleğe yaz.
+    limiter (TokenBucket) verilirse istekler dakika başına da sınırlanır; config üretim ayarıdır
+    (a6 ile aynı verilmeli, önbellek anahtarına dahildir).
+
+    Dönüş: ilerleme sözlüğü {total, skipped, done, failed, failures}
+    """
+    progress = {"total": len(jobs), "skipped": 0, "done": 0, "failed": 0, "failures": [],
+                "model": model, "data_version": version, "started": time.time()}
+    pending = []
+    for label, prompt in jobs:
+        key = cache_key(model, prompt, version, config)
+        if cache.contains(key):
+            progress["skipped"] += 1
+        else:
+            pending.append((label, prompt, key))
+    _write_progress(progress_path, progress)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def worker(label, prompt, key):
+        async with semaphore:
+            try:
+                text = await generate_with_backoff(client, model, prompt, limiter=limiter, config=config)
+            except Exception as e:
+                progress["failed"] += 1
+                progress["failures"].append({"job": label, "error": str(e)})
+                return
+        if text:
+            cache.put(key, text, model=model)   # event loop iş parçacığında, sıralı
+        progress["done"] += 1
+        if (progress["done"] + progress["failed"]) % PROGRESS_EVERY == 0:
+            _write_progress(progress_path, progress)
+
+    await asyncio.gather(*(worker(*job) for job in pending))
+    progress["finished"] = time.time()
+    _write_progress(progress_path, progress)
+    return progress
+
+# ------------------------------
+# ANA FONKSİYON
+# ------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="LLM karşılaştırma raporlarını önceden üret")
+    parser.add_argument("--input", default=PLAYER_RANKED_CSV, help="Sıralama tablosu (a5 çıktısı)")
+    parser.add_argument("--top", type=int, default=BATCH_TOP_N, help="İkilileri üretilecek ilk N oyuncu")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Eşzamanlı istek üst sınırı")
+    parser.add_argument("--rate", type=float, default=LLM_RATE_PER_MINUTE,
+                        help="Dakika başına en fazla istek (0: sınırsız)")
+    parser.add_argument("--model", default=GEMINI_MODEL)
+    parser.add_argument("--base-url", default=GEMINI_API_URL, help="Gemini REST adresi (yerel sahte sunucu için)")
+    parser.add_argument("--cache", default=LLM_CACHE_PATH, help="a6'nın okuduğu yanıt önbelleği")
+    parser.add_argument("--progress", default=PROGRESS_JSON, help="İlerleme dosyası")
+    parser.add_argument("--no-context", action="store_true", help="Prompt'a PCA katkı bağlamı ekleme")
+    parser.add_argument("--config", default=None,
+                        help="Sıralama kuralları JSON dosyası (varsayılan: a5'in son kaydettiği kurallar)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key and args.base_url == GEMINI_API_URL:
+        print("❌ 'GEMINI_API_KEY' ortam değişkeninde veya '.env' dosyasında bulunamadı!")
+        return None
+
+    df_ranked = pd.read_csv(args.input)
+    config = a5.load_ranking_config(args.config) if args.config else None
+    context = None if args.no_context else PlayerContext.from_files(config=config)
+    if context is None and not args.no_context:
+        print("⚠️  a3 çıktıları bulunamadı; prompt'lar PCA katkı bağlamı olmadan hazırlanıyor.")
+    jobs = batch_prompts(df_ranked, args.top, context)
+    print(f"✓ {len(jobs)} karşılaştırma hazırlandı (ilk {args.top} ikilileri + pozisyon medyanları)")
+
+    cache = LLMResponseCache(args.cache)
+    client = GeminiRestClient(api_key, args.base_url)
+    start = time.perf_counter()
+    progress = asyncio.run(run_batch(jobs, client, cache, args.model, data_version(args.input),
+                                     args.concurrency, args.progress, TokenBucket(args.rate),
+                                     GENERATION_CONFIG))
+    seconds = time.perf_counter() - start
+    print(f"✓ Üretilen: {progress['done']}, önbellekte olan: {progress['skipped']}, "
+          f"hatalı: {progress['failed']} ({seconds:.1f} sn)")
+    if progress["failed"]:
+        print(f"⚠️  Hatalı istekler {args.progress} dosyasında; komutu tekrar çalıştırınca sadece eksikler üretilir.")
+    return progress
+
+# ------------------------------
+# ÇALIŞTIR
+# ------------------------------
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Artımlı LOF (Local Outlier Factor) Güncellemesi
+Değişen / eklenen oyuncular için tüm modeli yeniden fit etmek yerine sadece
+k-komşuluğu, erişilebilirlik uzaklığı (reach-dist) veya lrd'si etkilenen noktaların
+LOF skoru yeniden hesaplanır. Sonuç, aynı noktalar üzerinde sıfırdan fit ile aynıdır.
+"""
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+from sklearn.metrics import pairwise_distances
+
+# ------------------------------
+# YARDIMCI FONKSİYONLAR
+# ------------------------------
+def _rows_pointing_to(indices, targets):
+    """k-NN listesinde `targets` noktalarından en az birini içeren satırlar"""
+    if len(targets) == 0:
+        return np.zeros(len(indices), dtype=bool)
+    return np.isin(indices, targets).any(axis=1)
+
+# ------------------------------
+# ARTIMLI LOF
+# ------------------------------
+class IncrementalLOF:
+    """k-NN grafiği, k-distance ve lrd'yi saklayan, noktaları yerinde güncelleyebilen LOF"""
+
+    def __init__(self, n_neighbors=20, metric="minkowski"):
+        self.n_neighbors = n_neighbors
+        self.metric = metric
+
+    # ---- tam fit ----
+    def fit(self, X):
+        self.X_ = np.array(X, dtype=np.float64)
+        k = min(self.n_neighbors, len(self.X_) - 1)
+        self.k_ = k
+        nn = NearestNeighbors(n_neighbors=k, metric=self.metric).fit(self.X_)
+        self.distances_, self.indices_ = nn.kneighbors()
+        self.lrd_ = self._lrd(np.arange(len(self.X_)))
+        self.lof_ = self._lof(np.arange(len(self.X_)))
+        return self
+
+    @classmethod
+    def from_neighbors(cls, X, distances, indices, n_neighbors=20, metric="minkowski"):
+        """Hazır k-NN grafiğinden (ör. yaklaşık arka uç) durum kur; grafik yeniden hesaplanmaz.
+
+        Sonraki update() çağrıları etkilenen satırların komşularını kesin olarak yeniden bulur.
+        """
+        model = cls(n_neighbors=n_neighbors, metric=metric)
+        model.X_ = np.array(X, dtype=np.float64)
+        model.k_ = indices.shape[1]
+        model.distances_ = np.array(distances, dtype=np.float64)
+        model.indices_ = np.array(indices)
+        model.lrd_ = model._lrd(np.arange(len(model.X_)))
+        model.lof_ = model._lof(np.arange(len(model.X_)))
+        return model
+
+    @property
+    def k_distance_(self):
+        return self.distances_[:, self.k_ - 1]
+
+    def _lrd(self, rows):
+        reach_dist = np.maximum(self.distances_[rows], self.k_distance_[self.indices_[rows]])
+        return 1.0 / (np.mean(reach_dist, axis=1) + 1e-10)
+
+    def _lof(self, rows):
+        return np.mean(self.lrd_[self.indices_[rows]] / self.lrd_[rows, np.newaxis], axis=1)
+
+    def _knn(self, rows):
+        """Verilen satırların k-NN listesini güncel nokta kümesine karşı (kaba kuvvet) bul"""
+        dist = pairwise_distances(self.X_[rows], self.X_, metric=self.metric)
+        dist[np.arange(len(rows)), rows] = np.inf  # kendisi komşu sayılmaz
+        k = self.k_
+        part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        part_dist = np.take_along_axis(dist, part, axis=1)
+        order = np.argsort(part_dist, axis=1, kind="stable")
+        return np.take_along_axis(part_dist, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+    # ---- artımlı güncelleme ----
+    def update(self, changed_rows=None, changed_X=None, new_X=None):
+        """Var olan satırların konumlarını değiştir ve/veya yeni satırlar ekle.
+
+        Dönüş: LOF skoru yeniden hesaplanan satırların indeksleri (sıralı)
+        """
+        changed_rows = np.asarray(changed_rows if changed_rows is not None else [], dtype=np.int64)
+        n_old = len(self.X_)
+
+        old_k_distance = self.k_distance_.copy()
+        if len(changed_rows):
+            self.X_[changed_rows] = np.asarray(changed_X, dtype=np.float64)
+        n_new = 0 if new_X is None else len(new_X)
+        if n_new:
+            self.X_ = np.vstack([self.X_, np.asarray(new_X, dtype=np.float64)])
+            k = self.k_
+            self.distances_ = np.vstack([self.distances_, np.zeros((n_new, k))])
+            self.indices_ = np.vstack([self.indices_, np.zeros((n_new, k), dtype=self.indices_.dtype)])
+            self.lrd_ = np.concatenate([self.lrd_, np.zeros(n_new)])
+            self.lof_ = np.concatenate([self.lof_, np.zeros(n_new)])
+            old_k_distance = np.concatenate([old_k_distance, np.full(n_new, np.nan)])
+        moved = np.concatenate([changed_rows, np.arange(n_old, n_old + n_new)])
+        if len(moved) == 0:
+            return moved
+
+        # 1) k-NN listesi değişebilecekler: taşınan noktalar, eski konumu komşu olanlar,
+        #    yeni konumu k-distance yarıçapına girenler
+        affected_knn = np.zeros(len(self.X_), dtype=bool)
+        affected_knn[moved] = True
+        affected_knn[:n_old] |= _rows_pointing_to(self.indices_[:n_old], changed_rows)
+        to_moved = pairwise_distances(self.X_[:n_old], self.X_[moved], metric=self.metric)
+        affected_knn[:n_old] |= (to_moved <= old_k_distance[:n_old, np.newaxis]).any(axis=1)
+        knn_rows = np.flatnonzero(affected_knn)
+
+        self.distances_[knn_rows], self.indices_[knn_rows] = self._knn(knn_rows)
+
+        # 2) k-distance'ı değişenler → onları komşu olarak kullananların reach-dist'i değişir
+        kd_changed = knn_rows[~np.isclose(self.k_distance_[knn_rows], old_k_distance[knn_rows])]
+        lrd_rows = np.flatnonzero(affected_knn | _rows_pointing_to(self.indices_, kd_changed))
+        self.lrd_[lrd_rows] = self._lrd(lrd_rows)
+
+        # 3) lrd'si değişen bir komşusu olan herkesin LOF'u değişir
+        lof_mask = np.zeros(len(self.X_), dtype=bool)
+        lof_mask[lrd_rows] = True
+        lof_mask |= _rows_pointing_to(self.indices_, lrd_rows)
+        lof_rows = np.flatnonzero(lof_mask)
+        self.lof_[lof_rows] = self._lof(lof_rows)
+        return lof_rows
+
+    # ---- kalıcılık ----
+    def save(self, path):
+        np.savez(
+            path, X=self.X_, distances=self.distances_, indices=self.indices_,
+            lrd=self.lrd_, lof=self.lof_,
+            params=np.array([self.n_neighbors, self.k_]), metric=np.array(self.metric)
+        )
+        return path
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        n_neighbors, k = (int(v) for v in data["params"])
+        model = cls(n_neighbors=n_neighbors, metric=str(data["metric"]))
+        model.k_ = k
+        model.X_ = data["X"]
+        model.distances_ = data["distances"]
+        model.indices_ = data["indices"]
+        model.lrd_ = data["lrd"]
+        model.lof_ = data["lof"]
+        return model
@@ -0,0 +1,170 @@
+"""
+LOF için Değiştirilebilir Komşu Arama Arka Uçları
+- Kesin: sklearn NearestNeighbors (kd_tree / ball_tree / brute / auto)
+- Yaklaşık: süreç içinde kurulan rastgele izdüşüm ormanı + komşunun komşusu (NN-descent)
+  iyileştirmesi. Sadece numpy kullanır; CPU'da, çevrimdışı çalışır.
+Her iki arka uç da kneighbors() ile aynı biçimde (kendisi hariç, artan uzaklık) döner.
+"""
+
+import time
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+EXACT_BACKENDS = ["auto", "kd_tree", "ball_tree", "brute"]
+APPROX_BACKEND = "approx"
+BACKENDS = EXACT_BACKENDS + [APPROX_BACKEND]
+
+APPROX_N_TREES = 8        # izdüşüm ağacı sayısı (recall ↑, süre ↑)
+APPROX_LEAF_SIZE = 48     # yaprak başına en fazla nokta
+APPROX_N_ITER = 1         # komşunun komşusu iyileştirme turu
+APPROX_RANDOM_STATE = 42
+BATCH_ROWS = 2048         # mesafe hesaplarında satır parçası (bellek sınırı)
+
+# ------------------------------
+# KESİN ARAMA
+# ------------------------------
+def exact_kneighbors(X, k, algorithm="auto", metric="minkowski"):
+    nn = NearestNeighbors(n_neighbors=k, algorithm=algorithm, metric=metric).fit(X)
+    return nn.kneighbors()
+
+# ------------------------------
+# YAKLAŞIK ARAMA (rastgele izdüşüm ormanı + NN-descent)
+# ------------------------------
+def _rp_tree_leaves(X, leaf_size, rng):
+    """Tek ağaç: noktaları rastgele yönlere izdüşümün medyanından ikiye bölerek yapraklara ayır"""
+    order = np.arange(len(X))
+    segments, leaves = [(0, len(X))], []
+    while segments:
+        next_segments = []
+        for start, end in segments:
+            if end - start <= leaf_size:
+                leaves.append(order[start:end])
+                continue
+            idx = order[start:end]
+            proj = X[idx] @ rng.normal(size=X.shape[1])
+            mid = (end - start) // 2
+            order[start:end] = idx[np.argpartition(proj, mid)]
+            next_segments += [(start, start + mid), (start + mid, end)]
+        segments = next_segments
+    return leaves
+
+
+def _merge_candidates(dist, ind, cand_dist, cand_ind, distinct=False):
+    """Mevcut k-NN listelerine adayları kat; tekrarları at, en yakın k'yı tut.
+
+    distinct=True: aday satırlarında tekrar yok (yaprak adayları) → önce en yakın k'ya indirilir
+    """
+    k = ind.shape[1]
+    if distinct and cand_ind.shape[1] > k:
+        # Sadece adayların en yakın k'sı yarışabilir; geniş dizileri sıralamaktan kaçın
+        top = np.argpartition(cand_dist, k - 1, axis=1)[:, :k]
+        cand_dist = np.take_along_axis(cand_dist, top, axis=1)
+        cand_ind = np.take_along_axis(cand_ind, top, axis=1)
+    all_ind = np.concatenate([ind, cand_ind], axis=1)
+    all_dist = np.concatenate([dist, cand_dist], axis=1)
+    order = np.argsort(all_ind, axis=1, kind="stable")
+    all_ind = np.take_along_axis(all_ind, order, axis=1)
+    all_dist = np.take_along_axis(all_dist, order, axis=1)
+    duplicate = np.zeros(all_ind.shape, dtype=bool)
+    duplicate[:, 1:] = all_ind[:, 1:] == all_ind[:, :-1]
+    all_dist = np.where(duplicate | (all_ind < 0), np.inf, all_dist)
+
+    top = np.argpartition(all_dist, k - 1, axis=1)[:, :k]
+    top_dist = np.take_along_axis(all_dist, top, axis=1)
+    top_ind = np.take_along_axis(all_ind, top, axis=1)
+    order = np.argsort(top_dist, axis=1, kind="stable")
+    return np.take_along_axis(top_dist, order, axis=1), np.take_along_axis(top_ind, order, axis=1)
+
+
+def _leaf_candidates(X, leaves, leaf_size):
+    """Her noktanın aynı yapraktaki diğer noktalarla (kare) uzaklıkları: (n, leaf_size)"""
+    n = len(X)
+    leaf_mat = np.full((len(leaves), leaf_size), -1, dtype=np.int64)
+    for i, leaf in enumerate(leaves):
+        leaf_mat[i, :len(leaf)] = leaf
+    cand_ind = np.full((n, leaf_size), -1, dtype=np.int64)
+    cand_dist = np.full((n, leaf_size), np.inf)
+
+    leaves_per_batch = max(1, BATCH_ROWS // leaf_size)
+    for start in range(0, len(leaf_mat), leaves_per_batch):
+        block = leaf_mat[start:start + leaves_per_batch]
+        valid = block >= 0
+        P = X[np.where(valid, block, 0)]                      # (b, L, d)
+        sq = np.einsum("bld,bld->bl", P, P)
+        D = sq[:, :, None] + sq[:, None, :] - 2 * np.einsum("bld,bmd->blm", P, P)
+        D = np.maximum(D, 0.0)
+        D[~np.broadcast_to(valid[:, None, :], D.shape)] = np.inf
+        D[:, np.arange(leaf_size), np.arange(leaf_size)] = np.inf  # kendisi
+        rows = block[valid]
+        cand_dist[rows] = D[valid]
+        cand_ind[rows] = np.broadcast_to(block[:, None, :], D.shape)[valid]
+    return cand_dist, cand_ind
+
+
+def _neighbor_of_neighbor_candidates(X, ind, rows, width):
+    """NN-descent turu: en yakın `width` komşunun en yakın `width` komşusu aday olur (kare uzaklıklar)"""
+    cand_ind = ind[ind[rows, :width], :width].reshape(len(rows), -1)
+    diff = X[cand_ind] - X[rows, None, :]
+    cand_dist = np.einsum("rcd,rcd->rc", diff, diff)
+    cand_dist[cand_ind == rows[:, None]] = np.inf
+    return cand_dist, cand_ind
+
+
+def approximate_kneighbors(X, k, n_trees=APPROX_N_TREES, leaf_size=APPROX_LEAF_SIZE,
+                           n_iter=APPROX_N_ITER, random_state=APPROX_RANDOM_STATE):
+    """Tüm noktalar için yaklaşık k-NN grafiği (Öklid). Dönüş: (distances, indices)"""
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    n = len(X)
+    if k >= n:
+        raise ValueError(f"k={k} nokta sayısından ({n}) küçük olmalı")
+    # Medyan bölmede yapraklar en az leaf_size/2 nokta içerir → ilk ağaçta herkesin k adayı olur
+    leaf_size = max(leaf_size, 2 * (k + 1))
+    rng = np.random.default_rng(random_state)
+
+    dist = np.full((n, k), np.inf)
+    ind = np.full((n, k), -1, dtype=np.int64)
+    for _ in range(n_trees):
+        cand_dist, cand_ind = _leaf_candidates(X, _rp_tree_leaves(X, leaf_size, rng), leaf_size)
+        dist, ind = _merge_candidates(dist, ind, cand_dist, cand_ind, distinct=True)
+
+    for _ in range(n_iter):
+        for start in range(0, n, BATCH_ROWS):
+            rows = np.arange(start, min(start + BATCH_ROWS, n))
+            cand_dist, cand_ind = _neighbor_of_neighbor_candidates(X, ind, rows, k)
+            dist[rows], ind[rows] = _merge_candidates(dist[rows], ind[rows], cand_dist, cand_ind)
+
+    # Son uzaklıkları doğrudan hesapla (kare açılımının yuvarlama hatası olmasın)
+    diff = X[ind] - X[:, None, :]
+    return np.sqrt(np.einsum("ncd,ncd->nc", diff, diff)), ind
+
+# ------------------------------
+# ORTAK ARAYÜZ
+# ------------------------------
+def kneighbors_graph(X, k, backend="auto", metric="minkowski", **approx_kwargs):
+    """Seçilen arka uçla kendisi hariç k-NN grafiği"""
+    if backend in EXACT_BACKENDS:
+        return exact_kneighbors(X, k, algorithm=backend, metric=metric)
+    if backend == APPROX_BACKEND:
+        if metric not in ("minkowski", "euclidean"):
+            raise ValueError(f"Yaklaşık arka uç sadece Öklid uzaklığını destekler: {metric}")
+        return approximate_kneighbors(X, k, **approx_kwargs)
+    raise ValueError(f"Bilinmeyen komşu arka ucu: {backend} (seçenekler: {BACKENDS})")
+
+
+def recall_at_k(approx_indices, exact_indices):
+    """Kesin k-NN listelerinin yaklaşık listede bulunma oranı (0–1)"""
+    hits = 0
+    for start in range(0, len(exact_indices), BATCH_ROWS):
+        a = approx_indices[start:start + BATCH_ROWS]
+        e = exact_indices[start:start + BATCH_ROWS]
+        hits += int((a[:, :, None] == e[:, None, :]).any(axis=2).sum())
+    return hits / exact_indices.size
+
+
+def timed_kneighbors(X, k, backend, **kwargs):
+    start = time.perf_counter()
+    distances, indices = kneighbors_graph(X, k, backend, **kwargs)
+    return distances, indices, time.perf_counter() - start
@@ -0,0 +1,95 @@
+"""
+Oyuncu Arama İndeksi
+a5, app.py ve a6 tarafından paylaşılır. Oyuncu adları normalize edilir (aksan, büyük/küçük harf,
+noktalama, Jr./Sr./II–V ekleri) ve satır ofsetlerine eşlenir:
+- tam eşleşme: sözlük → O(1)
+- önek araması (ad, soyad veya tam ad): sıralı anahtarlar + bisect → O(log n)
+- bulanık arama: sadece önceki ikisi sonuç vermezse, benzersiz adlar üzerinde
+"""
+
+import re
+import difflib
+import unicodedata
+from bisect import bisect_left
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+NAME_SUFFIXES = {"jr", "sr", "ii", "iii", "iv", "v"}
+FUZZY_CUTOFF = 0.75
+DEFAULT_LIMIT = 10
+
+# ------------------------------
+# NORMALİZASYON
+# ------------------------------
+def normalize_name(name):
+    """'Luka Dončić' → 'luka doncic', 'Jaren Jackson Jr.' → 'jaren jackson'"""
+    if name is None or name != name:  # None / NaN
+        return ""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    tokens = re.sub(r"[^\w\s]", " ", text).split()
+    while len(tokens) > 1 and tokens[-1] in NAME_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+# ------------------------------
+# İNDEKS
+# ------------------------------
+class PlayerIndex:
+    """Normalize ad → satır ofsetleri eşlemesi (satırlar DataFrame'deki konumlardır, iloc ile kullanılır)"""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self._exact = {}
+        for offset, name in enumerate(self.names):
+            self._exact.setdefault(normalize_name(name), []).append(offset)
+
+        # Önek anahtarları: tam ad + her kelime (soyadla arama için)
+        keys = set()
+        for key, offsets in self._exact.items():
+            for offset in offsets:
+                keys.add((key, offset))
+                for token in key.split():
+                    keys.add((token, offset))
+        self._prefix_keys = sorted(keys)
+
+    @classmethod
+    def from_frame(cls, df, column="Player"):
+        return cls(df[column].tolist())
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, name):
+        """Normalize adı birebir eşleşen satırlar (tekrar eden adlarda birden fazla)"""
+        return list(self._exact.get(normalize_name(name), []))
+
+    def first(self, name):
+        """İlk eşleşen satır ofseti veya None (sıralı tabloda en iyi sıradaki kayıt)"""
+        offsets = self._exact.get(normalize_name(name))
+        return offsets[0] if offsets else None
+
+    def prefix(self, query, limit=DEFAULT_LIMIT):
+        """Tam adı veya herhangi bir kelimesi `query` ile başlayan satırlar (ofset sırasıyla)"""
+        query = normalize_name(query)
+        if not query:
+            return []
+        start = bisect_left(self._prefix_keys, (query, -1))
+        offsets = set()
+        # Dilim kopyası yerine indeksle yürü; ilk eşleşmeyen anahtarda dur
+        for i in range(start, len(self._prefix_keys)):
+            key, offset = self._prefix_keys[i]
+            if not key.startswith(query):
+                break
+            offsets.add(offset)
+        return sorted(offsets)[:limit]
+
+    def fuzzy(self, query, limit=DEFAULT_LIMIT, cutoff=FUZZY_CUTOFF):
+        """Yazım hatalarına toleranslı arama (benzersiz normalize adlar üzerinde)"""
+        matches = difflib.get_close_matches(normalize_name(query), list(self._exact), n=limit, cutoff=cutoff)
+        return [offset for key in matches for offset in self._exact[key]][:limit]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Sırayla tam eşleşme → önek → bulanık arama; ilk sonuç veren yöntemin ofsetleri"""
+        return self.lookup(query)[:limit] or self.prefix(query, limit) or self.fuzzy(query, limit)
@@ -0,0 +1,237 @@
+"""
+Bootstrap ile Sıralama Kararlılığı
+Filtrelenmiş sezon B kez yerine koyarak yeniden örneklenir; her örnekte
+StandardScaler → PCA (a3) → scaler + LOF (a4) → final_score (a5) yeniden fit edilir ve
+sezondaki TÜM oyuncular bu modelle skorlanıp sıralanır. Sonuç: her oyuncu için
+nokta sıralaması + bootstrap sıralamalarının medyanı ve %90 aralığı.
+
+Örnekler parti parti süreç havuzuna dağıtılır; özellik matrisi paylaşımlı bellekte tek kopyadır.
+Her örneğin tohumu SeedSequence'tan türetilir → sonuç işçi sayısından bağımsızdır.
+"""
+
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.preprocessing import StandardScaler
+from sklearn.decomposition import PCA
+from sklearn.neighbors import LocalOutlierFactor
+
+import a3_feature_engineering as a3
+import a4_model_training as a4
+import a5_model_evaluation as a5
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+FILTERED_CSV = a3.FILTERED_CSV
+OUTPUT_CSV = "data/processed/rank_stability.csv"
+N_BOOTSTRAP = 500
+BATCH_SIZE = 25           # bir işçi görevindeki örnek sayısı
+INTERVAL = (0.05, 0.95)   # %90 aralık
+RANDOM_SEED = 42
+INFO_COLUMNS = ["Player", "Pos"]
+
+# ------------------------------
+# YARDIMCI FONKSİYONLAR
+# ------------------------------
+def required_components(config):
+    """LOF (a4) ve sıralama kurallarının (a5) ihtiyaç duyduğu PCA bileşeni sayısı"""
+    named = [config["split_column"]]
+    if config["weights"] != "variance":
+        named += list(config["weights"])
+    indices = [int(col[len("PCA"):]) for col in named]
+    return max([a4.SELECTED_PCA_COUNT, config["selected_pca_count"]] + indices)
+
+
+def feature_columns(df_filtered):
+    """PCA'ya giren özellik kolonları; akış modu çıktısındaki Year gibi bilgi kolonları hariç"""
+    excluded = set(a3.STREAM_INFO_COLS) | set(a3.DROP_COLS)
+    return [c for c in df_filtered.columns if c not in excluded]
+
+
+def feature_matrix(df_filtered):
+    """Nokta sıralamasındaki a3.fit_pca ile aynı kolonlar (feature_columns)"""
+    return np.ascontiguousarray(df_filtered[feature_columns(df_filtered)].to_numpy(dtype=np.float64))
+
+
+def reference_components(X, n_components):
+    """Tüm veriyle fit edilen PCA yönleri; örneklerdeki bileşenlerin işaretini hizalamak için"""
+    pca, _ = a3.build_pca(StandardScaler().fit_transform(X))  # nokta sıralamasıyla aynı fit
+    return pca.components_[:n_components]
+
+
+def resample_scores(X, sample, components_ref, config):
+    """`sample` satırlarıyla tüm zinciri fit et, X'in tüm satırları için final_score döndür.
+
+    PCA bileşenlerinin sırası (yakın varyanslarda) ve işareti keyfidir; PCAi her örnekte aynı
+    anlama gelsin diye bileşenler tüm veriyle bulunan yönlerle eşleştirilir ve aynı yöne çevrilir.
+    """
+    n_components = len(components_ref)
+    scaler = StandardScaler().fit(X[sample])
+    X_scaled = scaler.transform(X)
+    pca = PCA(n_components=n_components, random_state=a3.PCA_RANDOM_STATE).fit(X_scaled[sample])
+    overlap = components_ref @ pca.components_.T
+    _, match = linear_sum_assignment(-np.abs(overlap))   # referans i ↔ örnek bileşeni match[i]
+    signs = np.sign(overlap[np.arange(n_components), match])
+    signs[signs == 0] = 1.0
+    pca_values = (X_scaled - pca.mean_) @ (pca.components_[match].T * signs)
+
+    columns = [f"PCA{i+1}" for i in range(n_components)]
+    df_pca = pd.DataFrame(pca_values, columns=columns)
+    df_variance = pd.DataFrame({"explained_variance_ratio": pca.explained_variance_ratio_[match]},
+                               index=columns)
+
+    # a4: seçilen PCA'lar üzerinde scaler + LOF; örnek dışındaki oyuncular novelty olarak skorlanır
+    lof_columns = a4.select_top_pca_columns(df_variance)
+    X_lof = df_pca[lof_columns].to_numpy()
+    lof_scaler = StandardScaler().fit(X_lof[sample])
+    lof = LocalOutlierFactor(n_neighbors=a4.N_NEIGHBORS, metric=a4.METRIC,
+                             contamination=a4.CONTAMINATION, novelty=True)
+    lof.fit(lof_scaler.transform(X_lof[sample]))
+    df_pca['is_anomaly'] = (lof.predict(lof_scaler.transform(X_lof)) == -1).astype(int)
+
+    # a5: eşik örnekten, skor tüm oyuncular için
+    pca_columns, weights = a5.ranking_weights(df_variance, config)
+    split_threshold = float(np.nanquantile(pca_values[sample, columns.index(config["split_column"])],
+                                           config["split_quantile"]))
+    df_scored, _ = a5.score_players(df_pca, pca_columns, weights, split_threshold, config)
+    return df_scored['final_score'].to_numpy()
+
+
+def scores_to_ranks(scores):
+    """Yüksek skor → 1. sıra (eşitlikte orijinal satır sırası)"""
+    order = np.argsort(-scores, kind="stable")
+    ranks = np.empty(len(scores), dtype=np.int32)
+    ranks[order] = np.arange(1, len(scores) + 1, dtype=np.int32)
+    return ranks
+
+# ------------------------------
+# İŞÇİ SÜREÇLER (paylaşımlı bellek)
+# ------------------------------
+_SHARED = {}
+
+
+def _attach_features(shm_name, shape, dtype, components_ref, config):
+    """İşçi süreç: özellik matrisine kopyalamadan bağlan, tek iş parçacığıyla çalış"""
+    a4._limit_worker_threads()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _SHARED["shm"] = shm  # referans tut, aksi halde bellek serbest kalır
+    _SHARED["matrix"] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _SHARED["components"] = components_ref
+    _SHARED["config"] = config
+
+
+def _bootstrap_batch(seeds):
+    """Bir parti örnek: her biri için sıralama vektörü. Dönüş: (len(seeds), n) int32"""
+    X = _SHARED["matrix"]
+    n = len(X)
+    ranks = np.empty((len(seeds), n), dtype=np.int32)
+    for i, seed in enumerate(seeds):
+        sample = np.random.default_rng(seed).integers(0, n, n)
+        ranks[i] = scores_to_ranks(resample_scores(X, sample, _SHARED["components"], _SHARED["config"]))
+    return ranks
+
+
+def bootstrap_ranks(X, n_bootstrap=N_BOOTSTRAP, config=None, workers=None,
+                    batch_size=BATCH_SIZE, seed=RANDOM_SEED):
+    """B örneğin sıralamaları: (B, n) int32 matris"""
+    config = config or a5.RANKING_CONFIG
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    if len(X) <= a4.N_NEIGHBORS:
+        raise ValueError(f"LOF için en az {a4.N_NEIGHBORS + 1} oyuncu gerekli, {len(X)} var")
+    components_ref = reference_components(X, required_components(config))
+    seeds = np.random.SeedSequence(seed).spawn(n_bootstrap)
+    batches = [seeds[i:i + batch_size] for i in range(0, n_bootstrap, batch_size)]
+
+    shm = shared_memory.SharedMemory(create=True, size=X.nbytes)
+    try:
+        shared = np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)
+        shared[:] = X
+        init_args = (shm.name, X.shape, X.dtype, components_ref, config)
+        workers = workers or min(len(batches), os.cpu_count() or 1)
+
+        if workers == 1:
+            _attach_features(*init_args)
+            results = [_bootstrap_batch(batch) for batch in batches]
+            _SHARED.pop("shm").close()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_features,
+                                     initargs=init_args) as pool:
+                results = list(pool.map(_bootstrap_batch, batches))
+    finally:
+        shm.close()
+        shm.unlink()
+    return np.vstack(results)
+
+
+def summarize_ranks(ranks, interval=INTERVAL):
+    """Oyuncu başına medyan sıra ve alt/üst yüzdelikler"""
+    low, high = np.quantile(ranks, interval, axis=0)
+    return pd.DataFrame({
+        "rank_median": np.median(ranks, axis=0),
+        "rank_low": low,
+        "rank_high": high,
+        "interval_width": high - low,
+    })
+
+
+def rank_stability(df_filtered, n_bootstrap=N_BOOTSTRAP, config=None, workers=None,
+                   batch_size=BATCH_SIZE, seed=RANDOM_SEED):
+    """Filtrelenmiş sezon → oyuncu bilgileri + bootstrap sıralama özeti (nokta sıralamasına göre sıralı)"""
+    config = config or a5.RANKING_CONFIG
+    df_filtered = df_filtered.reset_index(drop=True)
+    ranks = bootstrap_ranks(feature_matrix(df_filtered), n_bootstrap, config, workers, batch_size, seed)
+
+    # Nokta sıralaması: normal zincir (a3 → a4 → a5) tüm veriyle bir kez, örneklerle aynı kolonlarla
+    pca_df, _, explained_df, _, _ = a3.fit_pca(df_filtered[INFO_COLUMNS + feature_columns(df_filtered)])
+    df_scored, _, _, _ = a4.fit_lof(pca_df, explained_df)
+    df_ranked, _ = a5.rank_players(df_scored.assign(_row=np.arange(len(df_scored))), explained_df, config)
+    point_rank = np.empty(len(df_filtered), dtype=np.int64)
+    point_rank[df_ranked["_row"].to_numpy()] = df_ranked["rank"].to_numpy()
+
+    df_stability = pd.concat([df_filtered[INFO_COLUMNS], summarize_ranks(ranks)], axis=1)
+    df_stability.insert(2, "rank", point_rank)
+    return df_stability.sort_values("rank").reset_index(drop=True)
+
+# ------------------------------
+# ANA FONKSİYON
+# ------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bootstrap ile sıralama kararlılığı aralıkları")
+    parser.add_argument("--bootstrap", type=int, default=N_BOOTSTRAP, help="Yeniden örnekleme sayısı (B)")
+    parser.add_argument("--workers", type=int, default=None, help="Süreç sayısı (varsayılan: CPU sayısı)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="İşçi görevi başına örnek sayısı")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED)
+    parser.add_argument("--config", default=None, help="Sıralama kuralları JSON dosyası (a5 ile aynı)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = a5.load_ranking_config(args.config)
+    df_filtered = pd.read_csv(FILTERED_CSV)
+    print(f"✓ Filtrelenmiş sezon yüklendi: {FILTERED_CSV} ({len(df_filtered)} oyuncu)")
+
+    start = time.perf_counter()
+    df_stability = rank_stability(df_filtered, args.bootstrap, config, args.workers,
+                                  args.batch_size, args.seed)
+    seconds = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(OUTPUT_CSV), exist_ok=True)
+    df_stability.to_csv(OUTPUT_CSV, index=False)
+    print(f"✓ B={args.bootstrap} örnek {seconds:.1f} sn'de tamamlandı")
+    print(f"✓ Ortalama %90 aralık genişliği: {df_stability['interval_width'].mean():.1f} sıra")
+    print(f"✓ Kararlılık tablosu kaydedildi: {OUTPUT_CSV}")
+    print(df_stability.head(10).to_string(index=False))
+    return df_stability
+
+# ------------------------------
+# ÇALIŞTIR
+# ------------------------------
+if __name__ == "__main__":
+    main()
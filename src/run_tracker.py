@@ -0,0 +1,198 @@
+"""
+Bloklamayan, Toplu MLflow Kaydı (a4 ve a5 ortak)
+- Parametre ve metrikler bellekte biriktirilir, log_batch çağrılarıyla (limitlere bölünerek) gönderilir
+- Toplu gönderimler ve artifact yüklemeleri tek bir arka plan iş parçacığında sırayla yapılır;
+  pipeline dosya deposunu beklemez
+- with bloğu sonu kuyruğun boşalmasını bekler (süreç havuzu işçilerinde atexit çalışmaz);
+  wait_on_exit=False → kapanış kuyruğa eklenir ve hemen dönülür, süreç çıkışında (atexit) beklenir
+- Aynı parametreye farklı değer verilirse (MLflow reddeder) ikinci değer kuyruğa alınmadan uyarılır
+- enabled=False (veya PIPELINE_TRACKING=0) → hiçbir şey kaydedilmez (benchmark modu)
+- Artifact'lar varsayılan olarak içerik adresli depoya (artifact_store.py) bir kez yazılır;
+  run'a sadece manifest özeti etiketlenir (PIPELINE_ARTIFACT_STORE=0 → klasik MLflow kopyası)
+
+Not: artifact dosyaları yükleme bitene kadar (en geç close()) değiştirilmemelidir.
+"""
+
+import os
+import time
+import queue
+import atexit
+import threading
+import weakref
+
+from artifact_store import ArtifactStore, MANIFEST_TAG
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+TRACKING_ENABLED = os.environ.get("PIPELINE_TRACKING", "1") != "0"
+USE_ARTIFACT_STORE = os.environ.get("PIPELINE_ARTIFACT_STORE", "1") != "0"
+MAX_PARAMS_PER_BATCH = 100     # MLflow log_batch limitleri
+MAX_ENTITIES_PER_BATCH = 1000
+AUTO_FLUSH_METRICS = 1000      # bu kadar metrik birikince arka plana gönder
+
+_OPEN_RUNS = weakref.WeakSet()
+
+# ------------------------------
+# RUN
+# ------------------------------
+class TrackedRun:
+    """MLflow run'ı; log_* çağrıları hemen döner, asıl yazım arka planda yapılır"""
+
+    def __init__(self, experiment, run_name=None, enabled=None, store=None, wait_on_exit=True):
+        self.enabled = TRACKING_ENABLED if enabled is None else enabled
+        self.wait_on_exit = wait_on_exit
+        if store is None:
+            store = ArtifactStore() if USE_ARTIFACT_STORE else False
+        self.store = store or None   # False → artifact'lar MLflow'a doğrudan yüklenir
+        self._manifest = {}          # sadece arka plan iş parçacığı yazar
+        self.errors = []
+        self.run_id = None
+        self._params = {}
+        self._logged_params = {}     # run boyunca kuyruğa alınan tüm parametreler
+        self._metrics = []
+        self._closed = False
+        if not self.enabled:
+            return
+
+        import mlflow
+        from mlflow.tracking import MlflowClient
+
+        self._client = MlflowClient()
+        experiment_id = mlflow.set_experiment(experiment).experiment_id
+        self.run_id = self._client.create_run(experiment_id, run_name=run_name).info.run_id
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._work, name=f"mlflow-{self.run_id[:8]}", daemon=True)
+        self._worker.start()
+        _OPEN_RUNS.add(self)
+
+    # ---- kayıt ----
+    def log_param(self, key, value):
+        if not self.enabled:
+            return
+        value = str(value)
+        previous = self._logged_params.get(key)
+        if previous is not None:
+            if previous != value:   # MLflow parametre değişikliğini yüklemede reddeder
+                print(f"⚠️  MLflow parametresi '{key}' zaten '{previous}' olarak kaydedildi; '{value}' yok sayıldı")
+            return
+        self._logged_params[key] = self._params[key] = value
+
+    def log_params(self, params):
+        for key, value in params.items():
+            self.log_param(key, value)
+
+    def log_metric(self, key, value, step=0):
+        if not self.enabled:
+            return
+        self._metrics.append((key, float(value), int(time.time() * 1000), step))
+        if len(self._metrics) >= AUTO_FLUSH_METRICS:
+            self.flush()
+
+    def log_metrics(self, metrics, step=0):
+        for key, value in metrics.items():
+            self.log_metric(key, value, step)
+
+    def log_artifact(self, path, artifact_path=None):
+        if self.enabled:
+            upload = self._store_artifact if self.store else self._client.log_artifact
+            self._queue.put((upload, (self.run_id, path, artifact_path)))
+
+    def log_artifacts(self, path, artifact_path=None):
+        if self.enabled:
+            upload = self._store_artifact if self.store else self._client.log_artifacts
+            self._queue.put((upload, (self.run_id, path, artifact_path)))
+
+    def _store_artifact(self, run_id, path, artifact_path):
+        """Dosya/klasörü depoya yaz (aynı içerik varsa yazılmaz), manifest'e ekle.
+
+        Etiket her yüklemede güncellenir: run kapanmadan çökse de nesneleri gc'den korunur.
+        """
+        self.store.add_path(self._manifest, path, artifact_path)
+        self._client.set_tag(run_id, MANIFEST_TAG, self.store.save_manifest(self._manifest))
+
+    def flush(self):
+        """Biriken parametre/metrikleri log_batch görevleri olarak arka plana gönder"""
+        if not self.enabled or not (self._params or self._metrics):
+            return
+        from mlflow.entities import Metric, Param
+
+        params = [Param(key, value) for key, value in self._params.items()]
+        metrics = [Metric(key, value, timestamp, step) for key, value, timestamp, step in self._metrics]
+        self._params, self._metrics = {}, []
+        for batch_params, batch_metrics in _split_batches(params, metrics):
+            self._queue.put((self._client.log_batch, (self.run_id, batch_metrics, batch_params)))
+
+    # ---- arka plan ----
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            func, args = task
+            try:
+                func(*args)
+            except Exception as e:  # kayıt hatası pipeline'ı durdurmaz, kapanışta raporlanır
+                self.errors.append(e)
+
+    # ---- kapanış ----
+    def close(self, status="FINISHED", wait=True):
+        """Kalan her şeyi gönder ve run'ı sonlandır.
+
+        wait=False: kapanış da kuyruğa eklenir ve hemen dönülür; süreç çıkışında beklenir.
+        """
+        if not self.enabled:
+            return
+        if not self._closed:
+            self._closed = True
+            self.flush()
+            self._queue.put((self._terminate, (status,)))
+            self._queue.put(None)
+        if wait:
+            self._worker.join()
+            _OPEN_RUNS.discard(self)
+
+    def _terminate(self, status):
+        try:
+            self._client.set_terminated(self.run_id, status=status)
+        except Exception as e:
+            self.errors.append(e)
+        if self.errors:
+            print(f"⚠️  MLflow kaydında {len(self.errors)} hata: {self.errors[0]}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Varsayılan: kuyruk boşalana kadar beklenir (havuz işçilerinde atexit çalışmaz, kayıtlar kaybolurdu).
+        # wait_on_exit=False yalnızca atexit'in çalıştığı ana süreçte anlamlıdır.
+        self.close("FAILED" if exc_type else "FINISHED", wait=self.wait_on_exit or exc_type is not None)
+        return False
+
+
+def _split_batches(params, metrics):
+    """log_batch limitleri: en fazla 100 parametre ve toplam 1000 kayıt"""
+    batches = []
+    while params or metrics:
+        batch_params = params[:MAX_PARAMS_PER_BATCH]
+        room = MAX_ENTITIES_PER_BATCH - len(batch_params)
+        batches.append((batch_params, metrics[:room]))
+        params, metrics = params[MAX_PARAMS_PER_BATCH:], metrics[room:]
+    return batches
+
+
+@atexit.register
+def _close_open_runs():
+    """Kapatılmamış / kapanışı süren run'lar süreç çıkışında beklenir"""
+    for run in list(_OPEN_RUNS):
+        run.close()
+
+
+def set_enabled(enabled):
+    """Sonraki run'lar için kaydı aç/kapat (CLI --no-tracking)"""
+    global TRACKING_ENABLED
+    TRACKING_ENABLED = bool(enabled)
+
+
+def start_run(experiment, run_name=None, enabled=None, store=None, wait_on_exit=True):
+    return TrackedRun(experiment, run_name=run_name, enabled=enabled, store=store, wait_on_exit=wait_on_exit)
@@ -0,0 +1,153 @@
+"""
+Tüm Sezonlar İçin Oyuncu Sıralaması (2010–2025)
+Her sezon bağımsız bir görev olarak süreç havuzunda çalışır:
+filtre → StandardScaler → PCA (a3) → LOF (a4) → sıralama (a5)
+Çıktılar: sezon bazlı sıralama tabloları + tüm sezonların birleşik tablosu
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+import a3_feature_engineering as a3
+from a4_model_training import fit_lof, N_NEIGHBORS, _limit_worker_threads
+from a5_model_evaluation import rank_players
+from columnar_cache import is_partitioned_fresh, partition_values, pyarrow_available, read_table, write_partitioned
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+SEASONS_DIR = "data/processed/seasons"
+COMBINED_CSV = "data/processed/player_ranked_all_seasons.csv"
+FIRST_SEASON = 2010
+LAST_SEASON = 2025
+MIN_PLAYERS = N_NEIGHBORS + 1  # LOF komşuluğu için gereken en az oyuncu
+
+RANKING_COLUMNS = [
+    'Year', 'rank', 'Player', 'Pos', 'final_score', 'base_score', 'lof_score', 'is_anomaly'
+]
+
+# ------------------------------
+# YARDIMCI FONKSİYONLAR
+# ------------------------------
+def available_seasons():
+    """Partisyonlu depodaki sezonlar; depo yoksa varsayılan aralık"""
+    if is_partitioned_fresh(a3.PARTITIONED_DIR, a3.INPUT_CSV):
+        return [int(v) for v in partition_values(a3.PARTITIONED_DIR, "Year")]
+    return list(range(FIRST_SEASON, LAST_SEASON + 1))
+
+
+def prepare_season_store():
+    """Partisyonlu depo bayatsa CSV'yi ana süreçte bir kez okuyup depoyu (ve önbelleği) yenile.
+
+    Aksi halde her işçi tüm CSV'yi ayrıştırır ve aynı önbelleği eşzamanlı yazmaya çalışır.
+    """
+    if not pyarrow_available() or is_partitioned_fresh(a3.PARTITIONED_DIR, a3.INPUT_CSV):
+        return False
+    if not os.path.exists(a3.INPUT_CSV):
+        return False
+    df = read_table(a3.INPUT_CSV)   # bayatsa Parquet önbelleğini de yeniden yazar
+    if "Year" not in df.columns:
+        return False
+    write_partitioned(df, a3.PARTITIONED_DIR, "Year", csv_path=a3.INPUT_CSV)
+    return True
+
+
+def season_csv(year):
+    return os.path.join(SEASONS_DIR, f"player_ranked_{year}.csv")
+
+# ------------------------------
+# TEK SEZON GÖREVİ
+# ------------------------------
+def rank_season(year, min_games=a3.MIN_GAMES):
+    """Bir sezonun filtre → PCA → LOF → sıralama adımlarını çalıştır.
+
+    Dönüş: (year, df_ranked veya None)
+    """
+    needed_cols = [
+        c for c in a3.input_columns()
+        if c not in a3.DROP_COLS or c in a3.FILTER_COLS
+    ]
+    df = a3.load_season(needed_cols, year=year, min_games=min_games)
+    df_filtered = a3.filter_season(df, year=year, min_games=min_games)
+    if len(df_filtered) < MIN_PLAYERS:
+        print(f"⚠️  {year}: yetersiz oyuncu ({len(df_filtered)}), atlandı.")
+        return year, None
+
+    pca_df, _, explained_df, _, _ = a3.fit_pca(df_filtered)
+    df_scored, _, _, _ = fit_lof(pca_df, explained_df)
+    df_ranked, _ = rank_players(df_scored, explained_df)
+    df_ranked.insert(0, 'Year', year)
+    return year, df_ranked[RANKING_COLUMNS]
+
+# ------------------------------
+# TÜM SEZONLAR
+# ------------------------------
+def rank_all_seasons(seasons=None, workers=None, min_games=a3.MIN_GAMES):
+    """Sezonları süreç havuzunda paralel sırala; {year: df_ranked} döndür"""
+    prepare_season_store()
+    seasons = seasons or available_seasons()
+    workers = workers or os.cpu_count() or 1
+    results = {}
+
+    if workers == 1:
+        for year in seasons:
+            _, df_ranked = rank_season(year, min_games)
+            if df_ranked is not None:
+                results[year] = df_ranked
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(seasons)),
+                             initializer=_limit_worker_threads) as pool:
+        futures = {pool.submit(rank_season, year, min_games): year for year in seasons}
+        for future in as_completed(futures):
+            year, df_ranked = future.result()
+            if df_ranked is not None:
+                results[year] = df_ranked
+                print(f"✓ {year} sezonu sıralandı: {len(df_ranked)} oyuncu")
+    return results
+
+
+def save_season_rankings(results):
+    """Sezon bazlı tabloları ve birleşik tabloyu kaydet"""
+    os.makedirs(SEASONS_DIR, exist_ok=True)
+    for year in sorted(results):
+        results[year].to_csv(season_csv(year), index=False)
+    print(f"✓ Sezon tabloları kaydedildi: {SEASONS_DIR} ({len(results)} sezon)")
+
+    combined = pd.concat([results[year] for year in sorted(results)], ignore_index=True)
+    combined.to_csv(COMBINED_CSV, index=False)
+    print(f"✓ Birleşik sıralama kaydedildi: {COMBINED_CSV} ({len(combined)} satır)")
+    return combined
+
+# ------------------------------
+# ANA FONKSİYON
+# ------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tüm sezonlar için oyuncu sıralaması")
+    parser.add_argument("--seasons", type=int, nargs="*", default=None,
+                        help="Sıralanacak sezonlar (varsayılan: depodaki tüm sezonlar)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Süreç sayısı (varsayılan: CPU sayısı)")
+    parser.add_argument("--min-games", type=int, default=a3.MIN_GAMES,
+                        help="Bir oyuncunun dahil edilmesi için en az maç sayısı")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("🏀 Tüm sezonlar için sıralama başlıyor...\n")
+    results = rank_all_seasons(args.seasons, args.workers, args.min_games)
+    if not results:
+        print("❌ Hiçbir sezon sıralanamadı.")
+        return None
+    combined = save_season_rankings(results)
+    print("\n✅ Tüm işlemler tamamlandı!\n")
+    return combined
+
+# ------------------------------
+# ÇALIŞTIR
+# ------------------------------
+if __name__ == "__main__":
+    main()
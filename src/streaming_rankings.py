@@ -0,0 +1,309 @@
+"""
+Bellek Dışı (Out-of-Core) Oyuncu Sıralaması
+scored_data.csv belleğe sığmadığında a5 sıralaması parça parça yapılır:
+  1. geçiş: birleştirilebilir KLL kantil taslağı ile PCA1 eşiğinin yaklaşık değeri
+  2. geçiş: taslağın hata penceresindeki değerler toplanır → eşik tam (exact) hesaplanır
+  3. geçiş: parçalar skorlanır, ilk/son 10 sınırlı yığınlarda tutulur, sıralı parçalar (run) diske yazılır
+  Son adım: run'lar k-yollu birleştirme (external sort) ile tam sıralama dosyasına yazılır.
+Bellek kullanımı parça boyu + pencere + run başına tampon ile sınırlıdır.
+"""
+
+import os
+import shutil
+import tempfile
+import argparse
+import numpy as np
+import pandas as pd
+
+import a5_model_evaluation as a5
+from columnar_cache import pyarrow_available
+
+# ------------------------------
+# AYARLAR
+# ------------------------------
+DEFAULT_CHUNKSIZE = 100_000
+SKETCH_K = 1000                 # KLL kapasitesi; sıra hatası ~ 1/k mertebesinde
+REFINE_ATTEMPTS = 4             # pencere her denemede iki katına çıkar
+MERGE_BUFFER_ROWS = 200_000     # birleştirmede tüm run tamponlarının toplam satır bütçesi
+SLICE_SIZE = 10                 # ilk / orta / son dilim boyu
+RUN_ROW_GROUP_ROWS = 10_000     # run dosyaları küçük satır gruplarıyla yazılır (okuma tamponu sınırlı kalsın)
+
+# ------------------------------
+# BİRLEŞTİRİLEBİLİR KANTİL TASLAĞI (KLL)
+# ------------------------------
+class QuantileSketch:
+    """KLL taslağı: seviye h'deki her eleman 2**h ağırlık taşır; taslaklar merge() ile birleşir"""
+
+    def __init__(self, k=SKETCH_K, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        compacted = True
+        while compacted:
+            compacted = False
+            for level in range(len(self.levels)):
+                buf = self.levels[level]
+                if len(buf) <= self._capacity(level):
+                    continue
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                buf = np.sort(buf)
+                odd = len(buf) % 2  # tek sayıdaysa bir eleman bu seviyede kalır
+                promoted = buf[odd:][self.rng.integers(2)::2]
+                self.levels[level] = buf[:odd]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                compacted = True
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, buf in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], buf])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(buf), 2.0 ** h) for h, buf in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        idx = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return float(values[order][min(idx, len(values) - 1)])
+
+# ------------------------------
+# PARÇA OKUMA / RUN DOSYALARI
+# ------------------------------
+def iter_chunks(input_csv, chunksize):
+    yield from pd.read_csv(input_csv, chunksize=chunksize)
+
+
+def _write_run(df, path):
+    df = df.assign(category=df["category"].astype(str))
+    if pyarrow_available():
+        df.to_parquet(path, index=False, row_group_size=RUN_ROW_GROUP_ROWS)
+    else:
+        df.to_csv(path, index=False)
+
+
+def _iter_run(path, batch_size):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        # pre_buffer kapalı: run başına tüm dosya önceden belleğe alınmasın
+        parquet_file = pq.ParquetFile(path, pre_buffer=False)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, use_threads=False):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=batch_size)
+
+
+def _sort_key(df):
+    return df["final_score"].fillna(-np.inf).to_numpy()
+
+
+def merge_runs(run_paths, batch_size):
+    """Azalan final_score ile sıralı run'ları k-yollu birleştir, sıralı parçalar üret.
+
+    Her adımda, tamponu biten run'ların gelecekteki satırları tampon sonundaki değerden büyük
+    olamayacağından, tüm tamponların son değerlerinin en büyüğüne eşit/üstü satırlar güvenle yazılır.
+    """
+    iterators = [_iter_run(path, batch_size) for path in run_paths]
+    buffers = [next(it, None) for it in iterators]
+    while True:
+        active = [i for i, buf in enumerate(buffers) if buf is not None and len(buf)]
+        if not active:
+            return
+        bound = max(_sort_key(buffers[i])[-1] for i in active)
+        parts = []
+        for i in active:
+            safe = _sort_key(buffers[i]) >= bound
+            parts.append(buffers[i][safe])
+            buffers[i] = buffers[i][~safe]
+            if not len(buffers[i]):
+                buffers[i] = next(iterators[i], None)
+        merged = pd.concat(parts, ignore_index=True)
+        yield merged.iloc[np.argsort(-_sort_key(merged), kind="stable")]
+
+# ------------------------------
+# EŞİK (yaklaşık taslak → tam değer)
+# ------------------------------
+def sketch_column(input_csv, column, chunksize=DEFAULT_CHUNKSIZE):
+    """1. geçiş: toplam satır sayısı + kolonun kantil taslağı"""
+    sketch, n_rows = QuantileSketch(), 0
+    for chunk in iter_chunks(input_csv, chunksize):
+        n_rows += len(chunk)
+        sketch.update(chunk[column].to_numpy(dtype=np.float64))
+    return n_rows, sketch
+
+
+def exact_quantile(input_csv, column, q, sketch, chunksize=DEFAULT_CHUNKSIZE):
+    """2. geçiş: taslağın ±eps penceresindeki değerleri topla ve tam kantili bul.
+
+    np.nanquantile (doğrusal enterpolasyon) ile aynı sonucu verir. Dönüş: (değer, tam_mı)
+    """
+    n = sketch.n
+    position = q * (n - 1)
+    ranks = (int(np.floor(position)), int(np.ceil(position)))
+    eps = 4.0 / sketch.k
+    for _ in range(REFINE_ATTEMPTS):
+        lo = sketch.quantile(q - eps) if q - eps > 0 else -np.inf
+        hi = sketch.quantile(q + eps) if q + eps < 1 else np.inf
+        below, window = 0, []
+        for chunk in iter_chunks(input_csv, chunksize):
+            values = chunk[column].to_numpy(dtype=np.float64)
+            below += int((values < lo).sum())
+            window.append(values[(values >= lo) & (values <= hi)])
+        window = np.sort(np.concatenate(window))
+        offsets = [r - below for r in ranks]
+        if all(0 <= o < len(window) for o in offsets):
+            a, b = window[offsets[0]], window[offsets[1]]
+            return float(a + (position - ranks[0]) * (b - a)), True
+        eps *= 2
+    print("⚠️  Kantil penceresi yetersiz kaldı; taslak tahmini kullanılıyor.")
+    return sketch.quantile(q), False
+
+# ------------------------------
+# SINIRLI YIĞINLAR (ilk / son k)
+# ------------------------------
+class TopK:
+    """final_score'a göre en büyük (veya en küçük) k satırı tutan sınırlı tampon"""
+
+    def __init__(self, k, largest=True):
+        self.k = k
+        self.largest = largest
+        self.df = None
+
+    def push(self, df):
+        pick = pd.DataFrame.nlargest if self.largest else pd.DataFrame.nsmallest
+        candidates = pick(df, self.k, "final_score")
+        if self.df is not None:
+            candidates = pick(pd.concat([self.df, candidates], ignore_index=True), self.k, "final_score")
+        self.df = candidates.reset_index(drop=True)
+
+    def result(self):
+        return self.df.sort_values("final_score", ascending=False).reset_index(drop=True)
+
+# ------------------------------
+# AKIŞ SIRALAMASI
+# ------------------------------
+def rank_streaming(input_csv=a5.SCORED_INPUT_CSV, variance_csv=a5.EXPLAINED_VARIANCE_CSV,
+                   output_csv=a5.OUTPUT_RANKINGS_CSV, config=None, chunksize=DEFAULT_CHUNKSIZE,
+                   top_csv=a5.TOP_10_CSV, middle_csv=a5.MIDDLE_10_CSV, bottom_csv=a5.BOTTOM_10_CSV,
+                   elite_csv=a5.ELITE_CSV):
+    """a5 sıralamasının bellek dışı sürümü; aynı dosyaları üretir, özet sözlüğü döndürür"""
+    config = config or a5.RANKING_CONFIG
+    df_variance = pd.read_csv(variance_csv, index_col=0)
+    pca_columns, weights = a5.ranking_weights(df_variance, config)
+    split_column = config["split_column"]
+
+    n_rows, sketch = sketch_column(input_csv, split_column, chunksize)
+    threshold, exact = exact_quantile(input_csv, split_column, config["split_quantile"], sketch, chunksize)
+    print(f"✓ {split_column} eşiği: {threshold:.6f} ({'tam' if exact else 'yaklaşık'}, {n_rows} satır)")
+
+    os.makedirs(os.path.dirname(output_csv) or ".", exist_ok=True)
+    run_dir = tempfile.mkdtemp(prefix="ranking_runs_", dir=os.path.dirname(output_csv) or ".")
+    suffix = ".parquet" if pyarrow_available() else ".csv"
+    top, bottom = TopK(SLICE_SIZE, largest=True), TopK(SLICE_SIZE, largest=False)
+    counts = {"elite": 0, "weak": 0, "normal": 0}
+    try:
+        # 3. geçiş: skorla, yığınlara it, sıralı run yaz
+        run_paths = []
+        for chunk in iter_chunks(input_csv, chunksize):
+            scored, category = a5.score_players(chunk, pca_columns, weights, threshold, config)
+            for code, label in enumerate(["normal", "elite", "weak"]):
+                counts[label] += int((category == code).sum())
+            top.push(scored)
+            bottom.push(scored)
+            run_path = os.path.join(run_dir, f"run-{len(run_paths):05d}{suffix}")
+            _write_run(scored.iloc[np.argsort(-_sort_key(scored), kind="stable")], run_path)
+            run_paths.append(run_path)
+
+        # Birleştir: tam sıralama + orta dilim + elite anomaliler
+        middle_start = n_rows // 2 - SLICE_SIZE // 2
+        middle_end = middle_start + SLICE_SIZE
+        batch_size = max(1_000, min(RUN_ROW_GROUP_ROWS, MERGE_BUFFER_ROWS // max(len(run_paths), 1)))
+        written, middle_parts = 0, []
+        for path in (output_csv, elite_csv):
+            if os.path.exists(path):
+                os.remove(path)
+        for batch in merge_runs(run_paths, batch_size):
+            batch = batch.assign(rank=np.arange(written + 1, written + len(batch) + 1))
+            batch[a5.COLUMNS_TO_SAVE].to_csv(output_csv, mode="a", header=written == 0, index=False)
+            elite = batch[batch["category"] == "elite"].drop(columns=["rank", "category"])
+            elite.to_csv(elite_csv, mode="a", header=not os.path.exists(elite_csv), index=False)
+            lo, hi = max(middle_start - written, 0), min(middle_end - written, len(batch))
+            if lo < hi:
+                middle_parts.append(batch.iloc[lo:hi])
+            written += len(batch)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    if not os.path.exists(elite_csv):
+        pd.DataFrame(columns=[c for c in a5.COLUMNS_TO_SAVE if c != "rank"]).to_csv(elite_csv, index=False)
+    df_top = top.result().assign(rank=lambda d: np.arange(1, len(d) + 1))
+    df_bottom = bottom.result().assign(rank=lambda d: np.arange(n_rows - len(d) + 1, n_rows + 1))
+    df_top[a5.COLUMNS_TO_SAVE].to_csv(top_csv, index=False)
+    df_middle = pd.concat(middle_parts) if middle_parts else df_top.iloc[:0]
+    df_middle[a5.COLUMNS_TO_SAVE].to_csv(middle_csv, index=False)
+    df_bottom[a5.COLUMNS_TO_SAVE].to_csv(bottom_csv, index=False)
+    print(f"✓ Tüm sıralama kaydedildi (external sort, {len(run_paths)} run): {output_csv}")
+
+    return {
+        "pca_columns": pca_columns,
+        "weights": weights,
+        "total_variance_used": float(df_variance['explained_variance_ratio'].reindex(pca_columns).sum()),
+        "pca1_median": threshold,
+        "threshold_exact": exact,
+        "counts": counts,
+        "rows": n_rows,
+        "config": config,
+    }
+
+# ------------------------------
+# ANA FONKSİYON
+# ------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bellek dışı oyuncu sıralaması")
+    parser.add_argument("--input", default=a5.SCORED_INPUT_CSV, help="Skorlanmış giriş CSV'si")
+    parser.add_argument("--output", default=a5.OUTPUT_RANKINGS_CSV, help="Tam sıralama çıktısı")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Parça başına satır sayısı")
+    parser.add_argument("--config", default=None, help="Sıralama kuralları JSON dosyası")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("🏀 Bellek dışı oyuncu sıralaması başlıyor...\n")
+    config = a5.load_ranking_config(args.config)
+    summary = rank_streaming(args.input, output_csv=args.output, config=config, chunksize=args.chunksize)
+    a5.save_ranking_config(config)
+    counts = summary["counts"]
+    print(f"\n✓ Elite anomaliler: {counts['elite']}")
+    print(f"✓ Zayıf anomaliler: {counts['weak']}")
+    print(f"✓ Normal oyuncular: {counts['normal']}")
+    a5.log_rankings_to_mlflow(summary["pca_columns"], summary["weights"], summary["total_variance_used"],
+                              summary["pca1_median"], counts, config,
+                              artifacts=[args.output, a5.TOP_10_CSV, a5.MIDDLE_10_CSV, a5.BOTTOM_10_CSV, a5.ELITE_CSV])
+    print("\n✅ Tüm işlemler tamamlandı!\n")
+    return summary
+
+# ------------------------------
+# ÇALIŞTIR
+# ------------------------------
+if __name__ == "__main__":
+    main()
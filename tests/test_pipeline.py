@@ -1,10 +1,16 @@
 import os
+import sys
+import time
+import types
 import pytest
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.decomposition import PCA
 
+# src/ altındaki modülleri import edebilmek için
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
 # ------------------------------
 # Test Data Paths
 # ------------------------------
@@ -15,6 +21,25 @@ PCA_DATA = "data/processed/pca_features.csv"
 SCORED_DATA = "data/processed/scored_data.csv"
 RANKED_DATA = "data/processed/player_ranked.csv"
 
+STAT_COLS = [
+    'MP', 'FG', 'FGA', '3P', '3PA', '2P', '2PA', 'FT', 'FTA',
+    'ORB', 'DRB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS'
+]
+
+def make_clean_data(n_per_season=60, seasons=(2024, 2025), seed=0):
+    """a2 çıktısı biçiminde sentetik temiz veri üret"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for year in seasons:
+        df = pd.DataFrame({c: rng.gamma(2.0, 2.0, n_per_season) for c in STAT_COLS})
+        df.insert(0, 'Player', [f"Player {year}-{i}" for i in range(n_per_season)])
+        df.insert(1, 'Pos', rng.choice(['PG', 'SG', 'SF', 'PF', 'C'], n_per_season))
+        df.insert(2, 'Team', 'LAL')
+        df.insert(3, 'Year', year)
+        df.insert(4, 'G', rng.integers(15, 83, n_per_season))
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
 # ------------------------------
 # Test 1: Raw Data Exists
 # ------------------------------
@@ -167,21 +192,25 @@ def test_pca_reconstruction():
 # Test 9: Model Files Exist
 # ------------------------------
 def test_model_files():
-    """Model dosyalarının varlığı"""
-    model_files = [
-        "models/lof_model.joblib",
-        "models/scaler.joblib"
-    ]
-    
+    """Kompakt LOF modeli (a4 çıktısı) ve başlıktaki diziler"""
+    import json
+    model_dir = "models/lof_compact"
+    header_path = os.path.join(model_dir, "header.json")
+    if not os.path.exists(header_path):
+        pytest.skip(f"Model files not found: {header_path}")
+
+    with open(header_path, "r", encoding="utf-8") as f:
+        header = json.load(f)
     missing_files = []
-    for file in model_files:
-        if os.path.exists(file):
-            print(f"✓ Model file found: {file}")
-        else:
-            missing_files.append(file)
-    
-    if missing_files:
-        pytest.skip(f"Model files not found: {missing_files}")
+    for name, meta in header["arrays"].items():
+        path = os.path.join(model_dir, f"{name}.npy")
+        if not os.path.exists(path):
+            missing_files.append(path)
+            continue
+        array = np.load(path, mmap_mode="r")
+        assert list(array.shape) == meta["shape"], f"❌ {path} shape mismatch"
+        print(f"✓ Model file found: {path}")
+    assert not missing_files, f"❌ Model arrays missing: {missing_files}"
 
 # ------------------------------
 # Test 10: Data Consistency Across Pipeline
@@ -242,6 +271,1289 @@ def test_output_files():
     if missing:
         pytest.skip(f"Output files not generated yet: {missing}")
 
+# ------------------------------
+# Test 12: Manifest-Based Incremental Fetch
+# ------------------------------
+def test_incremental_fetch(tmp_path):
+    """Manifest eşleşirse indirme atlanmalı, değişiklikte yeniden indirilmeli"""
+    import a1_data_collection as a1
+
+    source_dir = tmp_path / "source"
+    raw_dir = tmp_path / "raw"
+    source_dir.mkdir()
+    raw_dir.mkdir()
+    (source_dir / "stats.csv").write_text("Player,G\nA,10\n", encoding="utf-8")
+    source = a1.LocalDirSource(str(source_dir))
+
+    # İlk çalıştırma: indirilir ve manifest yazılır
+    assert a1.fetch_dataset(source, str(raw_dir)) == (True, True)
+    manifest = a1.load_manifest(str(raw_dir))
+    assert set(manifest["files"]) == {"stats.csv"}
+
+    # Değişiklik yok: atlanır
+    assert a1.fetch_dataset(source, str(raw_dir)) == (True, False)
+
+    # Yerel dosya bozuldu: yeniden indirilir
+    (raw_dir / "stats.csv").write_text("bozuk", encoding="utf-8")
+    assert a1.fetch_dataset(source, str(raw_dir)) == (True, True)
+    assert (raw_dir / "stats.csv").read_text(encoding="utf-8").startswith("Player")
+
+    # Kaynak sürümü değişti: yeniden indirilir
+    (source_dir / "stats.csv").write_text("Player,G\nA,11\n", encoding="utf-8")
+    assert a1.fetch_dataset(source, str(raw_dir)) == (True, True)
+    assert a1.fetch_dataset(source, str(raw_dir)) == (True, False)
+
+    print("✓ Incremental fetch skips unchanged data")
+
+# ------------------------------
+# Test 13: Columnar Cache
+# ------------------------------
+def test_columnar_cache(tmp_path):
+    """Parquet önbelleği tipli yazılmalı, CSV değişince bayat sayılmalı"""
+    pytest.importorskip("pyarrow")
+    from columnar_cache import read_table, is_cache_fresh, cache_path_for
+
+    csv_path = tmp_path / "stats.csv"
+    pd.DataFrame({
+        "Player": ["A", "B", "C"], "Pos": ["PG", "C", "PG"], "Year": [2024, 2025, 2025],
+        "G": [10, 20, 30], "FG%": [0.45, 0.5, 0.55],
+    }).to_csv(csv_path, index=False)
+
+    df = read_table(str(csv_path))
+    assert os.path.exists(cache_path_for(str(csv_path)))
+    assert is_cache_fresh(str(csv_path))
+
+    cached = read_table(str(csv_path), columns=["Player", "G", "FG%"])
+    assert list(cached.columns) == ["Player", "G", "FG%"]
+    assert isinstance(cached["Player"].dtype, pd.CategoricalDtype)
+    assert cached["G"].dtype == np.int16
+    assert cached["FG%"].dtype == np.float32
+    assert len(df) == 3
+
+    # Kaynak değişti → önbellek bayat, yeni içerik okunur
+    pd.DataFrame({"Player": ["D"], "Pos": ["SF"], "Year": [2025], "G": [40], "FG%": [0.6]}) \
+        .to_csv(csv_path, mode="a", header=False, index=False)
+    assert not is_cache_fresh(str(csv_path))
+    assert len(read_table(str(csv_path))) == 4
+
+    print("✓ Columnar cache typed and invalidated on change")
+
+# ------------------------------
+# Test 14: Streaming Clean Matches In-Memory Clean
+# ------------------------------
+def test_streaming_clean(tmp_path, monkeypatch):
+    """Parça parça temizleme, tek seferde temizleme ile aynı sonucu vermeli"""
+    import a2_data_preprocessing as a2
+    monkeypatch.setattr(a2, "MISSING_REPORT_CSV", str(tmp_path / "missing.csv"))
+    monkeypatch.setattr(a2, "COERCION_REPORT_CSV", str(tmp_path / "coercion.csv"))
+
+    raw = pd.DataFrame({
+        "Team": ["LAL", "BOS", None, "GSW", "LAL"],
+        "Player": ["A", "B", "C", "D", "E"],
+        "Pos": ["PG", "C", "SF", "PF", "SG"],
+        "Year": [2025, 2025, 2024, 2025, 2023],
+        "G": [10, None, 30, 40, 50],
+        "PTS": [1.5, 2.5, None, 4.5, None],
+        "Extra": [1, 2, 3, 4, 5],
+    })
+    raw_csv = tmp_path / "raw.csv"
+    raw.to_csv(raw_csv, index=False)
+
+    out_csv = tmp_path / "clean.csv"
+    rows = a2.clean_data_streaming(str(raw_csv), str(out_csv), chunksize=2)
+    assert rows == len(raw)
+
+    streamed = pd.read_csv(out_csv)
+    expected_csv = tmp_path / "expected.csv"
+    a2.reorder_columns(a2.clean_data(pd.read_csv(raw_csv))).to_csv(expected_csv, index=False)
+    pd.testing.assert_frame_equal(streamed, pd.read_csv(expected_csv))
+
+    report = pd.read_csv(tmp_path / "missing.csv").set_index("Column")["MissingValues"]
+    assert report.to_dict() == {"Team": 1, "G": 1, "PTS": 2}
+
+    # Akış ortasında hata: geçici dosya kalmamalı, önceki çıktı korunmalı
+    calls = {"n": 0}
+    original_apply_schema = a2.apply_schema
+
+    def failing_apply_schema(chunk):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise RuntimeError("parça bozuk")
+        return original_apply_schema(chunk)
+
+    monkeypatch.setattr(a2, "apply_schema", failing_apply_schema)
+    with pytest.raises(RuntimeError):
+        a2.clean_data_streaming(str(raw_csv), str(out_csv), chunksize=2)
+    assert not os.path.exists(str(out_csv) + ".tmp")
+    assert not os.path.exists(a2.partitioned_dir_for(str(out_csv)) + ".tmp")
+    pd.testing.assert_frame_equal(pd.read_csv(out_csv), streamed)
+
+    print("✓ Streaming clean matches in-memory clean")
+
+# ------------------------------
+# Test 15: Schema Coercion
+# ------------------------------
+def test_schema_coercion(tmp_path, monkeypatch):
+    """Tek bozuk hücre tüm kolonu object bırakmamalı; hatalı hücreler sayılmalı"""
+    import a2_data_preprocessing as a2
+    monkeypatch.setattr(a2, "COERCION_REPORT_CSV", str(tmp_path / "coercion.csv"))
+
+    raw = pd.DataFrame({
+        "Player": ["A", "B", None],
+        "Pos": ["PG", None, "C"],
+        "G": ["10", "x", "30"],
+        "PTS": ["1.5", "2.5", "--"],
+    })
+    df, bad_counts = a2.apply_schema(raw)
+
+    assert len(df) == 2  # Player eksik satır atıldı
+    assert df["G"].dtype == np.int16
+    assert df["PTS"].dtype == np.float32
+    assert isinstance(df["Pos"].dtype, pd.CategoricalDtype)
+    assert df["Pos"].tolist() == ["PG", "Unknown"]
+    assert df["G"].tolist() == [10, 0]
+    assert bad_counts["G"] == 1 and bad_counts["PTS"] == 1
+
+    print("✓ Schema coercion vectorized with bad-value counts")
+
+# ------------------------------
+# Test 16: Year-Partitioned Store
+# ------------------------------
+def test_partitioned_store(tmp_path):
+    """Sadece istenen sezonun partisyonu okunmalı"""
+    pytest.importorskip("pyarrow")
+    from columnar_cache import write_partitioned, read_partitioned, partition_values, PartitionedWriter
+
+    df = pd.DataFrame({
+        "Player": ["A", "B", "C", "D"], "Year": [2024, 2025, 2025, 2023], "G": [20, 10, 40, 50],
+    })
+    root = str(tmp_path / "by_year")
+    write_partitioned(df, root, "Year")
+    assert partition_values(root, "Year") == ["2023", "2024", "2025"]
+
+    # Diğer sezonu boz: okunursa hata verir
+    other = tmp_path / "by_year" / "Year=2024"
+    for f in other.iterdir():
+        f.write_bytes(b"not parquet")
+
+    season = read_partitioned(root, "Year", values=[2025], filters=[("G", ">=", 15)])
+    assert season["Player"].astype(str).tolist() == ["C"]
+
+    # Akış modu: aynı sezon farklı boyda parçalarla yazılır (int8/int16 sözlük, int16/float32 kolon)
+    writer = PartitionedWriter(str(tmp_path / "streamed"), "Year")
+    big = pd.DataFrame({"Player": [f"P{i}" for i in range(300)], "Year": 2025,
+                        "G": np.arange(300) % 80, "PTS": np.arange(300) * 1000})
+    small = pd.DataFrame({"Player": [f"Q{i}" for i in range(10)], "Year": 2025,
+                          "G": np.arange(10) + 0.5, "PTS": np.arange(10)})
+    writer.write(big)
+    writer.write(small)
+    writer.close()
+    season = read_partitioned(str(tmp_path / "streamed"), "Year", values=[2025])
+    assert len(season) == 310 and season["Player"].astype(str).tolist()[-1] == "Q9"
+    assert season["G"].iloc[-1] == 9.5 and season["PTS"].iloc[299] == 299_000
+
+    print("✓ Partition pruning reads only the requested season")
+
+# ------------------------------
+# Test 17: All-Seasons Ranking (process pool)
+# ------------------------------
+def test_all_seasons_ranking(tmp_path, monkeypatch):
+    """Sezonlar paralel sıralanmalı; sonuçlar seri çalıştırmayla aynı olmalı"""
+    pytest.importorskip("pyarrow")
+    pytest.importorskip("mlflow")
+    import a3_feature_engineering as a3
+    import season_rankings
+    from columnar_cache import write_partitioned
+
+    clean_csv = tmp_path / "clean_data.csv"
+    df = make_clean_data(seasons=(2023, 2024, 2025))
+    df.to_csv(clean_csv, index=False)
+    write_partitioned(df, str(tmp_path / "by_year"), "Year", csv_path=str(clean_csv))
+    monkeypatch.setattr(a3, "INPUT_CSV", str(clean_csv))
+    monkeypatch.setattr(a3, "PARTITIONED_DIR", str(tmp_path / "by_year"))
+
+    assert season_rankings.available_seasons() == [2023, 2024, 2025]
+    serial = season_rankings.rank_all_seasons(workers=1)
+    parallel = season_rankings.rank_all_seasons(workers=2)
+
+    assert sorted(parallel) == [2023, 2024, 2025]
+    for year, ranked in parallel.items():
+        assert (ranked["Year"] == year).all()
+        assert ranked["rank"].tolist() == list(range(1, len(ranked) + 1))
+        pd.testing.assert_frame_equal(ranked, serial[year])
+
+    # Bayat depo havuzdan önce ana süreçte bir kez yenilenir (işçiler CSV ayrıştırmaz)
+    from columnar_cache import is_partitioned_fresh
+    df.iloc[:-1].to_csv(clean_csv, index=False)
+    assert not is_partitioned_fresh(a3.PARTITIONED_DIR, a3.INPUT_CSV)
+    assert season_rankings.prepare_season_store()
+    assert is_partitioned_fresh(a3.PARTITIONED_DIR, a3.INPUT_CSV)
+    assert not season_rankings.prepare_season_store()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+    print("✓ All seasons ranked in a process pool")
+
+# ------------------------------
+# Test 18: Truncated PCA by Variance Target
+# ------------------------------
+def test_truncated_pca():
+    """Varyans hedefiyle sadece gereken bileşenler hesaplanmalı"""
+    import a3_feature_engineering as a3
+
+    rng = np.random.default_rng(1)
+    n, latent = 300, rng.normal(size=(300, 3))
+    df = pd.DataFrame({"Player": [f"P{i}" for i in range(n)], "Pos": "PG"})
+    mixing = rng.normal(size=(3, 30))
+    stats = latent @ mixing + 0.05 * rng.normal(size=(n, 30))
+    df = pd.concat([df, pd.DataFrame(stats, columns=[f"S{i}" for i in range(30)])], axis=1)
+
+    for solver in ("full", "randomized"):
+        features, loadings, explained, _, pca = a3.fit_pca(df, n_components=0.95, svd_solver=solver)
+        k = pca.n_components_
+        assert a3.PCA_MIN_COMPONENTS <= k < 30
+        assert explained["explained_variance_ratio"].sum() >= 0.95
+        assert loadings.shape == (30, k)
+        assert len(explained) == k
+        assert [c for c in features.columns if c.startswith("PCA")] == [f"PCA{i+1}" for i in range(k)]
+
+    print("✓ Truncated PCA sized by variance target")
+
+# ------------------------------
+# Test 19: Streaming IncrementalPCA
+# ------------------------------
+def test_streaming_pca(tmp_path, monkeypatch):
+    """Parça parça IncrementalPCA, tam PCA ile aynı alt uzayı bulmalı"""
+    import a3_feature_engineering as a3
+
+    clean_csv = tmp_path / "clean_data.csv"
+    df = make_clean_data(n_per_season=150, seasons=(2024, 2025))
+    df.to_csv(clean_csv, index=False)
+    monkeypatch.setattr(a3, "INPUT_CSV", str(clean_csv))
+    monkeypatch.setattr(a3, "PARTITIONED_DIR", str(tmp_path / "missing"))
+
+    filtered_csv, features_csv = tmp_path / "filtered.csv", tmp_path / "features.csv"
+    loadings, explained, scaler, ipca, rows = a3.fit_pca_streaming(
+        chunksize=37, filtered_csv=str(filtered_csv), pca_output_csv=str(features_csv)
+    )
+    features = pd.read_csv(features_csv)
+    assert rows == len(df) == len(features) == len(pd.read_csv(filtered_csv))
+    assert list(features.columns[:3]) == ["Player", "Pos", "Year"]
+
+    # Referans: tüm veri bellekte PCA
+    numeric = df[[c for c in df.columns if c not in a3.DROP_COLS + a3.STREAM_INFO_COLS]]
+    reference = PCA().fit(StandardScaler().fit_transform(numeric))
+    np.testing.assert_allclose(
+        explained["explained_variance_ratio"].values, reference.explained_variance_ratio_, atol=1e-6
+    )
+    np.testing.assert_allclose(np.abs(features["PCA1"].values),
+                               np.abs(reference.transform(StandardScaler().fit_transform(numeric))[:, 0]),
+                               atol=1e-6)
+
+    print("✓ Streaming IncrementalPCA matches in-memory PCA")
+
+# ------------------------------
+# Test 20: Frozen Transforms + Novelty Scoring
+# ------------------------------
+def test_score_new_rows(tmp_path):
+    """Yeni satırlar yeniden fit edilmeden skorlanmalı; eğitim skorları değişmemeli"""
+    pytest.importorskip("mlflow")
+    import a3_feature_engineering as a3
+    import a4_model_training as a4
+    from sklearn.neighbors import LocalOutlierFactor
+
+    df = a3.filter_season(make_clean_data(n_per_season=120, seasons=(2025,)), year=2025)
+    pca_df, loadings, explained, scaler, pca = a3.fit_pca(df)
+    transform_path = a3.save_feature_transform(scaler, pca, loadings.index, str(tmp_path / "ft.joblib"))
+    df_scored, lof, lof_scaler, top_cols = a4.fit_lof(pca_df, explained)
+
+    # Eğitim skorları novelty=False ile birebir aynı
+    reference = LocalOutlierFactor(n_neighbors=a4.N_NEIGHBORS).fit(lof_scaler.transform(pca_df[top_cols]))
+    np.testing.assert_allclose(df_scored["lof_score"], -reference.negative_outlier_factor_)
+
+    state = a4.build_lof_state(df_scored, lof_scaler, top_cols)
+    model = a4.build_compact_model(state, lof_scaler, top_cols, transform_path)
+    new_rows = df.head(5).copy()
+    new_rows.loc[new_rows.index[0], STAT_COLS] = 500.0
+    scored = a4.score_new_rows(new_rows, model)
+
+    assert len(scored) == 5
+    # Değişmeyen satırların projeksiyonu eğitimdekiyle aynı
+    np.testing.assert_allclose(scored[top_cols].values[1:], pca_df[top_cols].values[1:5], atol=1e-5)
+    assert scored["is_anomaly"].iloc[0] == 1
+    assert (scored["lof_score"] > 0).all()
+    # Kompakt model, sklearn novelty LOF ile aynı skoru verir
+    lof = LocalOutlierFactor(n_neighbors=a4.N_NEIGHBORS, novelty=True).fit(
+        lof_scaler.transform(pca_df[top_cols]))
+    X_new = lof_scaler.transform(scored[top_cols])
+    np.testing.assert_allclose(scored["lof_score"], -lof.score_samples(X_new), rtol=1e-8)
+    assert (scored["is_anomaly"] == (lof.predict(X_new) == -1)).all()
+
+    print("✓ New rows scored through frozen transforms")
+
+# ------------------------------
+# Test 21: LOF Sweep From a Single k-NN Graph
+# ------------------------------
+def test_lof_sweep():
+    """Tek k-NN grafiğinden türetilen LOF, her k için sklearn ile aynı olmalı"""
+    pytest.importorskip("mlflow")
+    import a3_feature_engineering as a3
+    import a4_model_training as a4
+    from sklearn.neighbors import LocalOutlierFactor, NearestNeighbors
+
+    X = np.random.default_rng(2).normal(size=(150, 5))
+    distances, indices = NearestNeighbors(n_neighbors=30).fit(X).kneighbors()
+    for k in (5, 12, 30):
+        expected = -LocalOutlierFactor(n_neighbors=k).fit(X).negative_outlier_factor_
+        np.testing.assert_allclose(a4.lof_from_neighbors(distances, indices, k), expected, rtol=1e-10)
+
+    df = a3.filter_season(make_clean_data(n_per_season=120, seasons=(2025,)), year=2025)
+    pca_df, _, explained, _, _ = a3.fit_pca(df)
+    sweep = a4.run_sweep(pca_df, explained, neighbors_grid=[10, 20], pca_counts=[5, 7], workers=2)
+    assert len(sweep) == 4
+
+    df_scored, _, _, _ = a4.fit_lof(pca_df, explained)  # N_NEIGHBORS=20, SELECTED_PCA_COUNT=7
+    row = sweep[(sweep["n_neighbors"] == 20) & (sweep["selected_pca_count"] == 7)].iloc[0]
+    assert row["anomaly_count"] == df_scored["is_anomaly"].sum()
+    assert row["avg_lof_score"] == pytest.approx(df_scored["lof_score"].mean())
+
+    # Geçerli PCA sayısı kalmazsa açık hata; boş argüman argparse'ta reddedilir
+    with pytest.raises(ValueError):
+        a4.run_sweep(pca_df, explained, neighbors_grid=[10], pca_counts=[len(explained) + 1], workers=1)
+    with pytest.raises(SystemExit):
+        a4.parse_args(["--sweep", "--pca-counts"])
+
+    print("✓ LOF sweep reuses one neighbor graph per subset")
+
+# ------------------------------
+# Test 22: Incremental LOF Update
+# ------------------------------
+def test_incremental_lof_update(tmp_path):
+    """Artımlı LOF güncellemesi, güncel noktalar üzerinde sıfırdan fit ile aynı olmalı"""
+    pytest.importorskip("mlflow")
+    import a3_feature_engineering as a3
+    import a4_model_training as a4
+    from lof_incremental import IncrementalLOF
+    from sklearn.neighbors import LocalOutlierFactor
+
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(400, 4))
+    state = IncrementalLOF(n_neighbors=10).fit(X)
+    np.testing.assert_allclose(state.lof_, -LocalOutlierFactor(n_neighbors=10).fit(X).negative_outlier_factor_)
+
+    changed = np.array([5, 77, 300])
+    X_moved = rng.normal(size=(3, 4)) + 2.0
+    X_new = rng.normal(size=(2, 4))
+    affected = state.update(changed, X_moved, X_new)
+    X_full = np.vstack([X, X_new])
+    X_full[changed] = X_moved
+    expected = -LocalOutlierFactor(n_neighbors=10).fit(X_full).negative_outlier_factor_
+    np.testing.assert_allclose(state.lof_, expected, rtol=1e-9)
+    assert len(affected) < len(X_full)
+
+    # scored_data seviyesinde: değişen oyuncu yerinde, yeni oyuncu sona eklenir
+    df = a3.filter_season(make_clean_data(n_per_season=150, seasons=(2025,)), year=2025)
+    pca_df, loadings, explained, scaler, pca = a3.fit_pca(df)
+    df_scored, lof, lof_scaler, top_cols = a4.fit_lof(pca_df, explained)
+    transform_path = a3.save_feature_transform(scaler, pca, loadings.index, str(tmp_path / "ft.joblib"))
+    lof_state = a4.build_lof_state(df_scored, lof_scaler, top_cols)
+    model = a4.build_compact_model(lof_state, lof_scaler, top_cols, transform_path)
+
+    changed_rows = df.iloc[[3]].copy()
+    changed_rows[STAT_COLS] = changed_rows[STAT_COLS] * 3
+    inserted = df.iloc[[10]].copy()
+    inserted["Player"] = "Brand New Player"
+    updated, affected = a4.update_scored_rows(df_scored, pd.concat([changed_rows, inserted]), lof_state, model)
+
+    assert len(updated) == len(df_scored) + 1
+    assert updated["Player"].iloc[-1] == "Brand New Player"
+    X_refit = lof_scaler.transform(updated[top_cols])
+    refit = -LocalOutlierFactor(n_neighbors=a4.N_NEIGHBORS).fit(X_refit).negative_outlier_factor_
+    np.testing.assert_allclose(updated["lof_score"], refit, rtol=1e-6)
+    assert (updated["is_anomaly"] == (refit > a4.LOF_AUTO_THRESHOLD)).all()
+
+    # Tekrar eden oyuncu anahtarı sessizce son satıra eşlenmez, reddedilir
+    with pytest.raises(ValueError, match="tekrar eden"):
+        a4.update_scored_rows(df_scored, pd.concat([changed_rows, changed_rows]), lof_state, model)
+    duplicated = df_scored.copy()
+    duplicated.loc[1, "Player"] = duplicated.loc[0, "Player"]
+    with pytest.raises(ValueError, match="tekrar eden"):
+        a4.update_scored_rows(duplicated, changed_rows, lof_state, model)
+
+    print("✓ Incremental LOF matches a full refit")
+
+# ------------------------------
+# Test 23: Position-Stratified LOF
+# ------------------------------
+def test_stratified_lof(tmp_path):
+    """Her pozisyon grubu kendi LOF modeliyle skorlanmalı, satır sırası korunmalı"""
+    pytest.importorskip("mlflow")
+    import a3_feature_engineering as a3
+    import a4_model_training as a4
+    from sklearn.neighbors import LocalOutlierFactor
+
+    positions = pd.Series(["PG", "SG", "PG-SG", "C", "SF", "PF"] * 5 + ["C"] * 30)
+    # Guard (15) ve Forward (10) MIN_GROUP_SIZE altında → "Other" grubunda birleşir
+    assert a4.position_groups(positions, by="family").value_counts().to_dict() == \
+        {"Center": 35, a4.OTHER_GROUP: 25}
+    families = a4.position_groups(pd.Series(["PG"] * 25 + ["C"] * 25 + ["SF"] * 3), by="family")
+    assert set(families) == {"Guard", "Center"}  # 3 kişilik grup tek başına modellenmez
+
+    df = a3.filter_season(make_clean_data(n_per_season=200, seasons=(2025,)), year=2025)
+    pca_df, loadings, explained, scaler, pca = a3.fit_pca(df)
+    df_scored, models, top_cols = a4.fit_lof_stratified(pca_df, explained, by="family", workers=2)
+
+    assert df_scored["Player"].tolist() == pca_df["Player"].tolist()
+    assert set(models) == set(df_scored["lof_group"])
+    for group, (_, scaler, state) in models.items():
+        rows = df_scored["lof_group"] == group
+        X = scaler.transform(pca_df.loc[rows, top_cols])
+        expected = -LocalOutlierFactor(n_neighbors=a4.N_NEIGHBORS).fit(X).negative_outlier_factor_
+        np.testing.assert_allclose(df_scored.loc[rows, "lof_score"], expected, rtol=1e-6)
+        # Grup durumu fit_lof'un grafiğinden kurulur (ayrı k-NN araması yok)
+        assert len(state.X_) == rows.sum()
+        np.testing.assert_allclose(state.lof_, df_scored.loc[rows, "lof_score"], rtol=1e-9)
+
+    transform_path = a3.save_feature_transform(scaler, pca, loadings.index, str(tmp_path / "ft.joblib"))
+    paths = a4.save_stratified_models(models, top_cols, str(tmp_path / "stratified"), transform_path)
+    assert len(paths) == len(models)
+    group = df_scored["lof_group"].iloc[0]
+    reloaded = a4.load_scoring_models(paths[sorted(models).index(group)])
+    assert reloaded.header["n_neighbors"] == a4.N_NEIGHBORS
+
+    # Yeniden kayıt önceki çalıştırmanın gruplarını bırakmaz; dönüşüm yoksa mevcut modellere dokunulmaz
+    kept = sorted(models)[0]
+    kept_paths = a4.save_stratified_models({kept: models[kept]}, top_cols, str(tmp_path / "stratified"),
+                                           transform_path)
+    assert os.listdir(tmp_path / "stratified") == [os.path.basename(kept_paths[0])]
+    with pytest.raises(FileNotFoundError):
+        a4.save_stratified_models(models, top_cols, str(tmp_path / "stratified"), str(tmp_path / "yok.joblib"))
+    assert os.listdir(tmp_path / "stratified") == [os.path.basename(kept_paths[0])]
+    assert not os.path.exists(tmp_path / "stratified.tmp")
+
+    # Pozisyon bazlı eğitim global modeli geçersiz kılar: --score bayat modelle çalışmaz
+    global_dir = paths[0]
+    state_path = str(tmp_path / "lof_state.npz")
+    a4.build_lof_state(df_scored, scaler, top_cols).save(state_path)
+    assert a4.invalidate_global_models(state_path, global_dir) == [state_path, global_dir]
+    assert not os.path.exists(state_path) and not os.path.exists(global_dir)
+    with pytest.raises(FileNotFoundError):
+        a4.load_scoring_models(global_dir)
+
+    print("✓ Stratified LOF fits one model per position group")
+
+# ------------------------------
+# Test 24: Neighbor Backends
+# ------------------------------
+def test_neighbor_backends():
+    """Kesin arka uçlar aynı grafiği, yaklaşık arka uç yüksek recall'lı grafiği vermeli"""
+    pytest.importorskip("mlflow")
+    import a3_feature_engineering as a3
+    import a4_model_training as a4
+    from neighbors import approximate_kneighbors, exact_kneighbors, recall_at_k
+    from sklearn.neighbors import LocalOutlierFactor
+
+    X = np.random.default_rng(4).normal(size=(3000, 6))
+    exact_dist, exact_ind = exact_kneighbors(X, 15)
+    approx_dist, approx_ind = approximate_kneighbors(X, 15)
+    assert approx_ind.shape == exact_ind.shape
+    assert not (approx_ind == np.arange(len(X))[:, None]).any()  # kendisi komşu değil
+    assert (np.diff(approx_dist, axis=1) >= 0).all()
+    assert (approx_dist >= exact_dist - 1e-12).all()  # yaklaşık komşu hiçbir zaman daha yakın olamaz
+    assert recall_at_k(approx_ind, exact_ind) > 0.9
+    assert recall_at_k(exact_ind, exact_ind) == 1.0
+
+    bench = a4.benchmark_neighbor_backends(X[:800], k=10, backends=["kd_tree", "ball_tree", "approx"])
+    assert set(bench["backend"]) == {"kd_tree", "ball_tree", "approx"}
+    exact_rows = bench[bench["backend"] != "approx"]
+    assert (exact_rows["recall_at_k"] == 1.0).all()
+    assert (exact_rows["max_abs_lof_error"] < 1e-9).all()
+
+    df = a3.filter_season(make_clean_data(n_per_season=150, seasons=(2025,)), year=2025)
+    pca_df, _, explained, _, _ = a3.fit_pca(df)
+    exact_scored, _, exact_scaler, top_cols = a4.fit_lof(pca_df, explained, backend="kd_tree")
+    reference = LocalOutlierFactor(n_neighbors=a4.N_NEIGHBORS).fit(exact_scaler.transform(pca_df[top_cols]))
+    np.testing.assert_allclose(exact_scored["lof_score"], -reference.negative_outlier_factor_, rtol=1e-9)
+    approx_scored, lof, _, _ = a4.fit_lof(pca_df, explained, backend="approx")
+    assert lof is None
+    assert np.corrcoef(exact_scored["lof_score"], approx_scored["lof_score"])[0, 1] > 0.95
+
+    # Artımlı durum seçilen arka ucun grafiğinden kurulur → kaydedilen skorlarla aynı
+    for backend, scored in (("kd_tree", exact_scored), ("approx", approx_scored)):
+        *_, state = a4.fit_lof(pca_df, explained, backend=backend, return_state=True)
+        np.testing.assert_allclose(state.lof_, scored["lof_score"], rtol=1e-9)
+
+    print("✓ Exact and approximate neighbor backends agree")
+
+# ------------------------------
+# Test 25: Compact Memory-Mapped Model
+# ------------------------------
+def test_compact_model_roundtrip(tmp_path):
+    """Kompakt model .npy + JSON olarak kaydedilip mmap ile açılmalı, skorlar değişmemeli"""
+    pytest.importorskip("mlflow")
+    import json
+    import a3_feature_engineering as a3
+    import a4_model_training as a4
+    from compact_model import CompactLOFModel, HEADER_FILE
+
+    df = a3.filter_season(make_clean_data(n_per_season=120, seasons=(2025,)), year=2025)
+    pca_df, loadings, explained, scaler, pca = a3.fit_pca(df)
+    transform_path = a3.save_feature_transform(scaler, pca, loadings.index, str(tmp_path / "ft.joblib"))
+    df_scored, _, lof_scaler, top_cols = a4.fit_lof(pca_df, explained)
+    state = a4.build_lof_state(df_scored, lof_scaler, top_cols)
+    model = a4.build_compact_model(state, lof_scaler, top_cols, transform_path)
+
+    model_dir = model.save(str(tmp_path / "lof_compact"))
+    with open(os.path.join(model_dir, HEADER_FILE), encoding="utf-8") as f:
+        header = json.load(f)
+    assert header["pca_columns"] == top_cols
+    assert header["arrays"]["reference"]["shape"] == [len(df_scored), len(top_cols)]
+    assert not any(name.endswith((".joblib", ".pkl")) for name in os.listdir(model_dir))
+
+    loaded = CompactLOFModel.load(model_dir)
+    assert isinstance(loaded.arrays["reference"], np.memmap)
+    assert a4.load_scoring_models(model_dir) is a4.load_scoring_models(model_dir)  # süreç içi önbellek
+
+    new_rows = df.sample(10, random_state=0)
+    pd.testing.assert_frame_equal(loaded.score_frame(new_rows), model.score_frame(new_rows))
+
+    print("✓ Compact model loads via mmap and scores identically")
+
+# ------------------------------
+# Test 26: Vectorized Ranking Engine
+# ------------------------------
+def test_vectorized_ranking(tmp_path):
+    """Vektörel sıralama, eski satır bazlı kurallarla aynı sonucu vermeli; kurallar ayardan gelmeli"""
+    pytest.importorskip("mlflow")
+    import json
+    import a5_model_evaluation as a5
+
+    rng = np.random.default_rng(5)
+    columns = [f"PCA{i+1}" for i in range(9)]
+    df_scored = pd.DataFrame(rng.normal(size=(500, 9)), columns=columns)
+    df_scored.insert(0, "Player", [f"P{i}" for i in range(500)])
+    df_scored["is_anomaly"] = (rng.random(500) < 0.1).astype(int)
+    df_variance = pd.DataFrame({"explained_variance_ratio": np.linspace(0.3, 0.02, 9)}, index=columns)
+
+    ranked, summary = a5.rank_players(df_scored, df_variance)
+
+    # Eski satır bazlı referans
+    top = df_variance.nlargest(7, "explained_variance_ratio")
+    w = top["explained_variance_ratio"].values / top["explained_variance_ratio"].sum()
+    base = sum(df_scored[c] * wi for c, wi in zip(top.index, w))
+    median = df_scored["PCA1"].median()
+    adj = df_scored.apply(lambda r: 1.08 if (r["is_anomaly"] == 1 and r["PCA1"] > median)
+                          else 0.92 if r["is_anomaly"] == 1 else 1.0, axis=1)
+    expected = (base * adj).sort_values(ascending=False).to_numpy()
+    np.testing.assert_allclose(ranked["final_score"].to_numpy(), expected)
+    assert ranked["rank"].tolist() == list(range(1, 501))
+    assert len(summary["elite_anomalies"]) == ((df_scored["is_anomaly"] == 1) & (df_scored["PCA1"] > median)).sum()
+    assert (ranked.loc[ranked["category"] == "elite", "lof_adjustment"] == 1.08).all()
+
+    # Kurallar JSON ayarından
+    config_path = tmp_path / "ranking.json"
+    config_path.write_text(json.dumps({"weights": {"PCA1": 1.0}, "elite_bonus": 2.0, "weak_penalty": 0.5}))
+    config = a5.load_ranking_config(str(config_path))
+    ranked, _ = a5.rank_players(df_scored, df_variance, config)
+    row = ranked.iloc[0]
+    assert row["base_score"] == pytest.approx(df_scored.set_index("Player").loc[row["Player"], "PCA1"])
+    assert set(ranked["lof_adjustment"]) <= {1.0, 2.0, 0.5}
+    config_path.write_text(json.dumps({"elite_bonuss": 2.0}))
+    with pytest.raises(ValueError):
+        a5.load_ranking_config(str(config_path))
+
+    assert a5.benchmark_ranking(n_rows=10_000)["rows"] == 10_000
+
+    print("✓ Vectorized ranking matches the row-wise rules")
+
+# ------------------------------
+# Test 27: Out-of-Core Ranking
+# ------------------------------
+def test_streaming_ranking(tmp_path):
+    """Parça parça sıralama, bellek içi sıralama ile aynı dosyaları üretmeli"""
+    pytest.importorskip("mlflow")
+    import a5_model_evaluation as a5
+    import streaming_rankings as sr
+
+    # Birleştirilebilir taslak: iki yarının birleşimi tüm verinin medyanına yakın
+    values = np.random.default_rng(6).normal(size=200_000)
+    left = sr.QuantileSketch(k=200, seed=1).update(values[:100_000])
+    right = sr.QuantileSketch(k=200, seed=2).update(values[100_000:])
+    merged = left.merge(right)
+    assert merged.n == len(values)
+    assert abs((values < merged.quantile(0.5)).mean() - 0.5) < 0.02
+
+    rng = np.random.default_rng(7)
+    n = 5_001
+    columns = [f"PCA{i+1}" for i in range(8)]
+    df_scored = pd.DataFrame(rng.normal(size=(n, 8)), columns=columns)
+    df_scored.insert(0, "Player", [f"P{i}" for i in range(n)])
+    df_scored.insert(1, "Pos", rng.choice(["PG", "C"], n))
+    df_scored["lof_score"] = rng.gamma(5, 0.2, n)
+    df_scored["is_anomaly"] = (df_scored["lof_score"] > 1.5).astype(int)
+    input_csv, variance_csv = tmp_path / "scored.csv", tmp_path / "variance.csv"
+    df_scored.to_csv(input_csv, index=False)
+    df_variance = pd.DataFrame({"explained_variance_ratio": np.linspace(0.3, 0.05, 8)}, index=columns)
+    df_variance.to_csv(variance_csv)
+
+    outputs = {name: str(tmp_path / f"{name}.csv") for name in ["ranked", "top", "middle", "bottom", "elite"]}
+    summary = sr.rank_streaming(
+        str(input_csv), str(variance_csv), outputs["ranked"], chunksize=700,
+        top_csv=outputs["top"], middle_csv=outputs["middle"], bottom_csv=outputs["bottom"],
+        elite_csv=outputs["elite"],
+    )
+    expected, expected_summary = a5.rank_players(pd.read_csv(input_csv), df_variance)
+
+    assert summary["threshold_exact"]
+    assert summary["pca1_median"] == expected_summary["pca1_median"]
+    assert summary["counts"]["elite"] == len(expected_summary["elite_anomalies"])
+
+    ranked = pd.read_csv(outputs["ranked"])
+    assert ranked["rank"].tolist() == list(range(1, n + 1))
+    np.testing.assert_allclose(ranked["final_score"], expected["final_score"])
+    assert ranked["Player"].tolist() == expected["Player"].tolist()
+
+    middle_start = n // 2 - 5
+    for name, slice_ in [("top", expected.head(10)), ("bottom", expected.tail(10)),
+                         ("middle", expected.iloc[middle_start:middle_start + 10])]:
+        got = pd.read_csv(outputs[name])
+        assert got["Player"].tolist() == slice_["Player"].tolist()
+        assert got["rank"].tolist() == slice_["rank"].tolist()
+    elite = pd.read_csv(outputs["elite"])
+    assert "category" not in elite.columns
+    assert elite["Player"].tolist() == \
+        expected_summary["elite_anomalies"].sort_values("final_score", ascending=False)["Player"].tolist()
+
+    print("✓ Out-of-core ranking matches the in-memory ranking")
+
+# ------------------------------
+# Test 28: Player Index Lookup
+# ------------------------------
+def test_player_index(capsys):
+    """Normalize ad ile tam/önek/bulanık arama ve a5 oyuncu detayları"""
+    from player_index import PlayerIndex, normalize_name
+
+    assert normalize_name("Luka Dončić") == "luka doncic"
+    assert normalize_name("Jaren Jackson Jr.") == "jaren jackson"
+    assert normalize_name("Gary Trent III") == "gary trent"
+    assert normalize_name(None) == ""
+
+    names = ["Luka Dončić", "Jaren Jackson Jr.", "Nikola Jokić", "Jalen Williams", "Jalen Williams",
+             "Gary Trent Jr."]
+    index = PlayerIndex(names)
+    assert index.lookup("luka doncic") == [0]
+    assert index.lookup("JAREN JACKSON") == [1]
+    assert index.lookup("Jalen Williams") == [3, 4]          # aynı adlı iki oyuncu
+    assert index.first("jalen williams") == 3
+    assert index.first("LeBron James") is None
+    assert index.prefix("jok") == [2]                        # soyad öneki
+    assert index.prefix("ja") == [1, 3, 4]
+    assert index.fuzzy("Nikola Jokc") == [2]                  # yazım hatası
+    assert index.search("Doncic") == [0]
+    assert index.search("Gary Trent") == [5]
+    assert index.search("zzzz") == []
+
+    import a5_model_evaluation as a5
+    df_ranked = pd.DataFrame({
+        "rank": range(1, len(names) + 1), "Player": names, "Pos": "PG",
+        "final_score": np.linspace(2, 1, len(names)), "base_score": 1.0,
+        "lof_adjustment": 1.0, "lof_score": 1.0, "is_anomaly": 0,
+    })
+    assert a5.find_player(df_ranked, "jokic")["rank"] == 3
+    assert a5.find_player(df_ranked, "nobody") is None
+    a5.compare_players(df_ranked, "doncic", "Jaren Jackson", index=index)
+    assert "Luka Dončić VS Jaren Jackson Jr." in capsys.readouterr().out
+
+    print("✓ Player index lookup works")
+
+# ------------------------------
+# Test 29: Bootstrap Rank Stability
+# ------------------------------
+def test_rank_stability():
+    """Bootstrap sıralamaları permütasyon olmalı, işçi sayısından bağımsız ve nokta sıralamasıyla uyumlu olmalı"""
+    pytest.importorskip("mlflow")
+    import rank_stability as rs
+
+    rng = np.random.default_rng(8)
+    n = 80
+    latent = rng.normal(size=(n, 3)) * [5, 2, 1]
+    X = latent @ rng.normal(size=(3, 12)) + 0.3 * rng.normal(size=(n, 12))
+    df_filtered = pd.DataFrame(X, columns=[f"F{i}" for i in range(12)])
+    df_filtered.insert(0, "Player", [f"P{i}" for i in range(n)])
+    df_filtered.insert(1, "Pos", rng.choice(["PG", "C"], n))
+
+    # Akış modu (a3 --stream) çıktısındaki Year özellik sayılmamalı
+    with_year = df_filtered.assign(Year=2024)
+    assert rs.feature_columns(with_year) == [f"F{i}" for i in range(12)]
+    np.testing.assert_array_equal(rs.feature_matrix(with_year), rs.feature_matrix(df_filtered))
+
+    ranks = rs.bootstrap_ranks(rs.feature_matrix(df_filtered), n_bootstrap=12, workers=1, batch_size=5)
+    assert ranks.shape == (12, n)
+    assert (np.sort(ranks, axis=1) == np.arange(1, n + 1)).all()
+    parallel = rs.bootstrap_ranks(rs.feature_matrix(df_filtered), n_bootstrap=12, workers=2, batch_size=5)
+    np.testing.assert_array_equal(ranks, parallel)
+
+    df_stability = rs.rank_stability(df_filtered, n_bootstrap=30, workers=1)
+    assert df_stability["rank"].tolist() == list(range(1, n + 1))
+    assert (df_stability["rank_low"] <= df_stability["rank_median"]).all()
+    assert (df_stability["rank_median"] <= df_stability["rank_high"]).all()
+    # Güçlü faktör yapısında bootstrap medyanı nokta sıralamasını izler
+    assert np.corrcoef(df_stability["rank"], df_stability["rank_median"])[0, 1] > 0.95
+
+    print("✓ Bootstrap rank stability works")
+
+# ------------------------------
+# Test 30: Batched Background MLflow Tracking
+# ------------------------------
+def test_run_tracker(tmp_path, monkeypatch):
+    """Parametre/metrikler log_batch limitlerine bölünmeli, artifact'lar arka planda yüklenmeli"""
+    pytest.importorskip("mlflow")
+    from mlflow.tracking import MlflowClient
+    import run_tracker
+
+    batches = run_tracker._split_batches(list(range(150)), list(range(1500)))
+    assert [(len(p), len(m)) for p, m in batches] == [(100, 900), (50, 600)]
+
+    monkeypatch.setenv("MLFLOW_TRACKING_URI", f"file:{tmp_path / 'mlruns'}")
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+
+    # No-op modu: hiçbir şey yazılmaz
+    with run_tracker.start_run("test_tracker", enabled=False) as run:
+        run.log_param("a", 1)
+        run.log_metric("m", 1.0)
+        run.log_artifact(__file__)
+    assert run.run_id is None and not (tmp_path / "mlruns").exists()
+
+    artifact = tmp_path / "result.csv"
+    artifact.write_text("x\n1\n")
+    with run_tracker.start_run("test_tracker", run_name="batched", store=False) as run:
+        run.log_params({f"p{i}": i for i in range(150)})
+        run.log_metrics({f"m{i}": i / 10 for i in range(1050)})   # 1000'de otomatik gönderim
+        run.flush()
+        run.log_param("p42", 42)        # aynı değer: sorun yok
+        run.log_param("p42", "başka")   # farklı değer kuyruğa girmez (MLflow reddederdi)
+        run.log_artifact(str(artifact))
+    # with çıkışı kuyruğun bitmesini bekler (havuz işçilerinde atexit çalışmaz)
+    assert not run._worker.is_alive() and run not in run_tracker._OPEN_RUNS
+
+    client = MlflowClient()
+    data = client.get_run(run.run_id)
+    assert data.info.status == "FINISHED"
+    assert len(data.data.params) == 150 and data.data.params["p42"] == "42"
+    assert len(data.data.metrics) == 1050 and data.data.metrics["m7"] == 0.7
+    assert [a.path for a in client.list_artifacts(run.run_id)] == ["result.csv"]
+    assert not run.errors and run not in run_tracker._OPEN_RUNS
+
+    # İsteğe bağlı bekleme: with çıkışı hemen döner, close() bekler
+    with run_tracker.start_run("test_tracker", store=False, wait_on_exit=False) as detached:
+        detached.log_param("a", 1)
+    detached.close()
+    assert client.get_run(detached.run_id).data.params == {"a": "1"}
+
+    print("✓ Batched background tracking works")
+
+# ------------------------------
+# Test 31: Content-Addressed Artifact Store
+# ------------------------------
+def test_artifact_store(tmp_path, monkeypatch):
+    """Aynı artifact'lar bir kez saklanmalı, geri yüklenebilmeli; gc sadece sahipsiz nesneleri silmeli"""
+    pytest.importorskip("mlflow")
+    from mlflow.tracking import MlflowClient
+    import artifact_store
+    import run_tracker
+
+    monkeypatch.setenv("MLFLOW_TRACKING_URI", f"file:{tmp_path / 'mlruns'}")
+    monkeypatch.setenv("MLFLOW_ALLOW_FILE_STORE", "true")
+    store = artifact_store.ArtifactStore(str(tmp_path / "store"))
+
+    csv_path = tmp_path / "player_ranked.csv"
+    pd.DataFrame({"rank": range(1, 501), "Player": [f"P{i}" for i in range(500)]}).to_csv(csv_path, index=False)
+    model_dir = tmp_path / "lof_compact"
+    model_dir.mkdir()
+    np.save(model_dir / "lrd.npy", np.arange(100.0))
+    (model_dir / "header.json").write_text('{"format_version": 1}')
+
+    run_ids = []
+    for _ in range(2):
+        run = run_tracker.start_run("test_store", store=store)
+        run.log_artifact(str(csv_path))
+        run.log_artifacts(str(model_dir), artifact_path="models/lof_compact")
+        run.close()
+        run_ids.append(run.run_id)
+
+    # 3 dosya + 2 manifest (ilk yüklemedeki ara + son); ikinci run hiçbir şey yazmamalı
+    objects = dict(store.objects())
+    assert len(objects) == 5
+    assert sum(path.endswith(".gz") for path in objects.values()) == 1
+    client = MlflowClient()
+    assert client.list_artifacts(run_ids[0]) == []
+    tags = [client.get_run(run_id).data.tags[artifact_store.MANIFEST_TAG] for run_id in run_ids]
+    assert tags[0] == tags[1]
+
+    restored = artifact_store.restore_run(client, run_ids[1], str(tmp_path / "restored"), store)
+    assert restored == ["models/lof_compact/header.json", "models/lof_compact/lrd.npy", "player_ranked.csv"]
+    assert (tmp_path / "restored" / "player_ranked.csv").read_bytes() == csv_path.read_bytes()
+    np.testing.assert_array_equal(np.load(tmp_path / "restored" / "models" / "lof_compact" / "lrd.npy"),
+                                  np.arange(100.0))
+
+    # Etiket yükleme anında yazılır: kapanmadan çöken run'ın nesneleri de erişilebilir kalır
+    crashed = run_tracker.start_run("test_store", store=store)
+    crashed.log_artifact(str(csv_path))
+    deadline = time.time() + 10
+    while artifact_store.MANIFEST_TAG not in client.get_run(crashed.run_id).data.tags:
+        assert time.time() < deadline
+        time.sleep(0.05)
+    assert artifact_store.file_digest(csv_path) in artifact_store.reachable_digests(client, store)
+    crashed.close(status="FAILED")
+
+    # Eski tarz run (artifacts/ kopyası) → migrate ile depoya yazılır; orijinaller sadece istenirse silinir
+    legacy_ids = []
+    for _ in range(2):
+        with run_tracker.start_run("test_store", store=False) as legacy:
+            legacy.log_artifact(str(csv_path))
+        legacy.close()
+        legacy_ids.append(legacy.run_id)
+        if len(legacy_ids) == 1:
+            assert artifact_store.migrate_runs(client, store, str(tmp_path / "mlruns")) == 1
+            assert [f.path for f in client.list_artifacts(legacy.run_id)] == ["player_ranked.csv"]
+    assert artifact_store.migrate_runs(client, store, str(tmp_path / "mlruns"), delete_originals=True) == 1
+    assert client.list_artifacts(legacy_ids[1]) == []
+    for run_id in legacy_ids:
+        assert artifact_store.run_manifest(client, run_id, store)["player_ranked.csv"]["sha256"] == \
+            artifact_store.file_digest(csv_path)
+
+    orphan = tmp_path / "orphan.txt"
+    orphan.write_text("kimse kullanmıyor")
+    orphan_digest = store.put(str(orphan))["sha256"]
+    assert artifact_store.collect_garbage(client, store)[0] == 0           # bekleme süresi içinde
+    removed, _ = artifact_store.collect_garbage(client, store, grace_seconds=0)
+    assert removed == 1 and store.find(orphan_digest) is None  # ara manifest çöken run'ın manifest'i
+    assert store.find(artifact_store.file_digest(csv_path)) is not None
+
+    print("✓ Content-addressed artifact store works")
+
+# ------------------------------
+# Test 32: LLM Response Cache
+# ------------------------------
+class FakeGeminiClient:
+    """generate_content çağrılarını sayan yerel sahte istemci (ağ yok)"""
+
+    def __init__(self, reply="Analiz"):
+        self.calls = []
+        self.reply = reply
+        self.models = self
+
+    def generate_content(self, model, contents):
+        self.calls.append((model, contents))
+        return types.SimpleNamespace(text=f"{self.reply} #{len(self.calls)}")
+
+
+def test_llm_cache(tmp_path, monkeypatch):
+    """Aynı model + prompt + veri sürümü API'ye ikinci kez gitmemeli; TTL ve boyut sınırı uygulanmalı"""
+    import llm_cache
+
+    cache = llm_cache.LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    client = FakeGeminiClient()
+    prompt = "Oyuncu 1: A\n  Rank: 1\nOyuncu 2: B"
+
+    assert llm_cache.cached_generate(client, "gemini", prompt, cache, "v1") == ("Analiz #1", False)
+    assert llm_cache.cached_generate(client, "gemini", "  Oyuncu 1: A Rank: 1\n\nOyuncu 2: B ", cache, "v1") \
+        == ("Analiz #1", True)                                   # normalize prompt aynı
+    assert llm_cache.cached_generate(client, "gemini", prompt, cache, "v2")[1] is False   # yeni veri
+    assert llm_cache.cached_generate(client, "gemini-pro", prompt, cache, "v1")[1] is False
+    assert len(client.calls) == 3
+
+    # Kalıcılık: yeni bağlantı aynı dosyadan okur
+    reopened = llm_cache.LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    assert llm_cache.cached_generate(client, "gemini", prompt, reopened, "v1") == ("Analiz #1", True)
+
+    # Veri sürümü dosya içeriğine bağlı
+    ranked = tmp_path / "player_ranked.csv"
+    ranked.write_text("rank,Player\n1,A\n")
+    version = llm_cache.data_version(str(ranked))
+    ranked.write_text("rank,Player\n1,BB\n")
+    assert llm_cache.data_version(str(ranked)) != version
+
+    # TTL
+    clock = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: clock[0])
+    ttl_cache = llm_cache.LLMResponseCache(str(tmp_path / "ttl.sqlite"), ttl_seconds=60)
+    ttl_cache.put("k", "eski")
+    clock[0] += 61
+    assert ttl_cache.get("k") is None and ttl_cache.stats()["entries"] == 0
+
+    # LRU + boyut sınırı: en uzun süredir okunmayan silinir
+    small = llm_cache.LLMResponseCache(str(tmp_path / "lru.sqlite"), max_bytes=30)
+    for key in ["a", "b", "c"]:
+        clock[0] += 1
+        small.put(key, "x" * 10)
+    clock[0] += 1
+    assert small.get("a") == "x" * 10                           # a yeniden kullanıldı
+    clock[0] += 1
+    small.put("d", "y" * 10)
+    assert small.get("b") is None
+    assert [small.get(k) is not None for k in ["a", "c", "d"]] == [True, True, True]
+    assert small.stats() == {"entries": 3, "bytes": 30}
+
+    print("✓ LLM response cache works")
+
+# ------------------------------
+# Test 33: Streaming LLM Output
+# ------------------------------
+class FakeStreamingClient(FakeGeminiClient):
+    """Parçaları tek tek üreten sahte akış istemcisi"""
+
+    def __init__(self, chunks, fail_stream=False):
+        super().__init__()
+        self.chunks = chunks
+        self.fail_stream = fail_stream
+        self.produced = 0
+
+    def generate_content_stream(self, model, contents):
+        if self.fail_stream:
+            raise NotImplementedError("akış yok")
+        for chunk in self.chunks:
+            self.produced += 1
+            yield types.SimpleNamespace(text=chunk)
+
+
+def test_llm_streaming(tmp_path):
+    """Parçalar geldikçe dönmeli, TTFT ölçülmeli, tamamlanan yanıt aynı önbelleğe girmeli"""
+    import llm_cache
+
+    cache = llm_cache.LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    client = FakeStreamingClient(["Genel ", "", "Değerlendirme", " bitti"])
+
+    stats = llm_cache.GenerationStats()
+    stream = llm_cache.stream_generate(client, "gemini", "prompt", cache, "v1", stats)
+    assert next(stream) == "Genel " and client.produced == 1     # ilk parça beklemeden gelir
+    assert stats.ttft_seconds is not None and stats.streamed
+    assert list(stream) == ["Değerlendirme", " bitti"]
+    assert stats.total_seconds >= stats.ttft_seconds and stats.chars == len("Genel Değerlendirme bitti")
+
+    # Aynı önbellek: tek parça, API çağrısı yok
+    produced = client.produced
+    assert llm_cache.cached_generate(client, "gemini", "prompt", cache, "v1") == \
+        ("Genel Değerlendirme bitti", True)
+    assert client.produced == produced and not client.calls
+
+    # Yarıda bırakılan akış önbelleğe girmez
+    partial = llm_cache.stream_generate(client, "gemini", "başka prompt", cache, "v1")
+    next(partial)
+    partial.close()
+    assert cache.get(llm_cache.cache_key("gemini", "başka prompt", "v1")) is None
+
+    # Akış desteklenmiyorsa generate_content'e düşülür
+    fallback = FakeStreamingClient([], fail_stream=True)
+    stats = llm_cache.GenerationStats()
+    assert list(llm_cache.stream_generate(fallback, "gemini", "p2", cache, "v1", stats)) == ["Analiz #1"]
+    assert not stats.streamed and len(fallback.calls) == 1
+    assert cache.get(llm_cache.cache_key("gemini", "p2", "v1")) == "Analiz #1"
+
+    assert cache.generation_summary()["count"] == 2
+    assert cache.generation_summary(cached=True)["count"] == 1
+    # Özet sadece son `window` üretimi okur
+    latest = llm_cache.GenerationStats()
+    latest.ttft_seconds, latest.total_seconds = 9.0, 9.5
+    cache.record_generation(latest, "gemini")
+    recent = cache.generation_summary(window=1)
+    assert recent["count"] == 1 and recent["ttft_p50"] == 9.0
+
+    print("✓ Streaming LLM output works")
+
+# ------------------------------
+# Test 34: Offline LLM Batch Generation
+# ------------------------------
+def serve_stub_gemini(fail_status=None):
+    """Yerel sahte Gemini REST sunucusu: ilk istek 429, eşzamanlı istek sayısını ölçer.
+
+    fail_status verilirse her istek bu kodla reddedilir (ör. 401 geçersiz anahtar).
+    """
+    import json
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {"requests": 0, "active": 0, "max_active": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with lock:
+                state["requests"] += 1
+                first = state["requests"] == 1
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+            time.sleep(0.02)
+            with lock:
+                state["active"] -= 1
+            if fail_status:
+                self.send_response(fail_status)
+                self.end_headers()
+                return
+            if first:
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+            prompt = body["contents"][0]["parts"][0]["text"]
+            reply = {"candidates": [{"content": {"parts": [{"text": f"Analiz ({len(prompt)})"}]}}]}
+            data = json.dumps(reply).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def test_llm_batch(tmp_path):
+    """Toplu üretim eşzamanlılık sınırına uymalı, 429'da tekrar denemeli, ikinci çalıştırmada her şeyi atlamalı"""
+    import asyncio
+    import json
+    import llm_cache
+    import llm_reports
+
+    df_ranked = pd.DataFrame({
+        'Player': [f"Oyuncu {i}" for i in range(6)],
+        'Pos': ['PG', 'SG', 'PG', 'C', 'C', 'SG'],
+        'rank': [3, 1, 2, 6, 5, 4],
+        'final_score': [0.7, 0.9, 0.8, 0.1, 0.2, 0.5],
+        'base_score': [0.6, 0.8, 0.7, 0.1, 0.2, 0.4],
+        'lof_score': [1.0, 1.1, 1.0, 1.6, 1.2, 1.0],
+        'is_anomaly': [0, 0, 0, 1, 0, 0],
+    })
+    jobs = llm_reports.batch_prompts(df_ranked, top_n=4)
+    assert len(jobs) == 6 + len(df_ranked)                      # C(4, 2) ikili + oyuncu ↔ medyan
+    assert jobs[0][0] == "Oyuncu 1 vs Oyuncu 2"                  # iyi sıradaki oyuncu "Oyuncu 1"
+    assert "PG pozisyon medyanı" in {label.split(" vs ")[1] for label, _ in jobs}
+    # Pozisyonu boş oyuncunun medyanı yok (a6 uyarı verir, toplu iş atlar)
+    no_pos = df_ranked.assign(Pos=df_ranked['Pos'].where(df_ranked.index != 0))
+    assert np.nan not in llm_reports.positional_medians(no_pos)
+    assert len(llm_reports.batch_prompts(no_pos, top_n=4)) == len(jobs) - 1
+
+    # Retry-After: saniye veya HTTP tarihi; okunamazsa üstel bekleme
+    assert llm_reports.parse_retry_after("7") == 7.0
+    assert llm_reports.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412470) == 10.0
+    assert llm_reports.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412490) == 0.0
+    assert llm_reports.parse_retry_after("yakında") is None and llm_reports.parse_retry_after(None) is None
+
+    server, state = serve_stub_gemini()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1beta"
+        client = llm_reports.GeminiRestClient(None, base_url)
+        cache = llm_cache.LLMResponseCache(str(tmp_path / "llm.sqlite"))
+        progress_path = str(tmp_path / "progress.json")
+
+        progress = asyncio.run(llm_reports.run_batch(jobs, client, cache, "gemini", "v1", 2, progress_path))
+        assert progress["done"] == len(jobs) and progress["failed"] == 0
+        assert state["requests"] == len(jobs) + 1                # 429 sonrası tek tekrar
+        assert state["max_active"] <= 2
+        assert json.load(open(progress_path))["done"] == len(jobs)
+
+        # a6 aynı prompt'u kurar → arayüzde önbellek isabeti
+        p1, p2 = df_ranked.iloc[1], df_ranked.iloc[2]
+        prompt = llm_reports.build_comparison_prompt(p1['Player'], p1, p2['Player'], p2)
+        assert cache.get(llm_cache.cache_key("gemini", prompt, "v1")) == f"Analiz ({len(prompt)})"
+        # Ters seçim sırası da aynı prompt'a düşer
+        assert llm_reports.build_comparison_prompt(
+            *llm_reports.comparison_order(p2['Player'], p2, p1['Player'], p1)) == prompt
+
+        # Kaldığı yerden devam: hepsi önbellekte → istek yok
+        progress = asyncio.run(llm_reports.run_batch(jobs, client, cache, "gemini", "v1", 2, progress_path))
+        assert progress["skipped"] == len(jobs) and state["requests"] == len(jobs) + 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Tekrar denenemeyen hata (401) beklemeden yükselir: tek istek
+    import urllib.error
+    server, state = serve_stub_gemini(fail_status=401)
+    try:
+        client = llm_reports.GeminiRestClient("gecersiz-anahtar", f"http://127.0.0.1:{server.server_address[1]}/v1beta")
+        with pytest.raises(urllib.error.HTTPError):
+            asyncio.run(llm_reports.generate_with_backoff(client, "gemini", "prompt"))
+        assert state["requests"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print("✓ Offline LLM batch generation works")
+
+# ------------------------------
+# Test 35: LLM Single-Flight and Rate Limiting
+# ------------------------------
+class QuotaError(Exception):
+    """google-genai APIError gibi: code = 429"""
+    code = 429
+
+
+class GatedStreamingClient(FakeGeminiClient):
+    """Akış, `gate` açılana kadar ilk parçayı vermez; ilk `quota_errors` çağrı 429 döner"""
+
+    def __init__(self, quota_errors=0):
+        super().__init__()
+        import threading
+        self.gate = threading.Event()
+        self.quota_errors = quota_errors
+
+    def generate_content_stream(self, model, contents):
+        self.calls.append((model, contents))
+        if len(self.calls) <= self.quota_errors:
+            raise QuotaError("kota")
+        self.gate.wait(5)
+        yield types.SimpleNamespace(text="Ortak ")
+        yield types.SimpleNamespace(text="analiz")
+
+
+def test_llm_single_flight(tmp_path, monkeypatch):
+    """Eşzamanlı aynı prompt tek API çağrısı yapmalı; kova fazlasını sıraya almalı; 429 tekrar denenmeli"""
+    import threading
+    import time
+    import llm_cache
+
+    # Token kovası: 2 art arda, sonra saniyede 1 (sahte saat)
+    now = [0.0]
+    bucket = llm_cache.TokenBucket(rate_per_minute=60, burst=2, clock=lambda: now[0])
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]
+    now[0] = 10.0
+    assert bucket.reserve() == 0.0                      # kova doldu (en fazla burst)
+    with pytest.raises(llm_cache.RateLimitTimeout):
+        for _ in range(10):
+            bucket.reserve(max_wait=3)
+    assert llm_cache.TokenBucket(rate_per_minute=0).reserve() == 0.0
+
+    # Tek uçuş: 5 eşzamanlı istek → 1 API çağrısı, herkes aynı metni alır
+    cache = llm_cache.LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    client = GatedStreamingClient()
+    flights = llm_cache.SingleFlight()
+    unlimited = llm_cache.TokenBucket(rate_per_minute=0)
+    results = [None] * 5
+
+    def ask(i):
+        stream = llm_cache.stream_generate(client, "gemini", "popüler ikili", cache, "v1",
+                                           limiter=unlimited, flights=flights)
+        results[i] = "".join(stream)
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.3)
+    client.gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["Ortak analiz"] * 5
+    assert len(client.calls) == 1 and flights.in_flight() == 0
+    summary = cache.generation_summary()
+    assert summary["count"] + cache.generation_summary(cached=True)["count"] == 5
+    assert summary["coalesced"] == summary["count"] - 1
+
+    # Lider hata verirse bekleyen takipçiler de aynı hatayı alır, uçuş temizlenir
+    flight, leader = flights.join("k")
+    follower = flight.follow()
+    flights.release("k", flight, ValueError("boom"))
+    with pytest.raises(ValueError):
+        next(follower)
+    assert flights.in_flight() == 0
+
+    # Lider parça yayınlamadan takılırsa takipçi süre dolunca vazgeçer
+    flight, _ = flights.join("takılı")
+    with pytest.raises(llm_cache.FlightTimeout):
+        next(flight.follow(timeout=0.05))
+    flights.release("takılı", flight)
+
+    # Lider hatasız ama boş biterse (önbellekte yok) takipçi kendisi tekrar dener
+    flight, _ = flights.join(llm_cache.cache_key("gemini", "boş lider", "v1"))
+    empty_client = GatedStreamingClient()
+    empty_client.gate.set()
+    retried = []
+    thread = threading.Thread(target=lambda: retried.append("".join(llm_cache.stream_generate(
+        empty_client, "gemini", "boş lider", cache, "v1", limiter=unlimited, flights=flights))))
+    thread.start()
+    time.sleep(0.1)
+    flights.release(llm_cache.cache_key("gemini", "boş lider", "v1"), flight)
+    thread.join(5)
+    assert retried == ["Ortak analiz"] and len(empty_client.calls) == 1
+
+    # Kota hatası (429) geri çekilip tekrar denenir; bekleme sıra süresine eklenir
+    monkeypatch.setattr(llm_cache.random, "uniform", lambda low, high: 0.01)
+    retry_client = GatedStreamingClient(quota_errors=1)
+    retry_client.gate.set()
+    stats = llm_cache.GenerationStats()
+    text = "".join(llm_cache.stream_generate(retry_client, "gemini", "kota", cache, "v1", stats,
+                                             limiter=unlimited, flights=flights))
+    assert text == "Ortak analiz" and len(retry_client.calls) == 2
+    assert stats.queue_seconds >= 0.01 and not stats.coalesced
+
+    print("✓ LLM single-flight and rate limiting work")
+
+# ------------------------------
+# Test 36: Token-Budgeted Prompt Builder
+# ------------------------------
+def test_prompt_builder(tmp_path):
+    """PCA katkıları a3 skorlarıyla aynı olmalı; prompt token bütçesini aşmamalı, önce bağlam kısalmalı"""
+    import a3_feature_engineering as a3
+    import a5_model_evaluation as a5
+    import llm_cache
+    import llm_reports
+
+    rng = np.random.default_rng(12)
+    n = 40
+    df_filtered = pd.DataFrame(rng.gamma(2.0, 2.0, size=(n, len(STAT_COLS))), columns=STAT_COLS)
+    df_filtered.insert(0, "Player", [f"P{i}" for i in range(n)])
+    df_filtered.insert(1, "Pos", rng.choice(["PG", "C"], n))
+    pca_df, loadings, explained_df, _, _ = a3.fit_pca(df_filtered)
+
+    context = llm_reports.PlayerContext(df_filtered, loadings, explained_df)
+    np.testing.assert_allclose(context.scores[:n], pca_df[context.components].to_numpy(), atol=1e-8)
+    assert context.scores.shape[0] == n + 2                       # + PG / C medyanları
+
+    # Kayıtlı a3 dönüşümü (başka satırlarla fit edilmiş) + çok sezonlu tabloda sadece sıralanan sezon
+    _, _, _, scaler, pca = a3.fit_pca(df_filtered.iloc[: n // 2].reset_index(drop=True))
+    transform = {"scaler": scaler, "pca": pca, "feature_columns": STAT_COLS, "n_output": pca.n_components_}
+    seasons = pd.concat([df_filtered.assign(Year=2025), df_filtered.assign(Year=2024, Player="Eski")])
+    config = dict(a5.RANKING_CONFIG, weights={"PCA2": 1.0, "PCA1": 1.0})
+    projected = llm_reports.PlayerContext(seasons, loadings, explained_df, config, transform, season=2025)
+    assert projected.components == ["PCA2", "PCA1"] and projected.scores.shape[0] == n + 2
+    np.testing.assert_allclose(projected.scores[:n],
+                               a3.transform_features(df_filtered, transform)[["PCA2", "PCA1"]].to_numpy(),
+                               atol=1e-8)
+    assert projected.index.first("Eski") is None
+    # a5'in kaydettiği kurallar bağlamda aynen geri okunur
+    assert a5.load_ranking_config(a5.save_ranking_config(config, str(tmp_path / "ranking_config.json"))) == config
+
+    lines = context.describe("P3", n_components=2, n_stats=3)
+    assert len(lines) == 2 and lines[0].startswith("- PCA") and lines[0].count("(%") == 3
+    assert context.describe("PG pozisyon medyanı")
+    assert context.describe("Olmayan Oyuncu") == []
+
+    row = pd.Series({'rank': 1, 'final_score': 1.23456, 'base_score': 1.1, 'lof_score': 1.9, 'is_anomaly': 1, 'Pos': 'PG'})
+    plain = llm_reports.build_comparison_prompt("P3", row, "P4", row)
+    full = llm_reports.build_comparison_prompt("P3", row, "P4", row, context, token_budget=10_000)
+    assert "Final Score: 1.235" in plain and "katkı" not in plain
+    assert full.count("\n- PCA") == 2 * llm_reports.TOP_COMPONENTS
+    assert f"{llm_reports.MAX_RESPONSE_WORDS} kelime" in full
+
+    # Bütçe: önce istatistik / bileşen azaltılır, sığmazsa bağlam tamamen çıkar
+    budget = llm_reports.estimate_tokens(full) - 20
+    trimmed = llm_reports.build_comparison_prompt("P3", row, "P4", row, context, token_budget=budget)
+    assert llm_reports.estimate_tokens(trimmed) <= budget and "katkı" in trimmed
+    assert llm_reports.build_comparison_prompt("P3", row, "P4", row, context, token_budget=1) == plain
+
+    # Üretim ayarı REST adlarına çevrilir ve önbellek anahtarını değiştirir
+    config = llm_reports.GENERATION_CONFIG
+    assert llm_reports._rest_config(config) == {
+        "maxOutputTokens": llm_reports.MAX_OUTPUT_TOKENS, "thinkingConfig": {"thinkingBudget": 0}}
+    assert llm_cache.cache_key("m", full, "v") != llm_cache.cache_key("m", full, "v", config)
+
+    print("✓ Token-budgeted prompt builder works")
+
 # ------------------------------
 # Run All Tests
 # ------------------------------